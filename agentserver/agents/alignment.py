@@ -0,0 +1,345 @@
+"""Cross-modal time alignment of emotion timelines and transcript turns.
+
+Face frames, prosody and burst predictions and transcript messages each
+carry their own timestamps. ``align_turns`` puts the transcript on the
+frames' clock (seconds since session start) and locates every turn's span
+in each time-sorted modality with ``np.searchsorted``, so per-turn
+aggregates cost one binary search per turn boundary plus cumulative sums:
+O((frames + turns) log frames) rather than a scan of every modality per
+turn. ``align_windows`` does the same for the occupied windows of a fixed
+grid shared by all modalities, and ``render_joint_timeline`` turns both into
+a compact prompt section reading "what the face and voice did during each
+turn".
+
+A turn spans from its start to its ``end_timestamp`` when the message has
+one, else to the next turn's start; the last turn without an end time runs
+to the end of the data.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from agents.features import (
+    EMOTIONS,
+    MODALITIES,
+    MODALITY_LABELS,
+    Timeline,
+    estimate_tokens,
+)
+from agents.scoring import message_times
+from agents.transcript import USER_ROLE
+
+# transcript times above this are epoch seconds rather than session-relative
+EPOCH_SECONDS_THRESHOLD = 1e9
+# a burst counts towards a turn if it starts within this many seconds of it
+BURST_SLACK_SECONDS = 0.5
+# shortest span reported for a turn lacking end time and successor
+MIN_TURN_SECONDS = 1.0
+
+
+class TurnAlignment(NamedTuple):
+    """Every modality aggregated over every transcript turn."""
+
+    start: np.ndarray  # float64 (t,) seconds since session start
+    end: np.ndarray  # float64 (t,)
+    user: np.ndarray  # bool (t,) turn spoken by the user
+    counts: Dict[str, np.ndarray]  # int64 (t,) frames within the turn
+    means: Dict[str, np.ndarray]  # float32 (t, len(EMOTIONS)), zero when empty
+    peaks: Dict[str, np.ndarray]  # float32 (t, len(EMOTIONS)) max score
+    burst_turn: np.ndarray  # int64 (bursts,) turn of each burst, -1 if none
+
+    def __len__(self) -> int:  # type: ignore[override]
+        return int(self.start.shape[0])
+
+    def bursts(self, turn: int) -> np.ndarray:
+        """Indices (into ``burst_analysis``) of the bursts during ``turn``."""
+        return np.flatnonzero(self.burst_turn == turn)
+
+
+class WindowAlignment(NamedTuple):
+    """Every modality and the transcript on one fixed window grid."""
+
+    start: np.ndarray  # float64 (w,) window start, seconds
+    window_seconds: float
+    counts: Dict[str, np.ndarray]  # int64 (w,)
+    means: Dict[str, np.ndarray]  # float32 (w, len(EMOTIONS))
+    user_turns: np.ndarray  # int64 (w,) user turns starting in the window
+    agent_turns: np.ndarray  # int64 (w,)
+
+    def __len__(self) -> int:  # type: ignore[override]
+        return int(self.start.shape[0])
+
+
+def _epoch(value: Any) -> Optional[float]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def session_times(conversation_data: Dict[str, Any], times: np.ndarray) -> np.ndarray:
+    """Message times (see ``scoring.message_times``) as seconds since session start.
+
+    Epoch times are made relative to ``start_time`` when the conversation has
+    one and to the first message otherwise; relative times are kept.
+    """
+    absolute = np.isfinite(times) & (times > EPOCH_SECONDS_THRESHOLD)
+    if not absolute.any():
+        return times
+    origin = _epoch(conversation_data.get("start_time"))
+    if origin is None:
+        origin = float(times[absolute].min())
+    return np.where(absolute, times - origin, times)
+
+
+def _spans(
+    times: np.ndarray, end_times: Optional[np.ndarray], data_end: float
+) -> np.ndarray:
+    """Turn ends: explicit where known, else the next timed turn's start."""
+    following = np.full(times.shape, np.nan)
+    known = np.flatnonzero(np.isfinite(times))
+    if known.size:
+        # next finite start after each turn (the turns may be unsorted)
+        order = known[np.argsort(times[known], kind="stable")]
+        following[order[:-1]] = times[order[1:]]
+        following[order[-1]] = max(data_end, times[order[-1]] + MIN_TURN_SECONDS)
+    if end_times is not None:
+        following = np.where(np.isfinite(end_times), end_times, following)
+    return np.maximum(following, times)
+
+
+def _aggregate(
+    timestamps: np.ndarray, scores: np.ndarray, starts: np.ndarray, ends: np.ndarray
+):
+    """Frame counts, mean and max scores of ``[starts, ends)`` spans."""
+    timed = np.isfinite(starts) & np.isfinite(ends)
+    low = np.searchsorted(timestamps, np.where(timed, starts, 0.0), side="left")
+    high = np.searchsorted(timestamps, np.where(timed, ends, 0.0), side="left")
+    high = np.where(timed, high, low)
+    counts = (high - low).astype(np.int64)
+    cumulative = np.zeros((timestamps.shape[0] + 1, len(EMOTIONS)))
+    np.cumsum(scores, axis=0, dtype=np.float64, out=cumulative[1:])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = (cumulative[high] - cumulative[low]) / counts[:, None]
+    means = np.where(counts[:, None] > 0, means, 0.0).astype(np.float32)
+    peaks = np.zeros((starts.shape[0], len(EMOTIONS)), dtype=np.float32)
+    filled = np.flatnonzero(counts > 0)
+    if filled.size:
+        # reduceat over interleaved (low, high) pairs: even rows are the spans
+        bounds = np.c_[low[filled], high[filled]].ravel()
+        padded = np.vstack([scores, np.zeros((1, len(EMOTIONS)), scores.dtype)])
+        peaks[filled] = np.maximum.reduceat(padded, bounds, axis=0)[::2]
+    return counts, means, peaks
+
+
+def align_turns(
+    conversation_data: Dict[str, Any],
+    timeline: Timeline,
+    times: Optional[np.ndarray] = None,
+    end_times: Optional[np.ndarray] = None,
+) -> TurnAlignment:
+    """Aggregate every modality over every transcript turn.
+
+    ``times`` and ``end_times`` default to the messages' ``timestamp`` and
+    ``end_timestamp`` parsed by ``scoring.message_times``. Turns without a
+    usable timestamp get zero counts.
+    """
+    messages = conversation_data.get("transcript_messages") or []
+    if times is None:
+        times = message_times(messages)
+    if end_times is None and any("end_timestamp" in m for m in messages):
+        end_times = message_times(messages, "end_timestamp")
+    starts = session_times(conversation_data, times)
+    if end_times is not None:
+        end_times = session_times(conversation_data, end_times)
+    data_end = max(
+        (
+            float(timeline[name].timestamps[-1])
+            for name in MODALITIES
+            if len(timeline[name])
+        ),
+        default=0.0,
+    )
+    ends = _spans(starts, end_times, np.nextafter(data_end, np.inf))
+
+    counts, means, peaks = {}, {}, {}
+    for name in MODALITIES:
+        arrays = timeline[name]
+        counts[name], means[name], peaks[name] = _aggregate(
+            arrays.timestamps, arrays.scores, starts, ends
+        )
+
+    # each burst belongs to the latest turn starting before it (with slack)
+    bursts = timeline["burst_analysis"].timestamps
+    timed = np.flatnonzero(np.isfinite(starts))
+    order = timed[np.argsort(starts[timed], kind="stable")]
+    burst_turn = np.full(bursts.shape[0], -1, dtype=np.int64)
+    if order.size and bursts.size:
+        position = (
+            np.searchsorted(starts[order], bursts + BURST_SLACK_SECONDS, "right") - 1
+        )
+        candidate = order[np.maximum(position, 0)]
+        inside = (position >= 0) & (bursts < ends[candidate] + BURST_SLACK_SECONDS)
+        burst_turn[inside] = candidate[inside]
+
+    return TurnAlignment(
+        start=starts,
+        end=ends,
+        user=np.array([m.get("role") == USER_ROLE for m in messages], dtype=bool),
+        counts=counts,
+        means=means,
+        peaks=peaks,
+        burst_turn=burst_turn,
+    )
+
+
+def align_windows(
+    timeline: Timeline, turns: TurnAlignment, window_seconds: float = 30.0
+) -> WindowAlignment:
+    """Aggregate every modality and turn starts on a grid from time 0.
+
+    Only occupied windows are kept, so the cost follows the number of frames
+    and turns rather than the span they cover: a stray epoch timestamp adds
+    one window, not a grid reaching back to 1970.
+    """
+    if not (np.isfinite(window_seconds) and window_seconds > 0):
+        raise ValueError(f"window_seconds must be positive, got {window_seconds!r}")
+    times = [timeline[name].timestamps for name in MODALITIES]
+    starts = np.where(np.isfinite(turns.start), turns.start, -1.0)
+    every = np.concatenate(times + [starts])
+    every = every[np.isfinite(every) & (every >= 0)]
+    # window indices stay float64: epoch-scale times would overflow int32 and
+    # absurd ones int64
+    occupied = np.unique(np.floor(every / window_seconds))
+    counts, means = {}, {}
+    for name in MODALITIES:
+        arrays = timeline[name]
+        # spans over window indices, so frames land exactly where they were binned
+        counts[name], means[name], _ = _aggregate(
+            np.floor(arrays.timestamps / window_seconds),
+            arrays.scores,
+            occupied,
+            occupied + 1,
+        )
+    bins = np.floor(starts / window_seconds)
+    window = np.searchsorted(occupied, bins)
+    valid = starts >= 0
+    return WindowAlignment(
+        start=occupied * window_seconds,
+        window_seconds=window_seconds,
+        counts=counts,
+        means=means,
+        user_turns=np.bincount(window[valid & turns.user], minlength=occupied.size),
+        agent_turns=np.bincount(window[valid & ~turns.user], minlength=occupied.size),
+    )
+
+
+def _top(scores: np.ndarray, top_k: int) -> str:
+    top = np.argsort(-scores, kind="stable")[:top_k]
+    return ", ".join(
+        f"{EMOTIONS[i]} {scores[i]:.2f}" for i in top if scores[i] >= 0.005
+    )
+
+
+def _window_line(windows: WindowAlignment, w: int, top_k: int) -> str:
+    end = windows.start[w] + windows.window_seconds
+    cells = [
+        f"[{windows.start[w]:.0f}-{end:.0f}s] turns user {windows.user_turns[w]} "
+        f"agent {windows.agent_turns[w]}"
+    ]
+    for name in MODALITIES:
+        count = windows.counts[name][w]
+        if count:
+            label = MODALITY_LABELS[name]
+            cells.append(f"{label} n={count}: {_top(windows.means[name][w], top_k)}")
+    return " | ".join(cells)
+
+
+def _turn_line(
+    turns: TurnAlignment, i: int, speech: str, top_k: int, snippet_words: int
+) -> str:
+    words = speech.split()
+    text = " ".join(words[:snippet_words]) + (
+        "..." if len(words) > snippet_words else ""
+    )
+    cells = [f'#{i} [{turns.start[i]:.1f}-{turns.end[i]:.1f}s] "{text}"']
+    for name in ("face_emotions", "prosody_emotions"):
+        if turns.counts[name][i]:
+            cells.append(
+                f"{MODALITY_LABELS[name]}: {_top(turns.means[name][i], top_k)}"
+            )
+    bursts = turns.bursts(i)
+    if bursts.size:
+        cells.append(f"bursts {bursts.size}")
+    return " | ".join(cells)
+
+
+def render_joint_timeline(
+    conversation_data: Dict[str, Any],
+    timeline: Timeline,
+    window_seconds: float = 30.0,
+    token_budget: int = 4000,
+    top_k: int = 3,
+    snippet_words: int = 8,
+) -> str:
+    """Windows of all modalities side by side, then affect during user turns.
+
+    Half the budget goes to the occupied windows (widened by doubling until
+    they fit) and the rest to user turns, most atypical first: the turns whose
+    face and voice means are furthest from their session means.
+    """
+    if not (np.isfinite(window_seconds) and window_seconds > 0):
+        raise ValueError(f"window_seconds must be positive, got {window_seconds!r}")
+    messages = conversation_data.get("transcript_messages") or []
+    if not len(timeline) and not messages:
+        return "No emotion timeline data available"
+    turns = align_turns(conversation_data, timeline)
+
+    window_lines: List[str] = []
+    while True:
+        windows = align_windows(timeline, turns, window_seconds)
+        window_lines = [_window_line(windows, w, top_k) for w in range(len(windows))]
+        if (
+            estimate_tokens("\n".join(window_lines)) <= token_budget // 2
+            or len(windows) <= 1
+        ):
+            break
+        window_seconds *= 2
+
+    distance = np.zeros(len(turns))
+    for name in ("face_emotions", "prosody_emotions"):
+        counts = turns.counts[name]
+        if counts.any():
+            session_mean = timeline[name].scores.mean(axis=0)
+            spread = np.abs(turns.means[name] - session_mean).sum(axis=1)
+            distance += np.where(counts > 0, spread, 0.0)
+    covered = turns.user & np.any(
+        [turns.counts[name] > 0 for name in MODALITIES], axis=0
+    )
+    candidates = np.flatnonzero(covered)
+    candidates = candidates[np.argsort(-distance[candidates], kind="stable")]
+
+    remaining = token_budget - estimate_tokens("\n".join(window_lines))
+    chosen: Dict[int, str] = {}
+    for i in candidates.tolist():
+        speech = str(messages[i].get("speech") or "")
+        line = _turn_line(turns, i, speech, top_k, snippet_words)
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            break
+        remaining -= cost
+        chosen[i] = line
+
+    sections = [f"Joint timeline ({window_seconds:g}s windows, top {top_k} emotions)"]
+    sections += window_lines
+    if chosen:
+        sections.append(
+            f"Affect during user turns ({len(chosen)} of {int(turns.user.sum())}, "
+            "the most atypical):"
+        )
+        sections += [chosen[i] for i in sorted(chosen)]
+    return "\n".join(sections)
@@ -1,184 +1,593 @@
+import logging
+import os
+import threading
 from datetime import datetime
-from typing import Dict, Any
-from dotenv import load_dotenv
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
-try:
-    from pydantic_ai import Agent  # type: ignore
-except Exception as _e:  # noqa: N816
-    Agent = None  # type: ignore
-    _PYDANTIC_AI_IMPORT_ERROR = _e
-
-# Load environment variables
-load_dotenv()
 from models.flat_assessment import FlatAutismAssessment
+from agents import fanout
+from agents.alignment import render_joint_timeline
+from agents.downsample import render_keyframes
+from agents.features import Timeline, render_summary
+from agents.context_cache import PrefixCacheAgent, context_cache_from_env
+from agents.router import ModelRouter, router_from_env
+from agents.prompt import PROMPT_VERSION, SYSTEM_PROMPT, CompiledPrompt, compile_prompt
+from agents.scoring import (
+    LocalScores,
+    fallback_assessment,
+    render_anchors,
+    score_session,
+)
+from agents.streaming import stream_fields
+from agents.transcript import MEASURED_FIELDS, render_turn_analytics
+from services import workers
+from services.http import get_client
+from services.metrics import (
+    ANALYSES,
+    LLM_RETRIES,
+    PROMPT_BYTES,
+    record_stages,
+    span,
+    timed,
+)
+
+logger = logging.getLogger(__name__)
+
+# "summary" renders windowed timeline statistics, "keyframes" adaptively
+# downsampled segments, "aligned" all modalities joined to windows and
+# transcript turns, "raw" dumps hume_data as-is
+PROMPT_MODE = os.getenv("ANALYZER_PROMPT_MODE", "summary")
+PROMPT_TOKEN_BUDGET = int(os.getenv("ANALYZER_PROMPT_TOKEN_BUDGET", "4000"))
+SUMMARY_WINDOW_SECONDS = float(os.getenv("ANALYZER_SUMMARY_WINDOW_SECONDS", "60"))
+if not SUMMARY_WINDOW_SECONDS > 0:
+    raise ValueError("ANALYZER_SUMMARY_WINDOW_SECONDS must be positive")
+# "keyframes" only: merge frames no further than this per-emotion error
+DOWNSAMPLE_MAX_ERROR = (
+    float(os.environ["ANALYZER_DOWNSAMPLE_MAX_ERROR"])
+    if os.getenv("ANALYZER_DOWNSAMPLE_MAX_ERROR")
+    else None
+)
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("ANALYZER_TRANSCRIPT_TOKEN_BUDGET", "3000"))
+MODEL_RETRIES = int(os.getenv("ANALYZER_MODEL_RETRIES", "1"))
+# Run the domain sub-analyses of agents.fanout concurrently instead of one
+# whole-assessment prompt; each branch gets FANOUT_TIMEOUT_SECONDS
+FANOUT = os.getenv("ANALYZER_FANOUT", "false").lower() in ("1", "true", "yes")
+FANOUT_TIMEOUT_SECONDS = float(os.getenv("ANALYZER_FANOUT_TIMEOUT_SECONDS", "60"))
+
 
+# pydantic_ai (and the provider SDKs it pulls in) is imported on first use,
+# keeping it off the server's cold-start path; None means it is unavailable
+_NOT_LOADED: Any = object()
+Agent: Any = _NOT_LOADED
+_PYDANTIC_AI_IMPORT_ERROR: Optional[Exception] = None
 
 # Create PydanticAI agent lazily to avoid hard dependency at import time
 autism_agent = None
+# Fan-out mode: one router per branch name, created on first use
+branch_agents: Dict[str, Any] = {}
+_agent_lock = threading.Lock()
+# Provider-side cache for the static prompt prefix, routed ahead of the
+# configured models; None sends full prompts. Built with the first agent so
+# the provider SDK stays off the import path
+prefix_cache: Any = _NOT_LOADED
 
 
 async def analyze(
-    conversation_data: Dict[str, Any], hume_data: Dict[str, Any]
+    conversation_data: Dict[str, Any],
+    hume_data: Dict[str, Any],
+    timeline: Optional[Timeline] = None,
+    run_info: Optional[Dict[str, Any]] = None,
+    scoring_data: Optional[Tuple[Dict[str, Any], Timeline]] = None,
 ) -> FlatAutismAssessment:
     """
     Analyzes multi-modal data using PydanticAI with built-in retry handling.
+
+    ``timeline`` is a pre-built emotion timeline (e.g. from session ingestion);
+    when omitted it is extracted from ``hume_data["emotion_timeline"]``.
+    ``run_info``, when given, is filled in with the ``model`` that produced
+    the result and the ``prompt_version`` it was asked with. ``scoring_data``
+    (conversation data and timeline) is what local scores and measured fields
+    are computed from when the prompt carries only part of the session, as a
+    live delta does.
     """
-    from datetime import datetime
+    session_id = conversation_data.get("session_id", "unknown")
+    logger.info("Starting autism assessment analysis", extra={"session_id": session_id})
+    run_info = _start_run_info(run_info)
+
+    compiled, local = await _compile(
+        session_id, conversation_data, hume_data, timeline, scoring_data
+    )
+    if FANOUT:
+        if _agent_class() is None:
+            return _fallback(session_id, local)
+        outcomes = [outcome async for outcome in _run_branches(session_id, compiled)]
+        return _merge(outcomes, local, session_id, run_info)
+    analysis_prompt = compiled.text
+
+    agent = _get_agent(session_id)
+    if agent is None:
+        return _fallback(session_id, local)
+
+    try:
+        logger.info("Running assessment agent", extra={"session_id": session_id})
+        async with workers.limits.llm():
+            with span("agent_run", session_id):
+                result = await agent.run(
+                    compiled if isinstance(agent, ModelRouter) else analysis_prompt
+                )
+        model_name = getattr(result, "model_name", None)
+        logger.info(
+            "Agent run finished on %s",
+            model_name or "default model",
+            extra={"session_id": session_id},
+        )
+        _record_retries(result)
+        with span("result_validation", session_id):
+            assessment = (
+                result.data
+            )  # Changed from result.output to result.data for newer API
+            if not isinstance(assessment, FlatAutismAssessment):
+                assessment = FlatAutismAssessment.model_validate(assessment)
+        run_info["model"] = model_name
+        return _succeed(assessment, session_id, local)
+    except Exception as e:
+        logger.warning(
+            "Assessment agent failed on every model: %s",
+            e,
+            extra={"session_id": session_id},
+        )
+        return _fallback(session_id, local)
+
 
+async def analyze_stream(
+    conversation_data: Dict[str, Any],
+    hume_data: Dict[str, Any],
+    timeline: Optional[Timeline] = None,
+    run_info: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Streaming variant of ``analyze``.
+
+    Yields ``("partial", {field: value, ...})`` as the agent completes fields
+    (scores first, then text summaries) and finally ``("result", assessment)``
+    with the validated ``FlatAutismAssessment``. If the run fails part-way the
+    final result is the fallback assessment, which supersedes any partials.
+    """
     session_id = conversation_data.get("session_id", "unknown")
-    print(f"🔬 Starting autism assessment analysis for session: {session_id}")
-    print(
-        f"📊 Data payload: {len(str(conversation_data))} chars conversation, {len(str(hume_data))} chars behavioral"
+    logger.info(
+        "Starting streamed autism assessment analysis",
+        extra={"session_id": session_id},
     )
+    run_info = _start_run_info(run_info)
+    compiled, local = await _compile(session_id, conversation_data, hume_data, timeline)
+    if FANOUT:
+        if _agent_class() is None:
+            yield "result", _fallback(session_id, local)
+            return
+        outcomes = []
+        async for outcome in _run_branches(session_id, compiled):
+            outcomes.append(outcome)
+            if outcome.findings is not None:
+                yield "partial", outcome.partial
+        yield "result", _merge(outcomes, local, session_id, run_info)
+        return
+
+    agent = _get_agent(session_id)
+    if agent is None:
+        yield "result", _fallback(session_id, local)
+        return
+
+    fields: Dict[str, Any] = {}
+    finished: Dict[str, Any] = {}
+
+    def on_finish(result) -> None:
+        finished["model"] = getattr(result, "model_name", None)
+        _record_retries(result)
 
-    # Build comprehensive analysis prompt
-    # Extract transcript data for focused analysis
-    transcript_messages = conversation_data.get("transcript_messages", [])
-    transcript_text = ""
-    if transcript_messages:
-        transcript_text = "\n".join(
-            [
-                f"[{msg.get('role', 'unknown')}]: {msg.get('speech', '')}"
-                for msg in transcript_messages
-            ]
+    try:
+        async with workers.limits.llm():
+            with span("agent_run", session_id):
+                async for new_fields in stream_fields(
+                    agent, compiled.text, on_finish=on_finish
+                ):
+                    fields.update(new_fields)
+                    yield "partial", new_fields
+        with span("result_validation", session_id):
+            assessment = FlatAutismAssessment.model_validate(fields)
+    except Exception as e:
+        logger.warning(
+            "Streamed analysis failed: %s", e, extra={"session_id": session_id}
         )
+        yield "result", _fallback(session_id, local)
+        return
+    run_info["model"] = finished.get("model")
+    yield "result", _succeed(assessment, session_id, local)
+
 
-    analysis_prompt = f"""
-    AUTISM SPECTRUM ASSESSMENT REQUEST
-    
-    Session ID: {session_id}
-    Analysis Timestamp: {datetime.now().isoformat()}
-    
-    CONVERSATION TRANSCRIPT:
-    {transcript_text if transcript_text else "No transcript data available"}
-    
-    CONVERSATION METADATA:
-    {conversation_data}
-    
-    MULTI-MODAL BEHAVIORAL DATA:
-    {hume_data}
-    
-    ASSESSMENT REQUIREMENTS:
-    Provide a comprehensive autism spectrum disorder assessment based on DSM-5 criteria, including:
-    
-    1. CONVERSATION & SOCIAL COMMUNICATION ANALYSIS:
-       - Analyze the provided conversation transcript for autism-related patterns
-       - Turn-taking patterns and conversational flow
-       - Pragmatic language use and contextual appropriateness
-       - Social reciprocity markers in conversation exchanges
-       - Response patterns to avatar vs human interaction
-       - Eye contact indicators from facial data
-    
-    2. BEHAVIORAL PATTERN ASSESSMENT:
-       - Repetitive behaviors from video analysis
-       - Sensory processing indicators from emotional responses
-       - Attention patterns and regulation markers
-       - Self-regulation behaviors
-    
-    3. SPEECH & LANGUAGE EVALUATION:
-       - Prosodic patterns from speech analysis
-       - Vocal characteristics and modulation
-       - Language patterns and pragmatic usage
-    
-    4. CONFIDENCE & UNCERTAINTY ANALYSIS:
-       - Overall assessment confidence based on data quality
-       - Areas of uncertainty or conflicting indicators
-       - Data sufficiency for reliable assessment
-    
-    5. PROFESSIONAL RECOMMENDATIONS:
-       - Evaluation priority level (low/moderate/high/urgent)
-       - Suggested next steps for comprehensive assessment
-       - Monitoring recommendations
-    
-    CRITICAL SCORING REQUIREMENTS: 
-    - Base your assessment solely on the provided data. Do not infer or assume information not present in the conversation and behavioral data.
-    - ALL NUMERIC SCORES MUST BE DECIMAL VALUES BETWEEN 0.0 AND 1.0 (inclusive):
-      * 0.0 = no evidence/absence/lowest possible score
-      * 0.1-0.3 = minimal/low evidence or presence
-      * 0.4-0.6 = moderate/average evidence or presence  
-      * 0.7-0.9 = strong/high evidence or presence
-      * 1.0 = definitive/maximum evidence/highest possible score
-    - Confidence scores: 0.0 = completely uncertain, 1.0 = completely certain
-    - Likelihood scores: 0.0 = definitely not present, 1.0 = definitely present
-    - Use decimal precision (e.g., 0.67, 0.23, 0.91) for nuanced scoring
-    - Every numeric field in the response must be a decimal between 0.0 and 1.0
+async def _compile(
+    session_id: str,
+    conversation_data: Dict[str, Any],
+    hume_data: Dict[str, Any],
+    timeline: Optional[Timeline],
+    scoring_data: Optional[Tuple[Dict[str, Any], Timeline]] = None,
+) -> Tuple[Any, LocalScores]:
+    """Build the prompt under the worker's CPU limit (in its process pool if any).
+
+    In fan-out mode the prompt is a dict of ``CompiledPrompt`` by branch name.
     """
+    compiled, local, timings = await workers.limits.run_cpu(
+        _prepare,
+        session_id,
+        conversation_data,
+        hume_data,
+        timeline,
+        FANOUT,
+        scoring_data,
+    )
+    record_stages(timings, session_id)
+    prompts = compiled.values() if isinstance(compiled, dict) else [compiled]
+    for prompt in prompts:
+        PROMPT_BYTES.observe(len(prompt.text.encode("utf-8")))
+        logger.info(
+            "Prompt tokens: %d (prefix %d, session %d); "
+            "%d/%d transcript turns compressed",
+            prompt.tokens,
+            prompt.prefix_tokens,
+            prompt.suffix_tokens,
+            prompt.compressed_turns,
+            prompt.transcript_turns,
+            extra={"session_id": session_id},
+        )
+    return compiled, local
 
-    # Initialize agent lazily if available
+
+def _prepare(
+    session_id: str,
+    conversation_data: Dict[str, Any],
+    hume_data: Dict[str, Any],
+    timeline: Optional[Timeline],
+    branches: bool = False,
+    scoring_data: Optional[Tuple[Dict[str, Any], Timeline]] = None,
+) -> Tuple[
+    Union[CompiledPrompt, Dict[str, CompiledPrompt]], LocalScores, Dict[str, float]
+]:
+    # Module-level so it pickles into the CPU pool; stage timings travel back
+    # with the result because a pool process's metrics are never scraped.
+    timings: Dict[str, float] = {}
+    if timeline is None:
+        with timed("timeline_build", timings):
+            timeline = Timeline.from_hume_data(hume_data)
+    with timed("local_scoring", timings):
+        local = score_session(*(scoring_data or (conversation_data, timeline)))
+    with timed("prompt_build", timings):
+        if branches:
+            compiled: Any = {
+                branch.name: fanout.compile_branch_prompt(
+                    branch,
+                    session_id,
+                    conversation_data,
+                    timeline,
+                    local,
+                    TRANSCRIPT_TOKEN_BUDGET,
+                    PROMPT_TOKEN_BUDGET,
+                    SUMMARY_WINDOW_SECONDS,
+                )
+                for branch in fanout.BRANCHES
+            }
+        else:
+            compiled = _build_prompt(
+                session_id, conversation_data, hume_data, timeline, local
+            )
+    return compiled, local, timings
+
+
+def _start_run_info(run_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    run_info = run_info if run_info is not None else {}
+    # "fallback" until an agent run succeeds
+    prompt_version = (
+        f"{fanout.PROMPT_VERSION}-fanout"
+        if FANOUT
+        else f"{PROMPT_VERSION}-{PROMPT_MODE}"
+    )
+    run_info.update(model="fallback", prompt_version=prompt_version)
+    return run_info
+
+
+async def _run_branches(
+    session_id: str, prompts: Dict[str, CompiledPrompt]
+) -> AsyncIterator[fanout.BranchOutcome]:
+    async def run_branch(branch: fanout.Branch, prompt: CompiledPrompt):
+        agent = _get_branch_agent(branch, session_id)
+        if agent is None:
+            raise RuntimeError("no agent available")
+        async with workers.limits.llm():
+            with span(f"agent_run_{branch.name}", session_id):
+                result = await agent.run(
+                    prompt if isinstance(agent, ModelRouter) else prompt.text
+                )
+        _record_retries(result)
+        return result.data, getattr(result, "model_name", None)
+
+    with span("agent_run", session_id):
+        async for outcome in fanout.run_branches(
+            prompts, run_branch, FANOUT_TIMEOUT_SECONDS, session_id
+        ):
+            yield outcome
+
+
+def _merge(
+    outcomes: List[fanout.BranchOutcome],
+    local: LocalScores,
+    session_id: str,
+    run_info: Dict[str, Any],
+) -> FlatAutismAssessment:
+    with span("result_validation", session_id):
+        assessment = fanout.merge(outcomes, local, session_id)
+    if assessment is None:
+        logger.warning("Every fan-out branch failed", extra={"session_id": session_id})
+        return _fallback(session_id, local)
+    run_info["model"] = ",".join(
+        sorted({o.model or "default" for o in outcomes if o.findings is not None})
+    )
+    return _succeed(assessment, session_id, local)
+
+
+def warm_agent() -> bool:
+    """Build the shared agent ahead of the first request (app startup)."""
+    if FANOUT:
+        return all(
+            _get_branch_agent(branch, None) is not None for branch in fanout.BRANCHES
+        )
+    return _get_agent(None) is not None
+
+
+def reset_agent() -> None:
+    """Drop the shared agent, e.g. when the HTTP client it uses is closed."""
     global autism_agent
-    if autism_agent is None and Agent is not None:
+    with _agent_lock:
+        autism_agent = None
+        branch_agents.clear()
+
+
+def _agent_class():
+    """``pydantic_ai.Agent``, imported on first call; None if unavailable."""
+    global Agent, _PYDANTIC_AI_IMPORT_ERROR
+    if Agent is _NOT_LOADED:
         try:
-            # Note: GEMINI_API_KEY is picked up from env by newer pydantic_ai
-            autism_agent = Agent(
-                "gemini-2.5-pro",  # Use model string instead of GoogleModel class
-                result_type=FlatAutismAssessment,
-                retries=3,
-                system_prompt="""You are an expert autism assessment specialist with deep knowledge of DSM-5 criteria, 
-                developmental psychology, and behavioral analysis. Your role is to analyze multi-modal data (facial expressions, 
-                speech patterns, behavioral markers) and provide comprehensive autism spectrum disorder assessments.
-
-                Focus on:
-                - Social communication patterns and deficits
-                - Restricted, repetitive patterns of behavior
-                - Sensory processing differences  
-                - Age-appropriate developmental considerations
-                - Masking and compensation strategies
-                - Cultural and contextual factors
-
-                Always provide confidence scores and acknowledge limitations of single-session assessments.
-                Recommend appropriate professional follow-up when indicated.""",
-            )
+            from pydantic_ai import Agent as agent_class  # type: ignore
         except Exception as e:
-            print(f"⚠️ Failed to initialize PydanticAI Agent: {e}")
+            _PYDANTIC_AI_IMPORT_ERROR = e
+            agent_class = None
+        Agent = agent_class
+    return Agent
+
+
+def _get_agent(session_id: Optional[str]):
+    """The shared agent, created on first use; None when pydantic_ai is unusable."""
+    # Initialize agent lazily if available; the lock makes a burst of
+    # concurrent first requests build it once
+    global autism_agent
+    if autism_agent is None and _agent_class() is not None:
+        with _agent_lock:
+            if autism_agent is None:
+                with span("agent_init", session_id):
+                    autism_agent = _create_agent()
 
     if autism_agent is None:
         # pydantic_ai not available; return fallback to keep API responsive
-        if "_PYDANTIC_AI_IMPORT_ERROR" in globals():
-            print(f"❌ pydantic_ai unavailable: {_PYDANTIC_AI_IMPORT_ERROR}")
-        print("🔄 Returning fallback assessment response.")
-        return _create_mock_response()
+        if _PYDANTIC_AI_IMPORT_ERROR is not None:
+            logger.error("pydantic_ai unavailable: %s", _PYDANTIC_AI_IMPORT_ERROR)
+        logger.warning(
+            "Returning fallback assessment response", extra={"session_id": session_id}
+        )
+    return autism_agent
+
+
+def _get_branch_agent(branch: fanout.Branch, session_id: Optional[str]):
+    """The router for one fan-out branch, created on first use."""
+    agent = branch_agents.get(branch.name)
+    if agent is None and _agent_class() is not None:
+        with _agent_lock:
+            agent = branch_agents.get(branch.name)
+            if agent is None:
+                with span("agent_init", session_id):
+                    agent = _create_agent(fanout.RESULT_TYPES[branch.name])
+                branch_agents[branch.name] = agent
+    return agent
 
+
+def _build_prompt(
+    session_id: str,
+    conversation_data: Dict[str, Any],
+    hume_data: Dict[str, Any],
+    timeline: Timeline,
+    local: Optional[LocalScores] = None,
+) -> CompiledPrompt:
+    """Compile the analysis prompt for one session."""
+    transcript_messages = conversation_data.get("transcript_messages") or []
+    logger.info(
+        "Data payload: %d transcript messages, %d timeline frames",
+        len(transcript_messages),
+        len(timeline),
+        extra={"session_id": session_id},
+    )
+
+    if PROMPT_MODE == "raw":
+        behavioral_data = {
+            **hume_data,
+            "emotion_timeline": timeline.to_emotion_timeline(),
+        }
+    elif PROMPT_MODE == "keyframes":
+        behavioral_data = render_keyframes(
+            timeline,
+            token_budget=PROMPT_TOKEN_BUDGET,
+            max_error_bound=DOWNSAMPLE_MAX_ERROR,
+        )
+    elif PROMPT_MODE == "aligned":
+        behavioral_data = render_joint_timeline(
+            conversation_data,
+            timeline,
+            window_seconds=SUMMARY_WINDOW_SECONDS,
+            token_budget=PROMPT_TOKEN_BUDGET,
+        )
+    else:
+        behavioral_data = render_summary(
+            timeline,
+            window_seconds=SUMMARY_WINDOW_SECONDS,
+            token_budget=PROMPT_TOKEN_BUDGET,
+        )
+
+    return compile_prompt(
+        session_id,
+        conversation_data,
+        behavioral_data,
+        TRANSCRIPT_TOKEN_BUDGET,
+        anchors=render_anchors(local) if local is not None else None,
+        turn_analytics=(
+            render_turn_analytics(local.features)
+            if local is not None and transcript_messages
+            else None
+        ),
+    )
+
+
+def _create_agent(result_type: Any = FlatAutismAssessment):
+    """Router over ``ANALYZER_MODELS``; it is used exactly like a single Agent.
+
+    With a prefix cache configured, the cached-prefix call is the router's
+    first route, so it is hedged and circuit-broken like any model. The cache
+    holds the whole-assessment prefix, so fan-out branches (another
+    ``result_type``) go straight to the models.
+    """
+    global prefix_cache
+    if prefix_cache is _NOT_LOADED:
+        prefix_cache = context_cache_from_env()
+    preferred = []
+    if prefix_cache is not None and result_type is FlatAutismAssessment:
+        preferred.append(
+            (
+                f"context-cache:{prefix_cache.adapter.name}",
+                PrefixCacheAgent(prefix_cache),
+            )
+        )
     try:
-        print("🤖 Running PydanticAI agent with built-in retries...")
-        result = await autism_agent.run(analysis_prompt)
-        assessment = (
-            result.data
-        )  # Changed from result.output to result.data for newer API
-        print("✅ Analysis successful")
-        print(f"📈 Assessment confidence: {assessment.assessment_confidence:.3f}")
-        print(f"🎯 Autism likelihood: {assessment.overall_autism_likelihood:.3f}")
-        print(f"⚠️  Evaluation priority: {assessment.evaluation_priority}")
-        return assessment
+        if result_type is FlatAutismAssessment:
+            return router_from_env(_create_model_agent, preferred)
+        return router_from_env(
+            lambda name: _create_model_agent(name, result_type), preferred
+        )
     except Exception as e:
-        print(f"❌ PydanticAI analysis failed after retries: {e}")
-        print("🔄 Generating fallback assessment...")
-        return _create_mock_response()
-
-
-def _create_mock_response() -> FlatAutismAssessment:
-    """Fallback mock response if API fails"""
-    import random
-
-    return FlatAutismAssessment(
-        session_id=f"fallback_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-        timestamp=datetime.now().isoformat(),
-        analysis_version="1.0",
-        overall_autism_likelihood=random.uniform(0.4, 0.8),
-        assessment_confidence=random.uniform(0.6, 0.8),
-        social_communication_score=random.uniform(0.3, 0.7),
-        repetitive_behaviors_score=random.uniform(0.2, 0.6),
-        sensory_processing_score=random.uniform(0.4, 0.8),
-        eye_contact_score=random.uniform(0.2, 0.6),
-        facial_expression_score=random.uniform(0.3, 0.7),
-        prosody_score=random.uniform(0.4, 0.8),
-        vocal_characteristics_score=random.uniform(0.3, 0.7),
-        social_communication_deficits=random.uniform(0.4, 0.7),
-        restricted_repetitive_behaviors=random.uniform(0.3, 0.6),
-        functional_impairment=random.uniform(0.3, 0.6),
-        support_level="level_1",
-        evaluation_priority="moderate",
-        primary_concerns="Limited data available - automated fallback response",
-        observed_strengths="Unable to assess due to technical limitations",
-        key_recommendations="Seek professional clinical assessment",
-        assessment_limitations="This is a fallback response due to API failure",
+        logger.error("Failed to initialize PydanticAI Agent: %s", e)
+        return None
+
+
+def _create_model_agent(model_name: str, result_type: Any = FlatAutismAssessment):
+    # Note: GEMINI_API_KEY is picked up from env by newer pydantic_ai
+    return _agent_class()(
+        _model(model_name),
+        result_type=result_type,
+        # validation retries only; slow or failing upstreams are handled by
+        # the router's hedging and fallback instead of sequential attempts
+        retries=MODEL_RETRIES,
+        system_prompt=SYSTEM_PROMPT,
+    )
+
+
+def _model(model_name: str):
+    """Model name, or a Gemini model bound to the shared keep-alive HTTP client.
+
+    Without an open shared client (no app lifespan) or for non-Gemini models
+    the name is passed through and pydantic_ai manages its own connections.
+    Releases with providers take the client through ``GoogleGLAProvider``;
+    older ones (e.g. the pinned 0.0.14) accept ``http_client`` directly.
+    """
+    client = get_client()
+    bare_name = model_name.split(":", 1)[-1]
+    if client is None or not bare_name.startswith("gemini"):
+        return model_name
+    try:
+        from pydantic_ai.models.gemini import GeminiModel
+
+        try:
+            from pydantic_ai.providers.google_gla import GoogleGLAProvider
+        except ImportError:
+            return GeminiModel(bare_name, http_client=client)
+        return GeminiModel(bare_name, provider=GoogleGLAProvider(http_client=client))
+    except Exception as e:
+        logger.warning("Shared HTTP client not used for %s: %s", model_name, e)
+        return model_name
+
+
+def _record_retries(result) -> None:
+    """Count model requests beyond the first, when the run exposes usage."""
+    usage = getattr(result, "usage", None)
+    try:
+        requests = (usage() if callable(usage) else usage).requests
+    except Exception:
+        return
+    if requests and requests > 1:
+        LLM_RETRIES.inc(requests - 1)
+
+
+def _succeed(
+    assessment: FlatAutismAssessment,
+    session_id: str,
+    local: Optional[LocalScores] = None,
+) -> FlatAutismAssessment:
+    assessment = _with_measurements(assessment, local)
+    ANALYSES.inc(outcome="success")
+    logger.info(
+        "Analysis successful: confidence=%.3f likelihood=%.3f priority=%s",
+        assessment.assessment_confidence,
+        assessment.overall_autism_likelihood,
+        assessment.evaluation_priority,
+        extra={"session_id": session_id},
+    )
+    return assessment
+
+
+def _fallback(
+    session_id: str, local: Optional[LocalScores] = None
+) -> FlatAutismAssessment:
+    with span("fallback", session_id):
+        assessment = _with_measurements(_create_mock_response(local), local)
+    ANALYSES.inc(outcome="fallback")
+    return assessment
+
+
+def _with_measurements(
+    assessment: FlatAutismAssessment, local: Optional[LocalScores]
+) -> FlatAutismAssessment:
+    """Copy the locally measured turn-taking metrics onto the response."""
+    if local is None:
+        return assessment
+    update = {name: local.features.get(name) for name in MEASURED_FIELDS}
+    if all(getattr(assessment, name) == value for name, value in update.items()):
+        return assessment
+    return assessment.model_copy(update=update)
+
+
+def remeasure(
+    assessment: FlatAutismAssessment,
+    conversation_data: Dict[str, Any],
+    timeline: Timeline,
+) -> FlatAutismAssessment:
+    """``assessment`` with its measured fields computed from the given session."""
+    return _with_measurements(assessment, score_session(conversation_data, timeline))
+
+
+def is_fallback(assessment: FlatAutismAssessment) -> bool:
+    """True for the degraded response returned when the agent is unavailable."""
+    return assessment.session_id.startswith("fallback_")
+
+
+def _create_mock_response(local: Optional[LocalScores] = None) -> FlatAutismAssessment:
+    """Fallback response built from the deterministic local pre-scores.
+
+    Without scores (no session data at hand) every domain sits at the neutral
+    prior, so the response is still stable rather than random.
+    """
+    if local is None:
+        local = score_session({}, Timeline())
+    return fallback_assessment(
+        local, f"fallback_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     )
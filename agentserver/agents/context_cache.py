@@ -0,0 +1,379 @@
+"""Provider-side caching of the static prompt prefix.
+
+The system prompt and ``INSTRUCTIONS`` block are identical on every call, so
+they are uploaded once as a provider cache entry and each assessment only
+sends the per-session suffix. ``PrefixCache`` tracks cache ids and expiry per
+prefix and refreshes them shortly before they lapse; adapters wrap a specific
+provider. Any adapter failure returns ``None`` so the analyzer falls back to
+the regular (uncached) agent call, as does a prefix smaller than the
+provider's minimum cacheable size (``min_tokens``), which is checked locally
+instead of paying for a rejected create call.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from agents.features import estimate_tokens
+from agents.prompt import SYSTEM_PROMPT, CompiledPrompt
+from models.flat_assessment import FlatAutismAssessment
+from services.metrics import CONTEXT_CACHE, INPUT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPrefix(NamedTuple):
+    cache_id: str
+    prefix_hash: str
+    created_at: float
+    expires_at: float
+    handle: Any = None  # provider object, e.g. google.generativeai CachedContent
+    prefix_tokens: int = 0
+
+
+class CachedGeneration(NamedTuple):
+    assessment: FlatAutismAssessment
+    prompt_tokens: int
+    cached_tokens: int
+
+
+def prefix_hash(system_prompt: str, prefix: str) -> str:
+    digest = hashlib.sha256()
+    for part in (system_prompt, prefix):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LocalContextCache:
+    """In-process stand-in that records which calls used a cached prefix.
+
+    ``respond(suffix)`` produces the assessment; ``calls`` holds one entry per
+    generation with the cache id it was served from.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        respond: Callable[[str], FlatAutismAssessment],
+        clock: Callable[[], float] = time.time,
+        min_tokens: int = 0,
+    ):
+        self.respond = respond
+        self._clock = clock
+        self.min_tokens = min_tokens
+        self.created: List[CachedPrefix] = []
+        self.calls: List[Dict[str, Any]] = []
+
+    async def create(
+        self, system_prompt: str, prefix: str, ttl_seconds: float
+    ) -> CachedPrefix:
+        now = self._clock()
+        key = prefix_hash(system_prompt, prefix)
+        entry = CachedPrefix(
+            f"local-{len(self.created)}-{key[:8]}",
+            key,
+            now,
+            now + ttl_seconds,
+            prefix_tokens=self.prefix_tokens(system_prompt, prefix),
+        )
+        self.created.append(entry)
+        return entry
+
+    def prefix_tokens(self, system_prompt: str, prefix: str) -> int:
+        return estimate_tokens(system_prompt) + estimate_tokens(prefix)
+
+    async def generate(self, entry: CachedPrefix, suffix: str) -> CachedGeneration:
+        if entry.expires_at <= self._clock():
+            raise LookupError(f"cache {entry.cache_id} expired")
+        self.calls.append({"cache_id": entry.cache_id, "suffix": suffix})
+        cached = entry.prefix_tokens
+        return CachedGeneration(
+            self.respond(suffix), cached + estimate_tokens(suffix), cached
+        )
+
+
+# Smallest prompt Gemini accepts for explicit caching, by model family
+# (longest matching prefix wins); unknown models use the most conservative.
+GEMINI_MIN_CACHE_TOKENS = {
+    "gemini-1.5": 32768,
+    "gemini-2.0": 4096,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+
+
+def gemini_min_cache_tokens(model: str) -> int:
+    matches = [key for key in GEMINI_MIN_CACHE_TOKENS if model.startswith(key)]
+    if not matches:
+        return max(GEMINI_MIN_CACHE_TOKENS.values())
+    return GEMINI_MIN_CACHE_TOKENS[max(matches, key=len)]
+
+
+class GeminiContextCache:
+    """Explicit context caching through ``google.generativeai`` CachedContent."""
+
+    name = "gemini"
+
+    def __init__(
+        self,
+        model: str = "gemini-2.5-pro",
+        api_key: Optional[str] = None,
+        min_tokens: Optional[int] = None,
+    ):
+        import google.generativeai as genai
+        from google.generativeai import caching
+
+        if api_key:
+            genai.configure(api_key=api_key)
+        self._genai = genai
+        self._caching = caching
+        self.model = model
+        self.min_tokens = (
+            gemini_min_cache_tokens(model) if min_tokens is None else min_tokens
+        )
+
+    @staticmethod
+    def _contents(prefix: str) -> str:
+        # The uncached path gets the schema from pydantic_ai's tool definition;
+        # here it has to travel with the cached prefix instead.
+        schema = json.dumps(FlatAutismAssessment.model_json_schema())
+        return (
+            f"{prefix}\nRESPONSE FORMAT:\n"
+            f"Respond with one JSON object matching this JSON schema:\n{schema}\n"
+        )
+
+    def prefix_tokens(self, system_prompt: str, prefix: str) -> int:
+        return estimate_tokens(system_prompt) + estimate_tokens(self._contents(prefix))
+
+    async def create(
+        self, system_prompt: str, prefix: str, ttl_seconds: float
+    ) -> CachedPrefix:
+        contents = self._contents(prefix)
+        cached = await asyncio.to_thread(
+            self._caching.CachedContent.create,
+            model=f"models/{self.model}",
+            display_name="agentserver-assessment-prefix",
+            system_instruction=system_prompt,
+            contents=[contents],
+            ttl=timedelta(seconds=ttl_seconds),
+        )
+        now = time.time()
+        expire_time = getattr(cached, "expire_time", None)
+        expires_at = expire_time.timestamp() if expire_time else now + ttl_seconds
+        usage = getattr(cached, "usage_metadata", None)
+        return CachedPrefix(
+            cached.name,
+            prefix_hash(system_prompt, prefix),
+            now,
+            expires_at,
+            cached,
+            getattr(usage, "total_token_count", 0) or 0,
+        )
+
+    async def generate(self, entry: CachedPrefix, suffix: str) -> CachedGeneration:
+        model = self._genai.GenerativeModel.from_cached_content(
+            cached_content=entry.handle,
+            generation_config={"response_mime_type": "application/json"},
+        )
+        response = await model.generate_content_async(suffix)
+        usage = getattr(response, "usage_metadata", None)
+        return CachedGeneration(
+            FlatAutismAssessment.model_validate_json(response.text),
+            getattr(usage, "prompt_token_count", 0) or 0,
+            getattr(usage, "cached_content_token_count", 0) or 0,
+        )
+
+
+class PrefixCache:
+    """Reuse one provider cache entry per distinct prefix until it expires."""
+
+    def __init__(
+        self,
+        adapter,
+        ttl_seconds: float = 3600.0,
+        refresh_margin_seconds: float = 60.0,
+        retry_after_seconds: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.adapter = adapter
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self._clock = clock
+        self._entries: Dict[str, CachedPrefix] = {}
+        self._lock: Optional[asyncio.Lock] = None
+        self._disabled_until = 0.0
+        self._too_small: Dict[str, int] = {}
+
+    def _fresh(self, key: str) -> Optional[CachedPrefix]:
+        entry = self._entries.get(key)
+        if entry and entry.expires_at - self.refresh_margin_seconds > self._clock():
+            return entry
+        return None
+
+    async def entry(self, system_prompt: str, prefix: str) -> Optional[CachedPrefix]:
+        """Return a live cache entry for the prefix, creating one if needed."""
+        key = prefix_hash(system_prompt, prefix)
+        entry = self._fresh(key)
+        if entry is not None:
+            return entry
+        if self._clock() < self._disabled_until or key in self._too_small:
+            return None
+        min_tokens = getattr(self.adapter, "min_tokens", 0)
+        if min_tokens:
+            tokens = self.adapter.prefix_tokens(system_prompt, prefix)
+            if tokens < min_tokens:
+                # The prefix is static, so this holds for the process lifetime
+                self._too_small[key] = tokens
+                CONTEXT_CACHE.inc(event="too_small")
+                logger.warning(
+                    "Context caching skipped: prefix is ~%d tokens, below the "
+                    "%s minimum of %d",
+                    tokens,
+                    self.adapter.name,
+                    min_tokens,
+                )
+                return None
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            entry = self._fresh(key)
+            if entry is not None:
+                return entry
+            try:
+                entry = await self.adapter.create(
+                    system_prompt, prefix, self.ttl_seconds
+                )
+            except Exception as e:
+                CONTEXT_CACHE.inc(event="create_failed")
+                self._disabled_until = self._clock() + self.retry_after_seconds
+                logger.warning("Context cache creation failed: %s", e)
+                return None
+            CONTEXT_CACHE.inc(event="created")
+            self._entries[key] = entry
+            logger.info(
+                "Created context cache %s (expires in %.0fs)",
+                entry.cache_id,
+                entry.expires_at - self._clock(),
+            )
+            return entry
+
+    async def generate(
+        self,
+        compiled: CompiledPrompt,
+        system_prompt: str = SYSTEM_PROMPT,
+        session_id: Optional[str] = None,
+    ) -> Optional[FlatAutismAssessment]:
+        entry = await self.entry(system_prompt, compiled.prefix)
+        if entry is None:
+            return None
+        try:
+            generation = await self.adapter.generate(entry, compiled.suffix)
+        except Exception as e:
+            CONTEXT_CACHE.inc(event="generate_failed")
+            # the provider may have evicted the entry early; recreate next time
+            self._entries.pop(entry.prefix_hash, None)
+            logger.warning(
+                "Cached-prefix generation failed: %s",
+                e,
+                extra={"session_id": session_id},
+            )
+            return None
+        CONTEXT_CACHE.inc(event="hit")
+        INPUT_TOKENS.inc(generation.cached_tokens, kind="cached")
+        INPUT_TOKENS.inc(
+            max(generation.prompt_tokens - generation.cached_tokens, 0),
+            kind="uncached",
+        )
+        logger.info(
+            "Served from context cache %s (%d of %d input tokens cached)",
+            entry.cache_id,
+            generation.cached_tokens,
+            generation.prompt_tokens,
+            extra={"session_id": session_id},
+        )
+        return generation.assessment
+
+    def stats(self) -> Dict[str, Any]:
+        now = self._clock()
+        return {
+            "adapter": self.adapter.name,
+            "entries": [
+                {"cache_id": e.cache_id, "expires_in": e.expires_at - now}
+                for e in self._entries.values()
+            ],
+            "below_minimum_tokens": list(self._too_small.values()),
+        }
+
+
+class CacheUnavailableError(LookupError):
+    """The prefix cache could not serve this prompt; the next route should."""
+
+
+class CachedRun:
+    """Agent-run shaped result (``data``, ``model_name``) for a cached generation."""
+
+    def __init__(self, data: FlatAutismAssessment):
+        self.data = data
+        self.model_name: Optional[str] = None
+
+
+class PrefixCacheAgent:
+    """Exposes a ``PrefixCache`` as a ``ModelRouter`` route.
+
+    Routing the cached-prefix call like any other model gives it the router's
+    hedge timer, circuit breaker and latency tracking: a slow cache generation
+    is hedged to the next model instead of delaying the uncached call.
+    """
+
+    accepts_compiled = True
+
+    def __init__(self, cache: PrefixCache, system_prompt: str = SYSTEM_PROMPT):
+        self.cache = cache
+        self.system_prompt = system_prompt
+
+    async def run(self, prompt: CompiledPrompt) -> CachedRun:
+        if not isinstance(prompt, CompiledPrompt):
+            raise CacheUnavailableError("context cache needs a compiled prompt")
+        assessment = await self.cache.generate(prompt, self.system_prompt)
+        if assessment is None:
+            raise CacheUnavailableError("no usable context cache entry")
+        return CachedRun(assessment)
+
+
+def context_cache_from_env() -> Optional[PrefixCache]:
+    """Build the prefix cache configured by ``ANALYZER_CONTEXT_CACHE*`` variables.
+
+    ``auto`` (the default) enables Gemini caching when ``google.generativeai``
+    is importable and an API key is set; ``none`` disables it. Prefixes below
+    the model's minimum cacheable size (``ANALYZER_CONTEXT_CACHE_MIN_TOKENS``
+    overrides the per-model default) are sent uncached.
+    """
+    mode = os.getenv("ANALYZER_CONTEXT_CACHE", "auto")
+    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    if mode == "none" or (mode == "auto" and not api_key):
+        return None
+    try:
+        min_tokens = os.getenv("ANALYZER_CONTEXT_CACHE_MIN_TOKENS")
+        adapter = GeminiContextCache(
+            os.getenv("ANALYZER_CONTEXT_CACHE_MODEL", "gemini-2.5-pro"),
+            api_key,
+            int(min_tokens) if min_tokens else None,
+        )
+    except ImportError as e:
+        logger.info("Context caching unavailable: %s", e)
+        return None
+    except Exception as e:
+        logger.warning("Context caching disabled: %s", e)
+        return None
+    return PrefixCache(
+        adapter,
+        ttl_seconds=float(os.getenv("ANALYZER_CONTEXT_CACHE_TTL_SECONDS", "3600")),
+    )
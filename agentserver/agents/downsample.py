@@ -0,0 +1,371 @@
+"""Adaptive temporal downsampling of emotion timelines.
+
+Hume face predictions arrive several times a second and consecutive frames
+are nearly identical. ``downsample`` cuts a modality into segments wherever
+the emotion vector has moved further than a threshold (L1 or cosine distance)
+from the segment's first frame, and gives each peak frame a segment of its
+own; every segment is then represented by its mean scores and its time span,
+so the prompt carries one line per change in affect rather than per frame.
+
+The threshold can be given directly, or searched for by bisection:
+``target_frames`` finds the smallest threshold yielding at most that many
+segments and ``max_error_bound`` the largest threshold whose worst
+per-emotion deviation from the segment means stays within the bound
+(``bounded_downsample`` additionally caps the segment count). Local
+scoring keeps using the full-rate arrays; only the prompt is downsampled.
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from agents.features import (
+    EMOTIONS,
+    MODALITIES,
+    MODALITY_LABELS,
+    ModalityArrays,
+    Timeline,
+    estimate_tokens,
+)
+
+# Bisection limits for the target-count and error-bound searches: at most
+# SEARCH_STEPS passes, stopping once the threshold is known to within
+# SEARCH_TOLERANCE of its value.
+SEARCH_STEPS = 40
+SEARCH_TOLERANCE = 0.01
+# Rough prompt cost of one rendered segment line, used to turn a token budget
+# into a target segment count.
+TOKENS_PER_SEGMENT = 20
+
+
+class Segments(NamedTuple):
+    """A downsampled modality: one row per merged run of frames."""
+
+    start: np.ndarray  # float64 (k,) timestamp of the first frame, seconds
+    end: np.ndarray  # float64 (k,) timestamp of the last frame, seconds
+    count: np.ndarray  # int64 (k,) frames merged into the segment
+    scores: np.ndarray  # float32 (k, len(EMOTIONS)) mean scores
+    peak: np.ndarray  # bool (k,) single-frame segment kept as a peak
+
+    def __len__(self) -> int:  # type: ignore[override]
+        return int(self.start.shape[0])
+
+    @property
+    def frames(self) -> int:
+        return int(self.count.sum())
+
+    @property
+    def duration(self) -> np.ndarray:
+        return self.end - self.start
+
+    @property
+    def compression_ratio(self) -> float:
+        """Input frames per kept segment (1.0 = nothing merged)."""
+        return self.frames / len(self) if len(self) else 1.0
+
+    def to_arrays(self) -> ModalityArrays:
+        """Segment starts and mean scores, in the shape of a full-rate modality."""
+        return ModalityArrays(self.start, self.scores)
+
+
+def _distances(frames: np.ndarray, anchor: np.ndarray, metric: str) -> np.ndarray:
+    if metric == "l1":
+        return np.abs(frames - anchor).sum(axis=1)
+    if metric == "cosine":
+        norms = np.linalg.norm(frames, axis=1) * np.linalg.norm(anchor)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            similarity = np.where(norms > 0, frames @ anchor / norms, 1.0)
+        return np.clip(1.0 - similarity, 0.0, 2.0)
+    raise ValueError(f"Unknown distance metric {metric!r}")
+
+
+def peak_frames(
+    scores: np.ndarray, min_score: float = 0.5, min_rise: float = 0.25, radius: int = 5
+) -> np.ndarray:
+    """Indices of peak frames, strongest first.
+
+    A frame is a peak when some emotion reaches at least ``min_score``, is the
+    highest value of that emotion within ``radius`` frames either side and
+    sits ``min_rise`` above its average over ``6 * radius`` frames either
+    side, so slow drifts do not count.
+    """
+    n = scores.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    padded = np.pad(scores, ((radius, radius), (0, 0)), constant_values=-np.inf)
+    local_max = np.lib.stride_tricks.sliding_window_view(
+        padded, 2 * radius + 1, axis=0
+    ).max(axis=-1)
+    wide = 6 * radius
+    cumulative = np.vstack(
+        [np.zeros((1, scores.shape[1])), np.cumsum(scores, axis=0, dtype=np.float64)]
+    )
+    low = np.clip(np.arange(n) - wide, 0, n)
+    high = np.clip(np.arange(n) + wide + 1, 0, n)
+    baseline = (cumulative[high] - cumulative[low]) / (high - low)[:, None]
+    rise = scores - baseline
+    is_peak = (scores >= local_max) & (scores >= min_score) & (rise >= min_rise)
+    height = np.where(is_peak, rise, -np.inf).max(axis=1)
+    candidates = np.flatnonzero(np.isfinite(height))
+    return candidates[np.argsort(-height[candidates], kind="stable")]
+
+
+def _starts(
+    scores: np.ndarray,
+    threshold: float,
+    metric: str,
+    peaks: np.ndarray,
+    limit: Optional[int] = None,
+) -> np.ndarray:
+    """First frame of each segment; stops early once past ``limit`` segments.
+
+    A segment ends before the first frame further than ``threshold`` from the
+    segment's first frame. The search gallops: it compares growing blocks of
+    frames with the anchor, so each segment costs a few vectorized passes.
+    Peaks and the frames after them always start a segment.
+    """
+    n = scores.shape[0]
+    forced = np.union1d(peaks, peaks + 1) if peaks.size else peaks
+    forced = forced[forced < n]
+    starts = [0]
+    anchor, step = 0, 16
+    while anchor < n and (limit is None or len(starts) <= limit):
+        cut = (
+            int(forced[np.searchsorted(forced, anchor, side="right")])
+            if (forced.size and forced[-1] > anchor)
+            else n
+        )
+        position, found = anchor + 1, cut
+        while position < cut:
+            stop = min(cut, position + step)
+            over = np.flatnonzero(
+                _distances(scores[position:stop], scores[anchor], metric) > threshold
+            )
+            if over.size:
+                found = position + int(over[0])
+                break
+            position, step = stop, step * 2
+        if found >= n:
+            break
+        step = max(16, (found - anchor) // 2)
+        starts.append(found)
+        anchor = found
+    return np.asarray(starts, dtype=np.int64)
+
+
+def _segments(
+    arrays: ModalityArrays, starts: np.ndarray, peaks: np.ndarray
+) -> Segments:
+    n = arrays.timestamps.shape[0]
+    counts = np.diff(np.r_[starts, n])
+    means = np.add.reduceat(arrays.scores.astype(np.float64), starts, axis=0)
+    means /= counts[:, None]
+    ends = np.r_[starts[1:], n] - 1
+    return Segments(
+        start=arrays.timestamps[starts],
+        end=arrays.timestamps[ends],
+        count=counts.astype(np.int64),
+        scores=means.astype(np.float32),
+        peak=np.isin(starts, peaks) & (counts == 1),
+    )
+
+
+def max_error(arrays: ModalityArrays, segments: Segments) -> float:
+    """Largest per-emotion difference between a frame and its segment mean."""
+    if not len(segments):
+        return 0.0
+    expanded = np.repeat(segments.scores, segments.count, axis=0)
+    return float(np.abs(arrays.scores - expanded).max())
+
+
+def downsample(
+    arrays: ModalityArrays,
+    threshold: Optional[float] = None,
+    target_frames: Optional[int] = None,
+    max_error_bound: Optional[float] = None,
+    metric: str = "l1",
+    peak_score: float = 0.5,
+) -> Segments:
+    """Merge near-identical frames of one time-sorted modality into segments.
+
+    Exactly one of ``threshold`` (``metric`` distance from a segment's first
+    frame that starts a new segment), ``target_frames`` or ``max_error_bound``
+    selects the mode. In target mode peaks take at most a quarter of the
+    segments.
+    """
+    if sum(x is not None for x in (threshold, target_frames, max_error_bound)) != 1:
+        raise ValueError(
+            "Pass exactly one of threshold, target_frames, max_error_bound"
+        )
+    n = arrays.timestamps.shape[0]
+    if n == 0:
+        return _segments(arrays, np.zeros(0, dtype=np.int64), np.zeros(0))
+    scores = arrays.scores.astype(np.float64)
+    peaks = peak_frames(arrays.scores, min_score=peak_score)
+    # no two frames are further apart than this under either metric
+    ceiling = 2.0 * scores.shape[1] if metric == "l1" else 2.0
+
+    if threshold is not None:
+        return _segments(arrays, _starts(scores, threshold, metric, peaks), peaks)
+
+    if target_frames is not None:
+        if n <= target_frames:
+            return _segments(arrays, np.arange(n), peaks)
+        peaks = peaks[: max(target_frames, 1) // 4]
+        # smallest threshold with at most target_frames segments
+        low, high = 0.0, ceiling
+        for _ in range(SEARCH_STEPS):
+            middle = (low + high) / 2
+            if (
+                _starts(scores, middle, metric, peaks, target_frames).size
+                > target_frames
+            ):
+                low = middle
+            else:
+                high = middle
+            if high - low < SEARCH_TOLERANCE * high:
+                break
+        return _segments(arrays, _starts(scores, high, metric, peaks), peaks)
+
+    return _bounded(arrays, scores, max_error_bound, metric, peaks, ceiling)
+
+
+def _bounded(
+    arrays: ModalityArrays,
+    scores: np.ndarray,
+    max_error_bound: float,
+    metric: str,
+    peaks: np.ndarray,
+    ceiling: float,
+    max_segments: Optional[int] = None,
+) -> Optional[Segments]:
+    """Largest-threshold segments within the error bound and ``max_segments``.
+
+    Returns None when no threshold satisfies both. A candidate past
+    ``max_segments`` stops its scan early and only steers the search higher,
+    as fewer segments need a larger threshold.
+    """
+
+    def candidate(threshold: float) -> Optional[Segments]:
+        starts = _starts(scores, threshold, metric, peaks, max_segments)
+        if max_segments is not None and starts.size > max_segments:
+            return None
+        return _segments(arrays, starts, peaks)
+
+    # largest threshold whose segments stay within the error bound; every frame
+    # is within the threshold of the anchor and so is the mean, so for L1 half
+    # the bound is always feasible; cosine may need to search lower
+    low = max_error_bound / 2 if metric == "l1" else 0.0
+    high = ceiling
+    best = candidate(low)
+    for _ in range(SEARCH_STEPS):
+        middle = (low + high) / 2
+        segments = candidate(middle)
+        if segments is None:
+            low = middle
+        elif max_error(arrays, segments) <= max_error_bound:
+            low, best = middle, segments
+        else:
+            high = middle
+        if high - low < SEARCH_TOLERANCE * low:
+            break
+    return best
+
+
+def bounded_downsample(
+    arrays: ModalityArrays,
+    max_error_bound: float,
+    max_segments: int,
+    metric: str = "l1",
+    peak_score: float = 0.5,
+) -> Optional[Segments]:
+    """``downsample(max_error_bound=...)`` with at most ``max_segments``.
+
+    Returns None when the bound cannot be met within ``max_segments``, so a
+    caller with a budget can fall back to ``target_frames`` without paying
+    for a full error-bound search.
+    """
+    n = arrays.timestamps.shape[0]
+    if n == 0:
+        return _segments(arrays, np.zeros(0, dtype=np.int64), np.zeros(0))
+    scores = arrays.scores.astype(np.float64)
+    peaks = peak_frames(arrays.scores, min_score=peak_score)
+    ceiling = 2.0 * scores.shape[1] if metric == "l1" else 2.0
+    return _bounded(
+        arrays, scores, max_error_bound, metric, peaks, ceiling, max_segments
+    )
+
+
+def downsample_timeline(timeline: Timeline, **kwargs) -> Dict[str, Segments]:
+    """``downsample`` every modality with the same settings."""
+    return {name: downsample(timeline[name], **kwargs) for name in MODALITIES}
+
+
+def _render_segments(label: str, segments: Segments, top_k: int) -> List[str]:
+    lines = [
+        f"{label}: {segments.frames} frames as {len(segments)} segments"
+        f" ({segments.compression_ratio:.1f}x)"
+    ]
+    for i in range(len(segments)):
+        top = np.argsort(-segments.scores[i], kind="stable")[:top_k]
+        cells = ", ".join(
+            f"{EMOTIONS[j]} {segments.scores[i, j]:.2f}"
+            for j in top
+            if segments.scores[i, j] >= 0.005
+        )
+        kind = "peak " if segments.peak[i] else ""
+        lines.append(
+            f"  [{segments.start[i]:.1f}-{segments.end[i]:.1f}s"
+            f" n={segments.count[i]}] {kind}{cells}"
+        )
+    return lines
+
+
+def render_keyframes(
+    timeline: Timeline,
+    token_budget: int = 4000,
+    top_k: int = 3,
+    max_error_bound: Optional[float] = None,
+) -> str:
+    """Render the timeline as keyframe segments within ``token_budget``.
+
+    The budget is shared between modalities in proportion to their frame
+    counts. With ``max_error_bound`` a modality is merged only as far as the
+    bound allows, unless that would still exceed its share of the budget.
+    """
+    present = [name for name in MODALITIES if len(timeline[name])]
+    if not present:
+        return "No emotion timeline data available"
+    total = sum(len(timeline[name]) for name in present)
+    per_segment = float(TOKENS_PER_SEGMENT)
+
+    def target(name: str) -> int:
+        share = token_budget * len(timeline[name]) / total
+        return max(int(share / per_segment), 1)
+
+    # the error-bound search is capped at the budget; a modality it cannot fit
+    # goes straight to target mode
+    bounded: Dict[str, Optional[Segments]] = {}
+    if max_error_bound is not None:
+        bounded = {
+            name: bounded_downsample(timeline[name], max_error_bound, target(name))
+            for name in present
+        }
+    text = ""
+    for _ in range(4):
+        lines: List[str] = []
+        for name in present:
+            segments = bounded.get(name)
+            if segments is None or len(segments) > target(name):
+                segments = downsample(timeline[name], target_frames=target(name))
+            lines.extend(_render_segments(MODALITY_LABELS[name], segments, top_k))
+        text = "\n".join(lines)
+        tokens = estimate_tokens(text)
+        if tokens <= token_budget * 0.97:
+            break
+        # lines ran longer than estimated; shrink the targets to match
+        per_segment *= tokens / (token_budget * 0.9)
+    header = (
+        f"Emotion keyframes (~{estimate_tokens(text)} tokens, top {top_k} emotions)"
+    )
+    return f"{header}\n{text}"
@@ -0,0 +1,330 @@
+"""Fan-out analysis: domain sub-assessments run concurrently and merged locally.
+
+Instead of one long generation covering every domain, each ``Branch`` asks a
+model for a handful of scores plus short findings, given only the data that
+domain needs (face frames for eye contact and expressiveness, prosody and
+bursts for speech, the transcript for social communication). Branches run
+concurrently, each under its own timeout, so wall-clock latency is that of
+the slowest branch. ``merge`` then assembles the ``FlatAutismAssessment``
+without another model call: DSM-5 aligned and overall scores come from
+``derive_scores``, text fields are the branches' findings, and a branch that
+failed or timed out contributes its local pre-scores instead.
+"""
+
+import asyncio
+import hashlib
+import logging
+import textwrap
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+from pydantic import BaseModel, create_model
+
+from agents.features import Timeline, render_summary
+from agents.prompt import CompiledPrompt, compress_transcript
+from agents.transcript import render_turn_analytics
+from agents.scoring import (
+    LocalScores,
+    derive_scores,
+    evaluation_priority,
+    support_level,
+)
+from models.flat_assessment import FlatAutismAssessment
+from services.metrics import FANOUT_BRANCHES
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_VERSION = "1.0-fanout"
+
+
+class Branch(NamedTuple):
+    name: str
+    label: str
+    fields: Tuple[str, ...]
+    modalities: Tuple[str, ...]
+    transcript: bool
+    focus: str
+
+
+BRANCHES: Tuple[Branch, ...] = (
+    Branch(
+        "social",
+        "social communication",
+        ("social_communication_score",),
+        (),
+        True,
+        "Turn-taking and conversational flow, pragmatic language use, social "
+        "reciprocity in the exchanges and response patterns to the avatar.",
+    ),
+    Branch(
+        "behavior",
+        "behavioral patterns",
+        ("repetitive_behaviors_score", "sensory_processing_score"),
+        ("face_emotions", "burst_analysis"),
+        True,
+        "Repetitive or restricted topics and phrases, sensory processing "
+        "indicators in emotional responses, attention and self-regulation.",
+    ),
+    Branch(
+        "face",
+        "facial expression",
+        ("eye_contact_score", "facial_expression_score"),
+        ("face_emotions",),
+        False,
+        "Eye contact indicators from face presence and range, variability and "
+        "timing of facial expressions.",
+    ),
+    Branch(
+        "speech",
+        "speech and prosody",
+        ("prosody_score", "vocal_characteristics_score"),
+        ("prosody_emotions", "burst_analysis"),
+        False,
+        "Prosodic patterns, vocal modulation and vocal bursts.",
+    ),
+)
+
+
+def _result_type(branch: Branch) -> Type[BaseModel]:
+    fields: Dict[str, Any] = {name: (float, ...) for name in branch.fields}
+    fields.update(
+        confidence=(float, ...),
+        concerns=(str, ...),
+        strengths=(str, ...),
+        recommendations=(str, ...),
+    )
+    model_name = f"{branch.name.title()}Findings"
+    return create_model(model_name, **fields)
+
+
+RESULT_TYPES: Dict[str, Type[BaseModel]] = {b.name: _result_type(b) for b in BRANCHES}
+
+
+def _instructions(branch: Branch) -> str:
+    fields = "\n".join(f"    - {name}" for name in branch.fields)
+    return textwrap.dedent(f"""\
+    DOMAIN SUB-ASSESSMENT: {branch.label.upper()}
+    You are assessing one domain of an autism spectrum screening session; other
+    domains are assessed separately. Focus on: {branch.focus}
+    Base your assessment solely on the session data that follows this block.
+
+    Return:
+    {fields}
+    - confidence: your confidence in this domain's scores given the data
+    - concerns, strengths, recommendations: one or two sentences each,
+      specific to this domain
+
+    Every numeric field must be a decimal between 0.0 and 1.0 (0.0 = no
+    evidence of autism-associated atypicality, 1.0 = strong evidence).
+    LOCAL PRE-SCORES, when present, are deterministic statistics-based
+    baselines; treat them as anchors and depart from them where the data
+    supports it.
+    """)
+
+
+INSTRUCTIONS: Dict[str, str] = {b.name: _instructions(b) for b in BRANCHES}
+
+# Stored with fan-out assessments in place of ``prompt.PROMPT_VERSION``.
+PROMPT_VERSION = hashlib.sha256(
+    "\n".join(INSTRUCTIONS[b.name] for b in BRANCHES).encode("utf-8")
+).hexdigest()[:12]
+
+
+def compile_branch_prompt(
+    branch: Branch,
+    session_id: str,
+    conversation_data: Dict[str, Any],
+    timeline: Timeline,
+    local: LocalScores,
+    transcript_token_budget: int,
+    timeline_token_budget: int,
+    window_seconds: float,
+) -> CompiledPrompt:
+    """The branch's static instructions plus the session slice it needs."""
+    sections = [f"Session ID: {session_id}"]
+    messages = conversation_data.get("transcript_messages") or []
+    compressed = 0
+    if branch.transcript:
+        lines, compressed = compress_transcript(messages, transcript_token_budget)
+        sections += [
+            "",
+            "CONVERSATION TRANSCRIPT:",
+            "\n".join(lines) if lines else "No transcript data available",
+        ]
+        if messages:
+            sections += [
+                "",
+                "TURN-TAKING ANALYTICS:",
+                render_turn_analytics(local.features),
+            ]
+    if branch.modalities:
+        sliced = Timeline({name: timeline[name] for name in branch.modalities})
+        sections += [
+            "",
+            "MULTI-MODAL BEHAVIORAL DATA:",
+            render_summary(
+                sliced,
+                window_seconds=window_seconds,
+                token_budget=timeline_token_budget,
+            ),
+        ]
+    sections += ["", "LOCAL PRE-SCORES:"]
+    for name in branch.fields:
+        note = " (no data, neutral prior)" if name in local.missing else ""
+        sections.append(f"- {name}: {local.scores[name]:.2f}{note}")
+    return CompiledPrompt(
+        INSTRUCTIONS[branch.name],
+        "\n".join(sections),
+        len(messages) if branch.transcript else 0,
+        compressed,
+    )
+
+
+class BranchOutcome(NamedTuple):
+    branch: Branch
+    findings: Optional[BaseModel]
+    model: Optional[str]
+    error: Optional[str]
+
+    @property
+    def partial(self) -> Dict[str, Any]:
+        """The branch's assessment fields, for streaming as a partial result."""
+        if self.findings is None:
+            return {}
+        return {name: getattr(self.findings, name) for name in self.branch.fields}
+
+
+async def _run_one(
+    branch: Branch,
+    prompt: CompiledPrompt,
+    run_branch: Callable[
+        [Branch, CompiledPrompt], Awaitable[Tuple[Any, Optional[str]]]
+    ],
+    timeout: float,
+    session_id: str,
+) -> BranchOutcome:
+    try:
+        data, model = await asyncio.wait_for(run_branch(branch, prompt), timeout)
+        findings = RESULT_TYPES[branch.name].model_validate(
+            data.model_dump() if isinstance(data, BaseModel) else data
+        )
+    except asyncio.TimeoutError:
+        FANOUT_BRANCHES.inc(branch=branch.name, outcome="timeout")
+        logger.warning(
+            "Branch %s timed out after %gs",
+            branch.name,
+            timeout,
+            extra={"session_id": session_id},
+        )
+        return BranchOutcome(branch, None, None, f"timed out after {timeout:g}s")
+    except Exception as e:
+        FANOUT_BRANCHES.inc(branch=branch.name, outcome="error")
+        logger.warning(
+            "Branch %s failed: %s", branch.name, e, extra={"session_id": session_id}
+        )
+        return BranchOutcome(branch, None, None, "failed")
+    FANOUT_BRANCHES.inc(branch=branch.name, outcome="success")
+    return BranchOutcome(branch, findings, model, None)
+
+
+async def run_branches(
+    prompts: Dict[str, CompiledPrompt],
+    run_branch: Callable[
+        [Branch, CompiledPrompt], Awaitable[Tuple[Any, Optional[str]]]
+    ],
+    timeout: float,
+    session_id: str,
+    branches: Sequence[Branch] = BRANCHES,
+) -> AsyncIterator[BranchOutcome]:
+    """Run every branch concurrently, yielding outcomes as they complete.
+
+    ``run_branch(branch, prompt)`` returns ``(findings, model_name)``; an
+    exception or exceeding ``timeout`` seconds yields an outcome with
+    ``error`` set. Branches still running when the caller stops iterating
+    are cancelled.
+    """
+    tasks = [
+        asyncio.ensure_future(
+            _run_one(branch, prompts[branch.name], run_branch, timeout, session_id)
+        )
+        for branch in branches
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _join(parts: List[str], empty: str) -> str:
+    return "; ".join(parts) if parts else empty
+
+
+def merge(
+    outcomes: Sequence[BranchOutcome],
+    local: LocalScores,
+    session_id: str,
+    timestamp: Optional[datetime] = None,
+) -> Optional[FlatAutismAssessment]:
+    """Assemble the assessment from branch outcomes; None if every branch failed."""
+    succeeded = [o for o in outcomes if o.findings is not None]
+    if not succeeded:
+        return None
+    scores = {name: local.scores[name] for name in local.scores}
+    confidences = []
+    for outcome in outcomes:
+        if outcome.findings is None:
+            confidences.append(local.confidence)
+            continue
+        for name in outcome.branch.fields:
+            scores[name] = round(min(max(getattr(outcome.findings, name), 0.0), 1.0), 3)
+        confidences.append(outcome.findings.confidence)
+    scores.update(derive_scores(scores))
+    confidence = round(min(max(sum(confidences) / len(confidences), 0.0), 1.0), 3)
+    overall = scores["overall_autism_likelihood"]
+
+    def findings(field: str) -> List[str]:
+        return [
+            f"{o.branch.label.capitalize()}: {getattr(o.findings, field).strip()}"
+            for o in succeeded
+            if getattr(o.findings, field).strip()
+        ]
+
+    limitations = ["Domains were assessed in separate sub-analyses and merged locally"]
+    limitations += [
+        f"{o.branch.label} sub-analysis {o.error}; local pre-scores used"
+        for o in outcomes
+        if o.findings is None
+    ]
+    return FlatAutismAssessment(
+        session_id=session_id,
+        timestamp=(timestamp or datetime.now()).isoformat(),
+        analysis_version=ANALYSIS_VERSION,
+        assessment_confidence=confidence,
+        support_level=support_level(overall),
+        evaluation_priority=evaluation_priority(overall, confidence),
+        primary_concerns=_join(findings("concerns"), "No domain concerns reported"),
+        observed_strengths=_join(findings("strengths"), "No strengths reported"),
+        key_recommendations=_join(
+            findings("recommendations"), "Seek professional clinical assessment"
+        ),
+        assessment_limitations="; ".join(limitations),
+        **{
+            name: value
+            for name, value in scores.items()
+            if name in FlatAutismAssessment.model_fields
+        },
+    )
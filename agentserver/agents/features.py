@@ -0,0 +1,466 @@
+"""Vectorized feature extraction over Hume emotion timelines.
+
+The client posts ``hume_data.emotion_timeline`` as three lists of frames
+(``face_emotions``, ``prosody_emotions``, ``burst_analysis``), each frame
+carrying a list of ``{"name": ..., "score": ...}`` emotions. Dumping those
+lists into the prompt costs hundreds of KB per session, so this module turns
+them into dense ``(frames, emotions)`` arrays and renders compact windowed
+statistics instead.
+"""
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Hume expression vocabulary shared by the face, prosody and burst models.
+EMOTIONS: Tuple[str, ...] = (
+    "Admiration",
+    "Adoration",
+    "Aesthetic Appreciation",
+    "Amusement",
+    "Anger",
+    "Anxiety",
+    "Awe",
+    "Awkwardness",
+    "Boredom",
+    "Calmness",
+    "Concentration",
+    "Confusion",
+    "Contemplation",
+    "Contempt",
+    "Contentment",
+    "Craving",
+    "Desire",
+    "Determination",
+    "Disappointment",
+    "Disgust",
+    "Distress",
+    "Doubt",
+    "Ecstasy",
+    "Embarrassment",
+    "Empathic Pain",
+    "Entrancement",
+    "Envy",
+    "Excitement",
+    "Fear",
+    "Guilt",
+    "Horror",
+    "Interest",
+    "Joy",
+    "Love",
+    "Nostalgia",
+    "Pain",
+    "Pride",
+    "Realization",
+    "Relief",
+    "Romance",
+    "Sadness",
+    "Satisfaction",
+    "Shame",
+    "Surprise (negative)",
+    "Surprise (positive)",
+    "Sympathy",
+    "Tiredness",
+    "Triumph",
+)
+EMOTION_INDEX: Dict[str, int] = {name: i for i, name in enumerate(EMOTIONS)}
+
+MODALITIES: Tuple[str, ...] = ("face_emotions", "prosody_emotions", "burst_analysis")
+MODALITY_LABELS = {
+    "face_emotions": "FACE",
+    "prosody_emotions": "PROSODY",
+    "burst_analysis": "VOCAL BURSTS",
+}
+
+
+class ModalityArrays(NamedTuple):
+    """Timeline of one modality: ``timestamps`` in seconds, ``scores`` per emotion."""
+
+    timestamps: np.ndarray  # float64, shape (n,)
+    scores: np.ndarray  # float32, shape (n, len(EMOTIONS))
+
+    def __len__(self) -> int:  # type: ignore[override]
+        return int(self.timestamps.shape[0])
+
+
+def empty_arrays() -> ModalityArrays:
+    return ModalityArrays(
+        np.empty(0, dtype=np.float64), np.empty((0, len(EMOTIONS)), dtype=np.float32)
+    )
+
+
+def entry_time(entry: Dict[str, Any]) -> float:
+    """Return a frame's start time in seconds.
+
+    Face frames carry ``timestamp`` in milliseconds since session start; prosody
+    and burst predictions carry a ``time: {begin, end}`` range in seconds.
+    """
+    time_range = entry.get("time")
+    if isinstance(time_range, dict):
+        return float(time_range.get("begin") or 0.0)
+    timestamp = entry.get("timestamp")
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp) / 1000.0
+    return 0.0
+
+
+def fill_scores(entry: Dict[str, Any], row: np.ndarray) -> None:
+    """Write a frame's emotion scores into ``row`` (indexed by ``EMOTION_INDEX``).
+
+    Accepts both ``[{"name": n, "score": s}]`` and ``[{n: s}]`` / ``{n: s}``
+    shapes; names outside the vocabulary are ignored.
+    """
+    emotions = entry.get("emotions") or ()
+    if isinstance(emotions, dict):
+        emotions = (emotions,)
+    for emotion in emotions:
+        if "name" in emotion:
+            index = EMOTION_INDEX.get(emotion["name"])
+            if index is not None:
+                row[index] = emotion.get("score") or 0.0
+        else:
+            for name, score in emotion.items():
+                index = EMOTION_INDEX.get(name)
+                if index is not None:
+                    row[index] = score
+
+
+def modality_arrays(entries: Iterable[Dict[str, Any]]) -> ModalityArrays:
+    """Convert a list of timeline frames into dense, time-sorted arrays."""
+    entries = list(entries)
+    timestamps = np.empty(len(entries), dtype=np.float64)
+    scores = np.zeros((len(entries), len(EMOTIONS)), dtype=np.float32)
+    for i, entry in enumerate(entries):
+        timestamps[i] = entry_time(entry)
+        fill_scores(entry, scores[i])
+    if timestamps.size > 1 and np.any(np.diff(timestamps) < 0):
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, scores = timestamps[order], scores[order]
+    return ModalityArrays(timestamps, scores)
+
+
+class Timeline:
+    """Dense arrays for every modality of a session's emotion timeline."""
+
+    def __init__(self, modalities: Optional[Dict[str, ModalityArrays]] = None):
+        modalities = modalities or {}
+        self.modalities: Dict[str, ModalityArrays] = {
+            name: modalities.get(name, empty_arrays()) for name in MODALITIES
+        }
+
+    @classmethod
+    def from_hume_data(cls, hume_data: Dict[str, Any]) -> "Timeline":
+        emotion_timeline = hume_data.get("emotion_timeline") or {}
+        return cls(
+            {
+                name: modality_arrays(emotion_timeline.get(name) or ())
+                for name in MODALITIES
+            }
+        )
+
+    def __getitem__(self, name: str) -> ModalityArrays:
+        return self.modalities[name]
+
+    def __len__(self) -> int:
+        return sum(len(arrays) for arrays in self.modalities.values())
+
+    def to_emotion_timeline(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Rebuild wire-format frames (non-zero scores only) for raw prompt mode."""
+        emotion_timeline = {}
+        for name, arrays in self.modalities.items():
+            frames = []
+            for timestamp, row in zip(arrays.timestamps.tolist(), arrays.scores):
+                emotions = [
+                    {"name": EMOTIONS[i], "score": float(row[i])}
+                    for i in np.flatnonzero(row)
+                ]
+                if name == "face_emotions":
+                    frames.append(
+                        {"timestamp": timestamp * 1000.0, "emotions": emotions}
+                    )
+                else:
+                    frames.append({"time": {"begin": timestamp}, "emotions": emotions})
+            emotion_timeline[name] = frames
+        return emotion_timeline
+
+
+class ModalityBuffer:
+    """Append-only, amortized-growth arrays for one modality plus running aggregates.
+
+    Frames can arrive in small batches (and slightly out of order); the buffer
+    keeps ``count``/``sum``/``sum_sq``/``max`` per emotion up to date so
+    session-level statistics never require a pass over the stored frames.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        self._scores = np.zeros((capacity, len(EMOTIONS)), dtype=np.float32)
+        self.size = 0
+        self.sum = np.zeros(len(EMOTIONS), dtype=np.float64)
+        self.sum_sq = np.zeros(len(EMOTIONS), dtype=np.float64)
+        self.max = np.zeros(len(EMOTIONS), dtype=np.float32)
+        self._sorted = True
+
+    def _reserve(self, extra: int) -> None:
+        needed = self.size + extra
+        if needed <= self._timestamps.shape[0]:
+            return
+        capacity = max(needed, 2 * self._timestamps.shape[0])
+        timestamps = np.empty(capacity, dtype=np.float64)
+        scores = np.zeros((capacity, len(EMOTIONS)), dtype=np.float32)
+        timestamps[: self.size] = self._timestamps[: self.size]
+        scores[: self.size] = self._scores[: self.size]
+        self._timestamps, self._scores = timestamps, scores
+
+    def extend(self, entries: List[Dict[str, Any]]) -> None:
+        """Append raw wire-format frame dicts."""
+        if not entries:
+            return
+        self._reserve(len(entries))
+        start, end = self.size, self.size + len(entries)
+        block = self._scores[start:end]
+        for i, entry in enumerate(entries):
+            self._timestamps[start + i] = entry_time(entry)
+            fill_scores(entry, block[i])
+        self.extend_arrays(self._timestamps[start:end], block, copy=False)
+
+    def extend_frames(self, frames: Sequence[Any]) -> None:
+        """Append validated frames (``models.hume_input`` face/audio frames)."""
+        if not frames:
+            return
+        self._reserve(len(frames))
+        start, end = self.size, self.size + len(frames)
+        block = self._scores[start:end]
+        for i, frame in enumerate(frames):
+            self._timestamps[start + i] = frame.start_seconds
+            row = block[i]
+            for emotion in frame.emotions:
+                index = EMOTION_INDEX.get(emotion.name)
+                if index is not None:
+                    row[index] = emotion.score
+        self.extend_arrays(self._timestamps[start:end], block, copy=False)
+
+    def extend_arrays(
+        self, timestamps: np.ndarray, scores: np.ndarray, copy: bool = True
+    ) -> None:
+        """Append already-dense frames (``copy=False`` when written in place)."""
+        if copy:
+            self._reserve(timestamps.shape[0])
+            self._timestamps[self.size : self.size + timestamps.shape[0]] = timestamps
+            self._scores[self.size : self.size + timestamps.shape[0]] = scores
+        start, end = self.size, self.size + timestamps.shape[0]
+        if end == start:
+            return
+        previous = self._timestamps[start - 1] if start else -np.inf
+        if self._sorted and (
+            previous > timestamps[0] or np.any(np.diff(timestamps) < 0)
+        ):
+            self._sorted = False
+        block = self._scores[start:end].astype(np.float64)
+        self.sum += block.sum(axis=0)
+        self.sum_sq += (block * block).sum(axis=0)
+        np.maximum(self.max, self._scores[start:end].max(axis=0), out=self.max)
+        self.size = end
+
+    def arrays(self) -> ModalityArrays:
+        """Time-sorted view of the buffered frames.
+
+        Out-of-order frames are sorted into freshly allocated buffers, so views
+        handed out earlier are never rearranged underneath their holders.
+        """
+        if not self._sorted:
+            order = np.argsort(self._timestamps[: self.size], kind="stable")
+            timestamps = np.empty_like(self._timestamps)
+            scores = np.zeros_like(self._scores)
+            timestamps[: self.size] = self._timestamps[order]
+            scores[: self.size] = self._scores[order]
+            self._timestamps, self._scores = timestamps, scores
+            self._sorted = True
+        return ModalityArrays(self._timestamps[: self.size], self._scores[: self.size])
+
+    def mean(self) -> np.ndarray:
+        return self.sum / self.size if self.size else np.zeros(len(EMOTIONS))
+
+    @property
+    def nbytes(self) -> int:
+        return self._timestamps.nbytes + self._scores.nbytes
+
+
+class TimelineBuilder:
+    """Incrementally accumulates a ``Timeline`` from batches of wire-format frames."""
+
+    def __init__(self):
+        self.buffers: Dict[str, ModalityBuffer] = {
+            name: ModalityBuffer() for name in MODALITIES
+        }
+
+    def extend(self, modality: str, entries: List[Dict[str, Any]]) -> None:
+        self.buffers[modality].extend(entries)
+
+    def extend_frames(self, modality: str, frames: Sequence[Any]) -> None:
+        self.buffers[modality].extend_frames(frames)
+
+    def timeline(self) -> Timeline:
+        return Timeline(
+            {name: buffer.arrays() for name, buffer in self.buffers.items()}
+        )
+
+    def counts(self) -> Dict[str, int]:
+        return {name: buffer.size for name, buffer in self.buffers.items()}
+
+
+def window_stats(
+    arrays: ModalityArrays, window_seconds: float
+) -> Dict[str, np.ndarray]:
+    """Per-window, per-emotion mean, max, variance, slope and entropy.
+
+    Frames are bucketed into fixed windows from the first timestamp; empty
+    windows are dropped. Every statistic is computed with ``reduceat`` over
+    the contiguous (time-sorted) frames, so the cost is a handful of passes
+    over the score matrix regardless of the number of windows.
+
+    ``slope`` is the least-squares trend in score units per minute and
+    ``entropy`` is the normalized entropy of each emotion's score mass over
+    the window's frames (1.0 = evenly sustained, near 0 = a single spike).
+    """
+    timestamps = arrays.timestamps
+    scores = arrays.scores.astype(np.float64)
+    if timestamps.size == 0:
+        empty = np.empty((0, len(EMOTIONS)))
+        return {
+            "start": np.empty(0),
+            "end": np.empty(0),
+            "count": np.empty(0, dtype=np.int64),
+            "mean": empty,
+            "max": empty,
+            "var": empty,
+            "slope": empty,
+            "entropy": empty,
+        }
+
+    offsets = timestamps - timestamps[0]
+    if not np.isfinite(window_seconds) or window_seconds <= 0:
+        buckets = np.zeros(timestamps.size, dtype=np.int64)
+    else:
+        buckets = (offsets // window_seconds).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, timestamps.size])
+    n = counts[:, None].astype(np.float64)
+
+    sums = np.add.reduceat(scores, starts, axis=0)
+    mean = sums / n
+    var = np.maximum(
+        np.add.reduceat(scores * scores, starts, axis=0) / n - mean**2, 0.0
+    )
+
+    t = offsets[:, None]
+    t_sum = np.add.reduceat(t, starts, axis=0)
+    tt_sum = np.add.reduceat(t * t, starts, axis=0)
+    tx_sum = np.add.reduceat(t * scores, starts, axis=0)
+    t_var = tt_sum - t_sum**2 / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(t_var > 1e-12, (tx_sum - t_sum * mean) / t_var, 0.0) * 60.0
+
+        # H = log S - sum(x log x) / S for p = x / S, normalized by log(n).
+        safe_scores = np.where(scores > 0, scores, 1.0)
+        x_log_x = np.add.reduceat(scores * np.log(safe_scores), starts, axis=0)
+        safe_sums = np.where(sums > 0, sums, 1.0)
+        entropy = np.where(
+            (sums > 0) & (n > 1),
+            (np.log(safe_sums) - x_log_x / safe_sums) / np.log(np.maximum(n, 2.0)),
+            0.0,
+        )
+
+    ends = np.r_[starts[1:], timestamps.size] - 1
+    return {
+        "start": timestamps[starts],
+        "end": timestamps[ends],
+        "count": counts,
+        "mean": mean,
+        "max": np.maximum.reduceat(scores, starts, axis=0),
+        "var": var,
+        "slope": slope,
+        "entropy": np.clip(entropy, 0.0, 1.0),
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English/JSON text)."""
+    return len(text) // 4 + 1
+
+
+def _top_emotions(means: np.ndarray, top_k: int) -> np.ndarray:
+    top = np.argsort(-means, kind="stable")[:top_k]
+    return top[means[top] >= 0.005]
+
+
+def _render_modality(
+    label: str, arrays: ModalityArrays, window_seconds: float, top_k: int
+) -> List[str]:
+    overall = window_stats(arrays, float("inf"))
+    top = _top_emotions(overall["mean"][0], top_k)
+    span = arrays.timestamps[-1] - arrays.timestamps[0]
+    lines = [
+        f"{label}: {len(arrays)} frames over {span:.1f}s; overall top: "
+        + ", ".join(f"{EMOTIONS[i]} {overall['mean'][0][i]:.2f}" for i in top)
+    ]
+    if not np.isfinite(window_seconds) or window_seconds >= span:
+        return lines
+
+    stats = window_stats(arrays, window_seconds)
+    for w in range(stats["count"].size):
+        top = _top_emotions(stats["mean"][w], top_k)
+        cells = "; ".join(
+            f"{EMOTIONS[i]} mean {stats['mean'][w, i]:.2f} max {stats['max'][w, i]:.2f}"
+            f" var {stats['var'][w, i]:.3f} slope {stats['slope'][w, i]:+.2f}/min"
+            f" ent {stats['entropy'][w, i]:.2f}"
+            for i in top
+        )
+        lines.append(
+            f"  [{stats['start'][w]:.0f}-{stats['end'][w]:.0f}s n={stats['count'][w]}] {cells}"
+        )
+    return lines
+
+
+def render_summary(
+    timeline: Timeline,
+    window_seconds: float = 60.0,
+    token_budget: int = 4000,
+    top_k: int = 5,
+) -> str:
+    """Render the timeline as compact windowed statistics within ``token_budget``.
+
+    When the rendering is too large, fewer emotions per window are listed and
+    then windows are widened (doubled) until the text fits; as a last resort
+    only the whole-session line per modality is kept.
+    """
+    if not window_seconds > 0:
+        raise ValueError(f"window_seconds must be positive, got {window_seconds!r}")
+    present = [(name, timeline[name]) for name in MODALITIES if len(timeline[name])]
+    if not present:
+        return "No emotion timeline data available"
+
+    text = ""
+    while True:
+        text = "\n".join(
+            line
+            for name, arrays in present
+            for line in _render_modality(
+                MODALITY_LABELS[name], arrays, window_seconds, top_k
+            )
+        )
+        if estimate_tokens(text) <= token_budget or not np.isfinite(window_seconds):
+            break
+        if top_k > 3:
+            top_k -= 1
+        else:
+            longest = max(a.timestamps[-1] - a.timestamps[0] for _, a in present)
+            window_seconds = (
+                window_seconds * 2 if window_seconds * 2 < longest else float("inf")
+            )
+    window = (
+        f"{window_seconds:g}s windows"
+        if np.isfinite(window_seconds)
+        else "whole session"
+    )
+    return f"Emotion timeline summary ({window}, top {top_k} emotions per line)\n{text}"
@@ -0,0 +1,305 @@
+"""Prompt compiler for the assessment agent.
+
+The prompt is split into a static ``INSTRUCTIONS`` prefix, identical on every
+call so providers can cache it, and a per-session suffix. The suffix carries
+the transcript exactly once (conversation metadata is rendered without
+``transcript_messages``) and the transcript is compressed to a token budget:
+older agent turns are shortened and then elided, while user turns are always
+kept verbatim and the most recent turns are never touched.
+"""
+
+import hashlib
+import json
+import re
+import textwrap
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from agents.features import estimate_tokens
+
+USER_ROLE = "user"
+# conversation_data key carrying the previous provisional result of a live
+# session (services.live); the rest of the data is then only the new part
+PREVIOUS_ASSESSMENT_KEY = "previous_assessment"
+# conversation_data key carrying assessments of near-duplicate earlier
+# sessions (services.similarity), shown as reference examples
+SIMILAR_SESSIONS_KEY = "similar_sessions"
+KEEP_RECENT_TURNS = 8
+SUMMARY_WORDS = 12
+
+SYSTEM_PROMPT = """You are an expert autism assessment specialist with deep knowledge of DSM-5 criteria,
+developmental psychology, and behavioral analysis. Your role is to analyze multi-modal data (facial expressions,
+speech patterns, behavioral markers) and provide comprehensive autism spectrum disorder assessments.
+
+Focus on:
+- Social communication patterns and deficits
+- Restricted, repetitive patterns of behavior
+- Sensory processing differences
+- Age-appropriate developmental considerations
+- Masking and compensation strategies
+- Cultural and contextual factors
+
+Always provide confidence scores and acknowledge limitations of single-session assessments.
+Recommend appropriate professional follow-up when indicated."""
+
+INSTRUCTIONS = textwrap.dedent("""\
+    ASSESSMENT REQUIREMENTS:
+    The session transcript, metadata and multi-modal behavioral data follow this block.
+    Provide a comprehensive autism spectrum disorder assessment based on DSM-5 criteria, including:
+
+    1. CONVERSATION & SOCIAL COMMUNICATION ANALYSIS:
+       - Analyze the provided conversation transcript for autism-related patterns
+       - Turn-taking patterns and conversational flow
+       - Pragmatic language use and contextual appropriateness
+       - Social reciprocity markers in conversation exchanges
+       - Response patterns to avatar vs human interaction
+       - Eye contact indicators from facial data
+
+    2. BEHAVIORAL PATTERN ASSESSMENT:
+       - Repetitive behaviors from video analysis
+       - Sensory processing indicators from emotional responses
+       - Attention patterns and regulation markers
+       - Self-regulation behaviors
+
+    3. SPEECH & LANGUAGE EVALUATION:
+       - Prosodic patterns from speech analysis
+       - Vocal characteristics and modulation
+       - Language patterns and pragmatic usage
+
+    4. CONFIDENCE & UNCERTAINTY ANALYSIS:
+       - Overall assessment confidence based on data quality
+       - Areas of uncertainty or conflicting indicators
+       - Data sufficiency for reliable assessment
+
+    5. PROFESSIONAL RECOMMENDATIONS:
+       - Evaluation priority level (low/moderate/high/urgent)
+       - Suggested next steps for comprehensive assessment
+       - Monitoring recommendations
+
+    CRITICAL SCORING REQUIREMENTS:
+    - Base your assessment solely on the provided data. Do not infer or assume information not present in the conversation and behavioral data.
+    - ALL NUMERIC SCORES MUST BE DECIMAL VALUES BETWEEN 0.0 AND 1.0 (inclusive):
+      * 0.0 = no evidence/absence/lowest possible score
+      * 0.1-0.3 = minimal/low evidence or presence
+      * 0.4-0.6 = moderate/average evidence or presence
+      * 0.7-0.9 = strong/high evidence or presence
+      * 1.0 = definitive/maximum evidence/highest possible score
+    - Confidence scores: 0.0 = completely uncertain, 1.0 = completely certain
+    - Likelihood scores: 0.0 = definitely not present, 1.0 = definitely present
+    - Use decimal precision (e.g., 0.67, 0.23, 0.91) for nuanced scoring
+    - Every numeric field in the response must be a decimal between 0.0 and 1.0
+    - Lines marked "summarized" or "omitted" are compressed agent turns; user turns are verbatim.
+    - TURN-TAKING ANALYTICS, when present, are measured from the transcript timestamps (latencies, overlaps, questions, echo of the preceding turn); use them for turn-taking and response-timing judgements.
+    - LOCAL PRE-SCORES, when present, are deterministic statistics-based baselines; treat them as anchors and depart from them where the data supports it.
+    - SIMILAR PRIOR SESSIONS, when present, are assessments of earlier sessions whose transcript and affect profile closely match this one (similarity 0-1); use them as reference examples for calibration, never as a substitute for this session's evidence.
+    - A PREVIOUS PROVISIONAL ASSESSMENT, when present, covers the earlier part of a live session and the transcript and behavioral data cover only what happened since; update it with the new evidence rather than starting over, and let it carry the pre-scores' role for the earlier part.
+    """)
+
+# Stored with every assessment; changes whenever the static prompt text does.
+PROMPT_VERSION = hashlib.sha256(
+    f"{SYSTEM_PROMPT}\n{INSTRUCTIONS}".encode("utf-8")
+).hexdigest()[:12]
+
+FILLER_WORDS = {"um", "umm", "uh", "uhh", "erm", "hmm", "mm", "mhm", "mm-hmm", "uh-huh"}
+_WORD = re.compile(r"[\w'-]+")
+_REPEATED_FILLER = re.compile(
+    r"\b("
+    + "|".join(sorted(map(re.escape, FILLER_WORDS), key=len, reverse=True))
+    + r")\b(?:[\s,.]+\1\b)+",
+    re.IGNORECASE,
+)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+class CompiledPrompt(NamedTuple):
+    prefix: str
+    suffix: str
+    transcript_turns: int
+    compressed_turns: int
+
+    @property
+    def text(self) -> str:
+        return f"{self.prefix}\n{self.suffix}"
+
+    @property
+    def prefix_tokens(self) -> int:
+        return estimate_tokens(self.prefix)
+
+    @property
+    def suffix_tokens(self) -> int:
+        return estimate_tokens(self.suffix)
+
+    @property
+    def tokens(self) -> int:
+        return self.prefix_tokens + self.suffix_tokens
+
+
+class CompressedTranscript(NamedTuple):
+    lines: List[str]
+    compressed_turns: int
+
+
+class _Turn:
+    __slots__ = ("role", "text", "count", "level")
+
+    def __init__(self, role: str, text: str):
+        self.role = role
+        self.text = text
+        self.count = 1
+        self.level = 0  # 0 verbatim, 1 summarized, 2 omitted
+
+    def render(self) -> str:
+        if self.level == 1:
+            return f"[{self.role}, summarized]: {_summarize(self.text)}"
+        suffix = f" (x{self.count})" if self.count > 1 else ""
+        return f"[{self.role}]: {self.text}{suffix}"
+
+    def cost(self) -> int:
+        return 2 if self.level == 2 else estimate_tokens(self.render())
+
+
+def _is_filler(text: str) -> bool:
+    words = _WORD.findall(text.lower())
+    return bool(words) and all(word in FILLER_WORDS for word in words)
+
+
+def _summarize(text: str) -> str:
+    sentence = _SENTENCE_END.split(text, 1)[0]
+    words = sentence.split()
+    if len(words) > SUMMARY_WORDS:
+        return " ".join(words[:SUMMARY_WORDS]) + " ..."
+    return sentence if sentence == text else sentence + " ..."
+
+
+def _turns(messages: Iterable[Dict[str, Any]]) -> List[_Turn]:
+    """Normalize messages, dropping empty turns and merging repeated filler."""
+    turns: List[_Turn] = []
+    for msg in messages:
+        text = " ".join(str(msg.get("speech") or "").split())
+        if not text:
+            continue
+        text = _REPEATED_FILLER.sub(r"\1", text)
+        role = msg.get("role") or "unknown"
+        last = turns[-1] if turns else None
+        if (
+            last is not None
+            and last.role == role
+            and _is_filler(text)
+            and text.lower() == last.text.lower()
+        ):
+            last.count += 1
+            continue
+        turns.append(_Turn(role, text))
+    return turns
+
+
+def compress_transcript(
+    messages: Iterable[Dict[str, Any]],
+    token_budget: int,
+    keep_recent: int = KEEP_RECENT_TURNS,
+) -> CompressedTranscript:
+    """Render transcript lines within ``token_budget`` where possible.
+
+    Older non-user turns are summarized to their first sentence, oldest first,
+    and if that is not enough they are elided. User turns and the last
+    ``keep_recent`` turns are never compressed, so the budget is a target
+    rather than a guarantee.
+    """
+    turns = _turns(messages)
+    costs = [turn.cost() for turn in turns]
+    total = sum(costs)
+    compressible = [
+        i
+        for i, turn in enumerate(turns[: max(len(turns) - keep_recent, 0)])
+        if turn.role != USER_ROLE
+    ]
+    for level in (1, 2):
+        for i in compressible:
+            if total <= token_budget:
+                break
+            turns[i].level = level
+            cost = turns[i].cost()
+            total += cost - costs[i]
+            costs[i] = cost
+
+    lines: List[str] = []
+    omitted = 0
+    for turn in turns:
+        if turn.level == 2:
+            omitted += 1
+            continue
+        if omitted:
+            lines.append(f"[agent turns omitted: {omitted}]")
+            omitted = 0
+        lines.append(turn.render())
+    if omitted:
+        lines.append(f"[agent turns omitted: {omitted}]")
+    return CompressedTranscript(lines, sum(1 for turn in turns if turn.level))
+
+
+def _metadata(conversation_data: Dict[str, Any]) -> str:
+    fields = {
+        k: v
+        for k, v in conversation_data.items()
+        if k
+        not in ("transcript_messages", PREVIOUS_ASSESSMENT_KEY, SIMILAR_SESSIONS_KEY)
+    }
+    return json.dumps(fields, default=str, ensure_ascii=False, sort_keys=True)
+
+
+def compile_prompt(
+    session_id: str,
+    conversation_data: Dict[str, Any],
+    behavioral_data: Any,
+    transcript_token_budget: int,
+    now: Optional[datetime] = None,
+    anchors: Optional[str] = None,
+    turn_analytics: Optional[str] = None,
+) -> CompiledPrompt:
+    """Assemble the cacheable instruction prefix and the per-session suffix.
+
+    ``anchors`` is the rendered local pre-score section, placed after the
+    behavioral data it was computed from; ``turn_analytics`` (measured turn
+    timing, see ``agents.transcript``) follows the transcript.
+    """
+    messages = conversation_data.get("transcript_messages") or []
+    lines, compressed = compress_transcript(messages, transcript_token_budget)
+    sections = [
+        "AUTISM SPECTRUM ASSESSMENT REQUEST",
+        "",
+        f"Session ID: {session_id}",
+        f"Analysis Timestamp: {(now or datetime.now()).isoformat()}",
+        "",
+    ]
+    previous = conversation_data.get(PREVIOUS_ASSESSMENT_KEY)
+    if previous:
+        sections += [
+            "PREVIOUS PROVISIONAL ASSESSMENT:",
+            json.dumps(previous, default=str, ensure_ascii=False, sort_keys=True),
+            "",
+        ]
+    sections += [
+        "CONVERSATION TRANSCRIPT:",
+        "\n".join(lines) if lines else "No transcript data available",
+        "",
+    ]
+    if turn_analytics:
+        sections += ["TURN-TAKING ANALYTICS:", turn_analytics, ""]
+    sections += [
+        "CONVERSATION METADATA:",
+        _metadata(conversation_data),
+        "",
+        "MULTI-MODAL BEHAVIORAL DATA:",
+        str(behavioral_data),
+    ]
+    if anchors:
+        sections += ["", "LOCAL PRE-SCORES:", anchors]
+    similar = conversation_data.get(SIMILAR_SESSIONS_KEY)
+    if similar:
+        sections += ["", "SIMILAR PRIOR SESSIONS:"]
+        sections += [
+            json.dumps(record, default=str, ensure_ascii=False, sort_keys=True)
+            for record in similar
+        ]
+    suffix = "\n".join(sections)
+    return CompiledPrompt(INSTRUCTIONS, suffix, len(messages), compressed)
@@ -0,0 +1,330 @@
+"""Latency-aware routing across several assessment models.
+
+``ModelRouter`` looks like a single agent (``run`` / ``run_stream``) but sends
+each request to the first healthy model in its configured list. When that
+model has not answered by its estimated p95 latency, one hedge request goes to
+the next model and the first valid result wins; the loser is cancelled. A
+model that fails repeatedly is skipped by its circuit breaker until a
+cool-down has passed. Latency and error rate are tracked per model as EWMAs,
+so hedging adapts to the upstream's current behaviour and costs roughly the
+tail fraction of requests (~5%) rather than a second call every time.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from models.flat_assessment import FlatAutismAssessment
+from services.metrics import HEDGES, MODEL_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+Z_95 = 1.645
+
+
+class RouterExhaustedError(RuntimeError):
+    """Every candidate model failed or was unavailable."""
+
+
+class ModelStats:
+    """EWMA latency mean/variance and error rate for one model."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.samples = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.error_rate = 0.0
+
+    def record_success(self, latency: float) -> None:
+        if self.samples == 0:
+            self.mean = latency
+        else:
+            delta = latency - self.mean
+            self.mean += self.alpha * delta
+            self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+        self.samples += 1
+        self.error_rate *= 1 - self.alpha
+
+    def record_failure(self) -> None:
+        self.error_rate = (1 - self.alpha) * self.error_rate + self.alpha
+
+    def p95(self) -> float:
+        """Normal-approximation p95 of recent latencies."""
+        return self.mean + Z_95 * math.sqrt(self.var)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; allows one trial call after cool-down.
+
+    ``allow()`` claims a call slot: while half-open only one trial may be in
+    flight, and a trial that ends without an outcome (e.g. it was cancelled)
+    must hand its slot back with ``release()``.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+
+    @property
+    def available(self) -> bool:
+        """Whether ``allow()`` would currently grant a call (without claiming it)."""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._trial_in_flight)
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open" or self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def release(self) -> None:
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self._trial_in_flight = False
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self._trial_in_flight = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = self._clock()
+
+
+class ModelRoute:
+    def __init__(self, name: str, agent: Any, breaker: CircuitBreaker):
+        self.name = name
+        self.agent = agent
+        self.breaker = breaker
+        self.stats = ModelStats()
+
+
+class ModelRouter:
+    """Agent-compatible router over several models with hedging and breakers."""
+
+    def __init__(
+        self,
+        routes: Sequence[ModelRoute],
+        default_hedge_after: float = 20.0,
+        min_hedge_after: float = 1.0,
+        min_samples: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not routes:
+            raise ValueError("ModelRouter needs at least one model")
+        self.routes = list(routes)
+        self.default_hedge_after = default_hedge_after
+        self.min_hedge_after = min_hedge_after
+        self.min_samples = min_samples
+        self._clock = clock
+
+    @classmethod
+    def from_agents(cls, agents: Sequence[Any], names=None, **kwargs) -> "ModelRouter":
+        """Router over ready-made agents (e.g. local stand-ins in tests)."""
+        names = names or [f"model-{i}" for i in range(len(agents))]
+        clock = kwargs.get("clock", time.monotonic)
+        breaker_kwargs = {
+            k: kwargs.pop(k)
+            for k in ("failure_threshold", "cooldown_seconds")
+            if k in kwargs
+        }
+        return cls(
+            [
+                ModelRoute(name, agent, CircuitBreaker(clock=clock, **breaker_kwargs))
+                for name, agent in zip(names, agents)
+            ],
+            **kwargs,
+        )
+
+    def hedge_after(self, route: ModelRoute) -> float:
+        if route.stats.samples < self.min_samples:
+            return self.default_hedge_after
+        return max(self.min_hedge_after, route.stats.p95())
+
+    def candidates(self, streaming: bool = False) -> List[ModelRoute]:
+        return [
+            route
+            for route in self.routes
+            if route.breaker.available
+            and not (streaming and _accepts_compiled(route.agent))
+        ]
+
+    async def _attempt(self, route: ModelRoute, prompt: Any):
+        started = self._clock()
+        try:
+            result = await route.agent.run(_prompt_for(route.agent, prompt))
+            if not isinstance(result.data, FlatAutismAssessment):
+                result.data = FlatAutismAssessment.model_validate(result.data)
+        except asyncio.CancelledError:
+            route.breaker.release()
+            MODEL_REQUESTS.inc(model=route.name, outcome="cancelled")
+            raise
+        except Exception:
+            route.stats.record_failure()
+            route.breaker.record_failure()
+            MODEL_REQUESTS.inc(model=route.name, outcome="error")
+            raise
+        route.stats.record_success(self._clock() - started)
+        route.breaker.record_success()
+        MODEL_REQUESTS.inc(model=route.name, outcome="success")
+        return result
+
+    async def run(self, prompt: Any):
+        """Return the first valid result; ``result.model_name`` names the winner.
+
+        ``prompt`` is a string or a ``CompiledPrompt``; routes whose agent sets
+        ``accepts_compiled`` (the context-cache route) get the compiled prompt,
+        every other route its ``text``.
+        """
+        queue = self.candidates()
+        if not queue:
+            raise RouterExhaustedError("all models are circuit-broken")
+
+        pending = {}
+        last_error: Optional[BaseException] = None
+        try:
+            while queue or pending:
+                if queue and len(pending) < 2:
+                    route = queue.pop(0)
+                    if not route.breaker.allow():
+                        continue  # half-open trial already claimed elsewhere
+                    task = asyncio.ensure_future(self._attempt(route, prompt))
+                    pending[task] = route
+                    # at most one hedge in flight: arm the timer only while a
+                    # second slot and a second model are both available
+                    hedge = queue and len(pending) < 2
+                    timeout = self.hedge_after(route) if hedge else None
+                else:
+                    timeout = None
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    HEDGES.inc()
+                    logger.info(
+                        "Hedging: %s exceeded %.2fs",
+                        pending[next(iter(pending))].name,
+                        timeout,
+                    )
+                    continue
+                for task in done:
+                    route = pending.pop(task)
+                    if task.exception() is None:
+                        result = task.result()
+                        try:
+                            result.model_name = route.name
+                        except AttributeError:
+                            pass
+                        return result
+                    last_error = task.exception()
+                    logger.warning("Model %s failed: %s", route.name, last_error)
+        finally:
+            for task in pending:
+                task.cancel()
+            # let cancelled attempts record their outcome before returning
+            await asyncio.gather(*pending, return_exceptions=True)
+        raise RouterExhaustedError(f"all models failed: {last_error}") from last_error
+
+    @asynccontextmanager
+    async def run_stream(self, prompt: Any):
+        """Stream from the first healthy model (no hedging once tokens flow)."""
+        route = next(
+            (r for r in self.candidates(streaming=True) if r.breaker.allow()), None
+        )
+        if route is None:
+            raise RouterExhaustedError("all models are circuit-broken")
+        started = self._clock()
+        try:
+            async with route.agent.run_stream(
+                getattr(prompt, "text", prompt)
+            ) as result:
+                yield result
+        except asyncio.CancelledError:
+            route.breaker.release()
+            raise
+        except Exception:
+            route.stats.record_failure()
+            route.breaker.record_failure()
+            MODEL_REQUESTS.inc(model=route.name, outcome="error")
+            raise
+        route.stats.record_success(self._clock() - started)
+        route.breaker.record_success()
+        MODEL_REQUESTS.inc(model=route.name, outcome="success")
+
+    def stats(self) -> List[dict]:
+        return [
+            {
+                "model": route.name,
+                "breaker": route.breaker.state,
+                "samples": route.stats.samples,
+                "latency_mean": route.stats.mean,
+                "latency_p95": route.stats.p95(),
+                "error_rate": route.stats.error_rate,
+            }
+            for route in self.routes
+        ]
+
+
+def _accepts_compiled(agent: Any) -> bool:
+    return getattr(agent, "accepts_compiled", False)
+
+
+def _prompt_for(agent: Any, prompt: Any) -> Any:
+    return prompt if _accepts_compiled(agent) else getattr(prompt, "text", prompt)
+
+
+def router_from_env(
+    agent_factory: Callable[[str], Any],
+    preferred: Sequence[Tuple[str, Any]] = (),
+) -> ModelRouter:
+    """Build a router for ``ANALYZER_MODELS`` (comma-separated, in preference order).
+
+    ``preferred`` ``(name, agent)`` pairs are tried before the configured
+    models, with the same breaker settings and hedging.
+    """
+    names = [
+        name.strip()
+        for name in os.getenv(
+            "ANALYZER_MODELS", "gemini-2.5-pro,gemini-2.5-flash"
+        ).split(",")
+        if name.strip()
+    ]
+    breaker_kwargs = {
+        "failure_threshold": int(os.getenv("ANALYZER_BREAKER_FAILURES", "3")),
+        "cooldown_seconds": float(os.getenv("ANALYZER_BREAKER_COOLDOWN_SECONDS", "60")),
+    }
+    agents = list(preferred) + [(name, agent_factory(name)) for name in names]
+    return ModelRouter(
+        [
+            ModelRoute(name, agent, CircuitBreaker(**breaker_kwargs))
+            for name, agent in agents
+        ],
+        default_hedge_after=float(os.getenv("ANALYZER_HEDGE_AFTER_SECONDS", "20")),
+    )
@@ -0,0 +1,452 @@
+"""Deterministic local pre-scores computed from timeline and transcript statistics.
+
+Every feature is a handful of vectorized NumPy reductions over the timeline
+arrays, so a 60 minute session scores in milliseconds. The scores serve two
+purposes: they are given to the model as anchors (``render_anchors``) and they
+are the degraded-mode answer when no model is reachable
+(``fallback_assessment``), replacing random placeholder values.
+
+Domain scores follow the prompt's convention: 0.0 = no evidence of
+autism-associated atypicality in that domain, 1.0 = strong evidence. When the
+data for a feature is missing its domain falls back to an uninformative 0.5
+and the confidence drops accordingly. These are screening heuristics, not a
+clinical instrument.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from agents.features import EMOTION_INDEX, ModalityArrays, Timeline
+from agents.transcript import SLOW_RESPONSE_SECONDS, analyze_turns
+from models.flat_assessment import FlatAutismAssessment
+
+logger = logging.getLogger(__name__)
+
+NEUTRAL_EMOTIONS = (
+    "Calmness",
+    "Boredom",
+    "Tiredness",
+    "Concentration",
+    "Contemplation",
+)
+SOCIAL_EMOTIONS = ("Joy", "Amusement", "Interest", "Excitement", "Admiration")
+DISTRESS_EMOTIONS = ("Distress", "Anxiety", "Fear", "Pain", "Horror", "Disgust")
+
+FACE_GAP_SECONDS = 2.0
+SPIKE_THRESHOLD = 0.5
+SPIKE_WINDOW_SECONDS = 10.0
+# numeric transcript timestamps above this are epoch milliseconds
+EPOCH_MS_THRESHOLD = 1e11
+# median turn gap above this means session-relative milliseconds
+MS_GAP_THRESHOLD = 100.0
+
+DOMAIN_FIELDS = (
+    "social_communication_score",
+    "repetitive_behaviors_score",
+    "sensory_processing_score",
+    "eye_contact_score",
+    "facial_expression_score",
+    "prosody_score",
+    "vocal_characteristics_score",
+)
+_LABELS = {
+    "social_communication_score": "social communication",
+    "repetitive_behaviors_score": "repetitive behaviors",
+    "sensory_processing_score": "sensory processing",
+    "eye_contact_score": "eye contact (face-presence proxy)",
+    "facial_expression_score": "facial expressiveness",
+    "prosody_score": "prosody",
+    "vocal_characteristics_score": "vocal characteristics",
+}
+
+
+class LocalScores(NamedTuple):
+    scores: Dict[str, float]
+    features: Dict[str, Optional[float]]
+    confidence: float
+    missing: Tuple[str, ...]
+
+
+def _columns(names: Iterable[str]) -> np.ndarray:
+    return np.array([EMOTION_INDEX[name] for name in names])
+
+
+_NEUTRAL = _columns(NEUTRAL_EMOTIONS)
+_SOCIAL = _columns(SOCIAL_EMOTIONS)
+_DISTRESS = _columns(DISTRESS_EMOTIONS)
+
+
+def _clip(value: float) -> float:
+    return float(np.clip(value, 0.0, 1.0))
+
+
+def _parse_time(value: Any) -> Tuple[float, bool]:
+    """``(time, numeric)`` for an ISO-8601 string or a number; NaN if unparseable.
+
+    ISO strings become epoch seconds; numbers (or numeric strings) are returned
+    in their own unit and flagged so ``message_times`` can pick the unit.
+    """
+    if value is None or isinstance(value, bool):
+        return np.nan, False
+    if isinstance(value, (int, float)):
+        return float(value), True
+    text = str(value).strip()
+    try:
+        return float(text), True
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp(), False
+    except ValueError:
+        return np.nan, False
+
+
+def _parse_times(values: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """``_parse_time`` over a list: times and the numeric flag per value.
+
+    Uniform lists of UTC ISO strings (``...Z``) or of numbers are converted in
+    one NumPy call; anything else is parsed value by value.
+    """
+    utc = [v[:-1] for v in values if type(v) is str and v[-1:] == "Z"]
+    if values and len(utc) == len(values):
+        try:
+            stamps = np.array(utc, dtype="datetime64[us]")
+        except ValueError:
+            pass
+        else:
+            times = stamps.astype(np.int64) / 1e6
+            times[np.isnat(stamps)] = np.nan
+            return times, np.zeros(len(values), dtype=bool)
+    if all(type(v) in (int, float) for v in values):
+        return np.array(values, dtype=np.float64), np.ones(len(values), dtype=bool)
+    parsed = [_parse_time(v) for v in values]
+    times = np.array([time for time, _ in parsed], dtype=np.float64)
+    numeric = np.array([is_number for _, is_number in parsed], dtype=bool)
+    return times, numeric
+
+
+def message_times(messages: List[Dict[str, Any]], key: str = "timestamp") -> np.ndarray:
+    """Message ``key`` timestamps in seconds (NaN where missing or unparseable).
+
+    Numeric timestamps may be epoch or session-relative, in seconds or
+    milliseconds: epoch milliseconds are recognised by magnitude and relative
+    milliseconds by a median turn gap above ``MS_GAP_THRESHOLD``.
+    """
+    times, numeric = _parse_times([m.get(key) for m in messages])
+    if numeric.any():
+        values = times[numeric]
+        gaps = np.diff(values)
+        gaps = gaps[gaps > 0]
+        if values.max() > EPOCH_MS_THRESHOLD or (
+            gaps.size and np.median(gaps) > MS_GAP_THRESHOLD
+        ):
+            times[numeric] = values / 1000.0
+    unparsed = int(np.count_nonzero(~np.isfinite(times)))
+    if unparsed:
+        logger.warning(
+            "%d of %d transcript %s values could not be parsed; "
+            "turn timing features use the rest",
+            unparsed,
+            len(messages),
+            key,
+        )
+    return times
+
+
+def face_features(face: ModalityArrays, duration: float) -> Dict[str, Optional[float]]:
+    if len(face) < 2:
+        return {}
+    scores = face.scores
+    mass = scores.sum(axis=1, dtype=np.float64)
+    mass[mass == 0] = 1.0
+    dominant = scores.argmax(axis=1)
+    gaps = np.diff(face.timestamps)
+    span = max(duration, float(face.timestamps[-1] - face.timestamps[0]), 1e-9)
+    return {
+        "face_variability": float(scores.std(axis=0, dtype=np.float64).mean()),
+        "face_neutral_share": float(
+            (scores[:, _NEUTRAL].sum(axis=1, dtype=np.float64) / mass).mean()
+        ),
+        "face_social_affect": float(scores[:, _SOCIAL].mean()),
+        "face_expression_changes_per_min": float(
+            np.count_nonzero(dominant[1:] != dominant[:-1]) * 60.0 / span
+        ),
+        "face_absent_fraction": float(gaps[gaps > FACE_GAP_SECONDS].sum() / span),
+    }
+
+
+def _spike_rate(arrays: ModalityArrays) -> Optional[float]:
+    """Fraction of short windows containing a distress-emotion spike."""
+    if len(arrays) == 0:
+        return None
+    buckets = (
+        (arrays.timestamps - arrays.timestamps[0]) // SPIKE_WINDOW_SECONDS
+    ).astype(np.int64)
+    spikes = arrays.scores[:, _DISTRESS].max(axis=1) > SPIKE_THRESHOLD
+    windows = np.unique(buckets)
+    return float(np.unique(buckets[spikes]).size / windows.size)
+
+
+def audio_features(
+    prosody: ModalityArrays, bursts: ModalityArrays, duration: float
+) -> Dict[str, Optional[float]]:
+    features: Dict[str, Optional[float]] = {}
+    if len(prosody) >= 2:
+        features["prosody_variability"] = float(
+            prosody.scores.std(axis=0, dtype=np.float64).mean()
+        )
+    # with no audio track at all a zero burst rate would be meaningless
+    if duration > 0 and (len(prosody) or len(bursts)):
+        features["bursts_per_min"] = len(bursts) * 60.0 / duration
+    return features
+
+
+def transcript_features(messages: List[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    if not messages:
+        return {}
+    end_times = None
+    if any("end_timestamp" in m for m in messages):
+        end_times = message_times(messages, "end_timestamp")
+    return analyze_turns(messages, message_times(messages), end_times)
+
+
+def _session_duration(conversation_data: Dict[str, Any], timeline: Timeline) -> float:
+    try:
+        duration = float(conversation_data.get("duration") or 0.0)
+    except (TypeError, ValueError):
+        duration = 0.0
+    if duration > 0:
+        return duration
+    ends = [
+        a.timestamps[-1] - a.timestamps[0]
+        for a in timeline.modalities.values()
+        if len(a)
+    ]
+    return float(max(ends, default=0.0))
+
+
+def score_session(conversation_data: Dict[str, Any], timeline: Timeline) -> LocalScores:
+    """Compute baseline domain scores for a session."""
+    duration = _session_duration(conversation_data, timeline)
+    messages = conversation_data.get("transcript_messages") or []
+    features: Dict[str, Optional[float]] = {}
+    features.update(face_features(timeline["face_emotions"], duration))
+    features.update(
+        audio_features(
+            timeline["prosody_emotions"], timeline["burst_analysis"], duration
+        )
+    )
+    features.update(transcript_features(messages))
+    spike_rates = [
+        rate
+        for rate in (
+            _spike_rate(timeline["face_emotions"]),
+            _spike_rate(timeline["burst_analysis"]),
+        )
+        if rate is not None
+    ]
+    if spike_rates:
+        features["distress_spike_rate"] = float(np.mean(spike_rates))
+
+    def feature(name: str) -> Optional[float]:
+        return features.get(name)
+
+    def combine(*parts: Optional[float]) -> Optional[float]:
+        present = [p for p in parts if p is not None]
+        return _clip(float(np.mean(present))) if present else None
+
+    flatness = None
+    if feature("face_variability") is not None:
+        flatness = combine(
+            feature("face_neutral_share"),
+            1.0 - feature("face_variability") / 0.15,
+            1.0 - feature("face_expression_changes_per_min") / 20.0,
+        )
+    prosody_flatness = (
+        _clip(1.0 - feature("prosody_variability") / 0.12)
+        if feature("prosody_variability") is not None
+        else None
+    )
+    burst_atypicality = (
+        _clip(abs(feature("bursts_per_min") - 2.0) / 6.0)
+        if feature("bursts_per_min") is not None
+        else None
+    )
+    latency = (
+        combine(
+            feature("slow_response_fraction"),
+            (feature("response_latency_median") or 0.0) / (2 * SLOW_RESPONSE_SECONDS),
+        )
+        if feature("response_latency_median") is not None
+        else None
+    )
+    brevity = (
+        _clip(1.0 - (feature("user_words_per_turn") - 2.0) / 10.0)
+        if feature("user_words_per_turn") is not None
+        else None
+    )
+    low_social_affect = (
+        _clip(1.0 - feature("face_social_affect") / 0.3)
+        if feature("face_social_affect") is not None
+        else None
+    )
+
+    domains = {
+        "social_communication_score": combine(latency, brevity, low_social_affect),
+        "repetitive_behaviors_score": (
+            _clip(2.0 * feature("user_repeat_ratio"))
+            if feature("user_repeat_ratio") is not None
+            else None
+        ),
+        "sensory_processing_score": (
+            _clip(2.0 * feature("distress_spike_rate"))
+            if feature("distress_spike_rate") is not None
+            else None
+        ),
+        "eye_contact_score": (
+            _clip(1.5 * feature("face_absent_fraction"))
+            if feature("face_absent_fraction") is not None
+            else None
+        ),
+        "facial_expression_score": flatness,
+        "prosody_score": prosody_flatness,
+        "vocal_characteristics_score": combine(prosody_flatness, burst_atypicality),
+    }
+    missing = tuple(name for name, value in domains.items() if value is None)
+    scores = {name: round(0.5 if v is None else v, 3) for name, v in domains.items()}
+
+    coverage = 1.0 - len(missing) / len(domains)
+    length = min(duration / 600.0, 1.0)  # ten minutes of data counts as enough
+    confidence = round(_clip(0.2 + 0.6 * coverage * (0.3 + 0.7 * length)), 3)
+
+    scores.update(derive_scores(scores))
+    return LocalScores(scores, features, confidence, missing)
+
+
+def derive_scores(scores: Dict[str, float]) -> Dict[str, float]:
+    """DSM-5 aligned and overall scores implied by the ``DOMAIN_FIELDS`` scores."""
+    derived = {
+        "social_communication_deficits": round(
+            _clip(
+                0.7 * scores["social_communication_score"]
+                + 0.3 * scores["facial_expression_score"]
+            ),
+            3,
+        ),
+        "restricted_repetitive_behaviors": round(
+            _clip(
+                0.8 * scores["repetitive_behaviors_score"]
+                + 0.2 * scores["sensory_processing_score"]
+            ),
+            3,
+        ),
+    }
+    overall = _clip(
+        0.35 * derived["social_communication_deficits"]
+        + 0.25 * derived["restricted_repetitive_behaviors"]
+        + 0.15 * scores["sensory_processing_score"]
+        + 0.25
+        * np.mean(
+            [
+                scores["eye_contact_score"],
+                scores["facial_expression_score"],
+                scores["prosody_score"],
+                scores["vocal_characteristics_score"],
+            ]
+        )
+    )
+    derived["overall_autism_likelihood"] = round(overall, 3)
+    derived["functional_impairment"] = round(_clip(0.8 * overall), 3)
+    return derived
+
+
+def render_anchors(local: LocalScores) -> str:
+    """Prompt section listing the local scores and the features behind them."""
+    lines = [
+        f"Deterministic baseline (confidence {local.confidence:.2f}); "
+        "use as anchors and adjust with evidence from the transcript and timeline."
+    ]
+    for name, value in local.scores.items():
+        note = " (no data, neutral prior)" if name in local.missing else ""
+        lines.append(f"- {name}: {value:.2f}{note}")
+    measured = ", ".join(
+        f"{name}={value:.3g}"
+        for name, value in local.features.items()
+        if value is not None
+    )
+    if measured:
+        lines.append(f"Measured features: {measured}")
+    return "\n".join(lines)
+
+
+def support_level(overall: float) -> str:
+    if overall >= 0.75:
+        return "level_3"
+    if overall >= 0.55:
+        return "level_2"
+    return "level_1"
+
+
+def evaluation_priority(overall: float, confidence: float) -> str:
+    if overall >= 0.75:
+        return "urgent" if confidence >= 0.6 else "high"
+    if overall >= 0.55:
+        return "high"
+    if overall >= 0.35 or confidence < 0.5:
+        return "moderate"
+    return "low"
+
+
+def fallback_assessment(
+    local: LocalScores, session_id: str, timestamp: Optional[datetime] = None
+) -> FlatAutismAssessment:
+    """Degraded-mode assessment built only from the local scores."""
+    timestamp = timestamp or datetime.now()
+    domains = sorted(DOMAIN_FIELDS, key=lambda name: -local.scores[name])
+    concerns = [
+        _LABELS[name]
+        for name in domains
+        if local.scores[name] >= 0.5 and name not in local.missing
+    ][:3]
+    strengths = [
+        _LABELS[name]
+        for name in reversed(domains)
+        if local.scores[name] < 0.3 and name not in local.missing
+    ][:3]
+    overall = local.scores["overall_autism_likelihood"]
+    missing = ", ".join(_LABELS[name] for name in local.missing)
+    return FlatAutismAssessment(
+        session_id=session_id,
+        timestamp=timestamp.isoformat(),
+        analysis_version="1.0-local",
+        assessment_confidence=min(local.confidence, 0.5),
+        support_level=support_level(overall),
+        evaluation_priority=evaluation_priority(overall, local.confidence),
+        primary_concerns=(
+            "Elevated local indicators: " + ", ".join(concerns)
+            if concerns
+            else "No domain exceeded the local screening threshold"
+        ),
+        observed_strengths=(
+            "Typical-range indicators: " + ", ".join(strengths)
+            if strengths
+            else "No clear strengths identified from timeline statistics alone"
+        ),
+        key_recommendations=(
+            "Seek professional clinical assessment; re-run the full analysis "
+            "when the language model is available"
+        ),
+        assessment_limitations=(
+            "Automated local pre-score from emotion-timeline and transcript "
+            "statistics without language-model review"
+            + (f"; no data for: {missing}" if missing else "")
+        ),
+        **{
+            name: value
+            for name, value in local.scores.items()
+            if name in FlatAutismAssessment.model_fields
+        },
+    )
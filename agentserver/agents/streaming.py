@@ -0,0 +1,173 @@
+"""Incremental extraction of assessment fields from a streamed agent run.
+
+The model emits ``FlatAutismAssessment`` as one JSON object (a tool call's
+arguments) in schema order: scores first, then the text summaries.
+``PartialObjectParser`` walks that text as it grows and reports a top-level
+field only once the delimiter after it has arrived, so a number like ``0.6``
+is never reported before it turns out to be ``0.67``.
+"""
+
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+_WHITESPACE = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+
+class PartialObjectParser:
+    """Push parser reporting completed top-level ``(key, value)`` pairs."""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._key: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def _skip_whitespace(self) -> None:
+        while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+            self._pos += 1
+
+    def _expect(self, chars: str) -> str:
+        char = self._buf[self._pos]
+        if char not in chars:
+            raise ValueError(f"Unexpected {char!r} at offset {self._pos}")
+        self._pos += 1
+        return char
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        self._buf += text
+        fields: List[Tuple[str, Any]] = []
+        while not self.done:
+            self._skip_whitespace()
+            if self._pos >= len(self._buf):
+                break
+            if self._state == "start":
+                self._expect("{")
+                self._state = "first_key"
+            elif self._state in ("first_key", "key"):
+                if self._state == "first_key" and self._buf[self._pos] == "}":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                if self._buf[self._pos] != '"':
+                    self._expect('"')
+                try:
+                    self._key, end = _decoder.raw_decode(self._buf, self._pos)
+                except json.JSONDecodeError:
+                    break  # key still arriving
+                self._pos = end
+                self._state = "colon"
+            elif self._state == "colon":
+                self._expect(":")
+                self._state = "value"
+            elif self._state == "value":
+                try:
+                    value, end = _decoder.raw_decode(self._buf, self._pos)
+                except json.JSONDecodeError:
+                    break  # value still arriving
+                delimiter = end
+                while (
+                    delimiter < len(self._buf) and self._buf[delimiter] in _WHITESPACE
+                ):
+                    delimiter += 1
+                if delimiter >= len(self._buf):
+                    break  # a number may still grow; wait for the delimiter
+                if delimiter == end and self._buf[end] not in ",}":
+                    break  # number prefix such as "0." or "1e"; wait for more
+                self._pos = delimiter
+                self._state = "key" if self._expect(",}") == "," else "done"
+                fields.append((self._key, value))
+        if self._pos > 4096:
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+        return fields
+
+
+class FieldTracker:
+    """Turn cumulative snapshots (JSON text, dicts or models) into new fields."""
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self._parser = PartialObjectParser()
+        self._text = ""
+
+    def update(self, snapshot: Any, final: bool = False) -> Dict[str, Any]:
+        if snapshot is None:
+            return {}
+        if isinstance(snapshot, str):
+            if not snapshot.startswith(self._text):
+                return {}
+            items = self._parser.feed(snapshot[len(self._text) :])
+            self._text = snapshot
+        else:
+            if isinstance(snapshot, BaseModel):
+                snapshot = snapshot.model_dump(exclude_unset=True)
+            items = list(snapshot.items())
+            if not final:
+                items = items[:-1]  # the last field may still be growing
+        new = {k: v for k, v in items if k not in self.fields}
+        self.fields.update(new)
+        return new
+
+
+def _tool_args(message: Any) -> Any:
+    """Structured output arguments from a (partial) model response, if any."""
+    parts = getattr(message, "parts", None) or getattr(message, "calls", None) or []
+    for part in parts:
+        args = getattr(part, "args", None)
+        if args is None:
+            continue
+        for attr in ("args_json", "args_dict"):
+            if hasattr(args, attr):
+                return getattr(args, attr)
+        return args
+    return None
+
+
+async def _final_output(result: Any) -> Any:
+    for name in ("get_output", "get_data"):
+        getter = getattr(result, name, None)
+        if getter is not None:
+            value = getter()
+            return await value if hasattr(value, "__await__") else value
+    return None
+
+
+async def stream_fields(
+    agent: Any, prompt: str, on_finish: Optional[Callable[[Any], None]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield dicts of newly completed assessment fields as the agent produces them.
+
+    Agents without ``run_stream`` are run normally and yield every field at once.
+    """
+    tracker = FieldTracker()
+    run_stream = getattr(agent, "run_stream", None)
+    if run_stream is None:
+        result = await agent.run(prompt)
+        if on_finish is not None:
+            on_finish(result)
+        yield tracker.update(result.data, final=True)
+        return
+
+    async with run_stream(prompt) as result:
+        if hasattr(result, "stream_structured"):
+            async for message, _last in result.stream_structured():
+                new = tracker.update(_tool_args(message))
+                if new:
+                    yield new
+        else:
+            async for snapshot in result.stream():
+                new = tracker.update(snapshot)
+                if new:
+                    yield new
+        new = tracker.update(await _final_output(result), final=True)
+        if new:
+            yield new
+        if on_finish is not None:
+            on_finish(result)
@@ -0,0 +1,293 @@
+"""Turn-timing and reciprocity analytics for conversation transcripts.
+
+``analyze_turns`` tokenizes ``transcript_messages`` once into a flat array of
+word hashes and then reduces per-turn arrays with NumPy, with no per-turn
+Python loop:
+
+- response latency: start-to-start time from an agent turn to the user turn
+  answering it (and the reverse for the agent);
+- turn lengths in words per role;
+- overlaps and interruptions: a turn starting before the previous speaker's
+  turn ended, using explicit end times (``end_timestamp``) when messages carry
+  them and a speaking-rate estimate otherwise;
+- questions: the share of each role's turns that are questions and how many
+  agent questions got a non-empty user answer;
+- echo: word-bigram overlap of a user turn with the agent turn before it (a
+  proxy for echolalia; one-word turns compare single words).
+
+The result is a flat dict of features: ``agents.scoring`` merges it into the
+local features (anchors, fallback scores and the measured fields of the
+response) and ``render_turn_analytics`` turns it into a prompt section.
+"""
+
+import string
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+USER_ROLE = "user"
+QUESTION_WORDS = frozenset(
+    "who what when where why how which whose whom do does did is are was were "
+    "can could will would should shall may might have has".split()
+)
+SLOW_RESPONSE_SECONDS = 3.0
+# an overlap counts as an interruption when the new turn starts this long
+# before the previous one ended
+INTERRUPTION_SECONDS = 0.5
+# speaking rate used to estimate when a turn without an end time ended
+WORDS_PER_SECOND = 2.5
+# echo share at which a user turn counts as echoing the agent turn before it
+ECHO_THRESHOLD = 0.5
+
+# Features copied onto every response (FlatAutismAssessment fields of the
+# same name); computed locally, never by the model.
+MEASURED_FIELDS = (
+    "response_latency_median",
+    "response_latency_p90",
+    "user_words_per_turn",
+    "overlaps",
+    "user_interruptions",
+    "agent_question_share",
+    "agent_questions_answered",
+    "echo_mean",
+)
+
+# punctuation other than apostrophes separates words
+_SEPARATORS = str.maketrans({c: " " for c in string.punctuation if c != "'"})
+_TURN_BREAK = "\x00"
+# odd 64-bit multiplier (golden ratio) salting word hashes with their turn or
+# position, so per-turn set operations become sorts over one int64 array
+_SALT = np.int64(-7046029254386353131)
+_QUESTION_HASHES = np.array([hash(word) for word in QUESTION_WORDS], dtype=np.int64)
+
+
+def tokenize(speeches: List[str]) -> List[List[str]]:
+    """Lower-cased words of every turn.
+
+    The turns are joined so lower-casing and punctuation stripping run once
+    over the whole transcript; only the final split is per turn.
+    """
+    parts = _TURN_BREAK.join(speeches).lower().translate(_SEPARATORS).split(_TURN_BREAK)
+    if len(parts) != len(speeches):  # a turn contained the separator itself
+        parts = [speech.lower().translate(_SEPARATORS) for speech in speeches]
+    return [part.split() for part in parts]
+
+
+class _Tokens(NamedTuple):
+    """Every word of a transcript as one flat array of string hashes."""
+
+    words: np.ndarray  # int64 (w,) hash of each word, in transcript order
+    turn: np.ndarray  # int64 (w,) turn each word belongs to
+    start: np.ndarray  # int64 (n,) index of each turn's first word
+    count: np.ndarray  # int64 (n,) words per turn
+
+
+def _hashed_tokens(speeches: List[str]) -> _Tokens:
+    # one split over the whole transcript; the break is its own token
+    flat = f" {_TURN_BREAK} ".join(speeches).lower().translate(_SEPARATORS).split()
+    hashes = np.fromiter(map(hash, flat), dtype=np.int64, count=len(flat))
+    is_break = hashes == hash(_TURN_BREAK)
+    if np.count_nonzero(is_break) != len(speeches) - 1:
+        # a turn contained the separator itself
+        return _hashed_tokens([speech.replace(_TURN_BREAK, " ") for speech in speeches])
+    turn = np.cumsum(is_break)[~is_break]
+    count = np.bincount(turn, minlength=len(speeches))
+    start = np.r_[0, np.cumsum(count)[:-1]]
+    return _Tokens(hashes[~is_break], turn, start, count)
+
+
+def _salted(values: np.ndarray, salt: np.ndarray) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        return values ^ (salt * _SALT)
+
+
+def _echo(tokens: _Tokens, turns: np.ndarray) -> np.ndarray:
+    """Echo share of each of ``turns`` against the turn before it.
+
+    The share of a turn's distinct word bigrams that also occur in the
+    previous turn; a one-word turn scores 1 when the word occurs there.
+    """
+    words, turn, count = tokens.words, tokens.turn, tokens.count
+    with np.errstate(over="ignore"):
+        pairs = words[:-1] * _SALT + words[1:]
+    in_turn = turn[:-1] == turn[1:]
+    pairs, pair_turn = pairs[in_turn], turn[:-1][in_turn]
+    selected = np.zeros(count.size + 1, dtype=bool)
+    selected[turns] = True
+
+    # one sort over the turns' own bigrams and their predecessors', salted with
+    # the turn they are compared for; runs of equal keys are distinct bigrams
+    mine, before = selected[pair_turn], selected[pair_turn + 1]
+    key_turn = np.r_[pair_turn[mine], pair_turn[before] + 1]
+    keys = _salted(np.r_[pairs[mine], pairs[before]], key_turn)
+    order = np.argsort(keys)
+    keys = keys[order]
+    starts = np.ones(keys.size, dtype=bool)
+    starts[1:] = keys[1:] != keys[:-1]
+    run = np.cumsum(starts) - 1
+    own = order < np.count_nonzero(mine)
+    has_own = np.bincount(run, weights=own) > 0
+    shared = has_own & (np.bincount(run, weights=~own) > 0)
+    run_turn = key_turn[order][starts]
+    distinct = np.bincount(run_turn[has_own], minlength=count.size + 1)
+    echo = np.bincount(run_turn[shared], minlength=count.size + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        echo = echo / distinct
+
+    single = turns[count[turns] == 1]
+    if single.size:
+        # the same salting for single words against the previous turn's words
+        previous = np.zeros(count.size + 1, dtype=bool)
+        previous[single - 1] = True
+        before = previous[turn]
+        seen = _salted(words[before], turn[before] + 1)
+        echo[single] = np.isin(_salted(words[tokens.start[single]], single), seen)
+    return echo[turns]
+
+
+def _quantile(values: np.ndarray, q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values.size else None
+
+
+def analyze_turns(
+    messages: List[Dict[str, Any]],
+    times: np.ndarray,
+    end_times: Optional[np.ndarray] = None,
+) -> Dict[str, Optional[float]]:
+    """Turn-taking features of a transcript.
+
+    ``times`` are the messages' start times in seconds (NaN where unknown) and
+    ``end_times`` their end times where known (see
+    ``scoring.message_times``).
+    """
+    if not messages:
+        return {}
+    speeches = [str(message.get("speech") or "") for message in messages]
+    tokens = _hashed_tokens(speeches)
+    user = np.array([message.get("role") == USER_ROLE for message in messages])
+    words = tokens.count
+    spoken = words > 0
+    first = np.zeros(words.size, dtype=np.int64)
+    first[spoken] = tokens.words[tokens.start[spoken]]
+    question = spoken & (
+        np.array(["?" in speech for speech in speeches])
+        | np.isin(first, _QUESTION_HASHES)
+    )
+    follows_other = np.r_[False, user[1:] != user[:-1]]
+    # echo is only measured against the other speaker's turn: a one-word
+    # reply by its word, a longer one by bigrams, which a one-word turn before
+    # it cannot share; replies to an empty turn count only when one word long
+    previous_words = np.r_[0, words[:-1]]
+    replies = user & follows_other & spoken & ((previous_words > 0) | (words == 1))
+    no_bigram = replies & (words > 1) & (previous_words == 1)
+    echoes = np.r_[
+        _echo(tokens, np.flatnonzero(replies & ~no_bigram)),
+        np.zeros(np.count_nonzero(no_bigram)),
+    ]
+
+    features: Dict[str, Optional[float]] = {"user_turn_share": float(user.mean())}
+    user_words = words[user]
+    if user_words.size:
+        features["user_words_per_turn"] = float(user_words.mean())
+        features["user_words_p90"] = _quantile(user_words, 90)
+        non_empty = user & spoken
+        if non_empty.any():
+            # order-sensitive hash of each turn's word sequence
+            position = np.arange(tokens.words.size) - tokens.start[tokens.turn]
+            with np.errstate(over="ignore"):
+                salted = _salted(tokens.words, position + 1) * (position * 2 + 1)
+            # empty turns own no words, so spoken turns' starts bound each sum
+            turn_hashes = np.add.reduceat(salted, tokens.start[spoken])[
+                non_empty[spoken]
+            ]
+            features["user_repeat_ratio"] = (
+                1.0 - np.unique(turn_hashes).size / turn_hashes.size
+            )
+    agent_words = words[~user]
+    if agent_words.size:
+        features["agent_words_per_turn"] = float(agent_words.mean())
+
+    gaps = np.r_[np.nan, times[1:] - times[:-1]]
+    valid = follows_other & np.isfinite(gaps) & (gaps >= 0)
+    latencies = gaps[valid & user]
+    if latencies.size:
+        features["response_latency_median"] = float(np.median(latencies))
+        features["response_latency_p90"] = _quantile(latencies, 90)
+        features["slow_response_fraction"] = float(
+            (latencies > SLOW_RESPONSE_SECONDS).mean()
+        )
+    agent_latencies = gaps[valid & ~user]
+    if agent_latencies.size:
+        features["agent_latency_median"] = float(np.median(agent_latencies))
+
+    ends = times + words / WORDS_PER_SECOND
+    if end_times is not None:
+        ends = np.where(np.isfinite(end_times), end_times, ends)
+    # time from the previous speaker's end to this turn's start
+    handover = np.r_[np.nan, times[1:] - ends[:-1]]
+    timed = follows_other & np.isfinite(handover)
+    if timed.any():
+        features["overlaps"] = float(np.count_nonzero(timed & (handover < 0)))
+        interrupted = timed & (handover < -INTERRUPTION_SECONDS)
+        features["user_interruptions"] = float(np.count_nonzero(interrupted & user))
+        features["agent_interruptions"] = float(np.count_nonzero(interrupted & ~user))
+
+    if (~user).any():
+        features["agent_question_share"] = float(question[~user].mean())
+        asked = np.flatnonzero(question[:-1] & ~user[:-1])
+        if asked.size:
+            answered = user[asked + 1] & (words[asked + 1] > 0)
+            features["agent_questions_answered"] = float(answered.mean())
+    if user.any():
+        features["user_question_share"] = float(question[user].mean())
+
+    if echoes.size:
+        features["echo_mean"] = float(echoes.mean())
+        features["echo_turn_fraction"] = float((echoes >= ECHO_THRESHOLD).mean())
+    return features
+
+
+def _value(features: Dict[str, Optional[float]], name: str, fmt: str) -> str:
+    value = features.get(name)
+    return "n/a" if value is None else format(value, fmt)
+
+
+def render_turn_analytics(features: Dict[str, Optional[float]]) -> str:
+    """Prompt section summarizing the turn-taking features."""
+    if "user_turn_share" not in features:
+        return "No transcript turns available"
+    lines = [
+        f"User share of turns: {features['user_turn_share']:.0%}; words per turn: "
+        f"user {_value(features, 'user_words_per_turn', '.1f')} "
+        f"(p90 {_value(features, 'user_words_p90', '.0f')}), "
+        f"agent {_value(features, 'agent_words_per_turn', '.1f')}",
+    ]
+    if features.get("response_latency_median") is not None:
+        lines.append(
+            "User response latency after agent turns: median "
+            f"{features['response_latency_median']:.1f}s, p90 "
+            f"{_value(features, 'response_latency_p90', '.1f')}s, "
+            f"{_value(features, 'slow_response_fraction', '.0%')} slower than "
+            f"{SLOW_RESPONSE_SECONDS:g}s; agent latency median "
+            f"{_value(features, 'agent_latency_median', '.1f')}s"
+        )
+    if features.get("overlaps") is not None:
+        lines.append(
+            f"Overlapping turns: {features['overlaps']:.0f} (interruptions by user "
+            f"{_value(features, 'user_interruptions', '.0f')}, by agent "
+            f"{_value(features, 'agent_interruptions', '.0f')})"
+        )
+    lines.append(
+        "Questions: "
+        f"{_value(features, 'agent_question_share', '.0%')} of agent turns "
+        f"({_value(features, 'agent_questions_answered', '.0%')} answered), "
+        f"{_value(features, 'user_question_share', '.0%')} of user turns"
+    )
+    if features.get("echo_mean") is not None:
+        lines.append(
+            "Echo of the preceding agent turn (word-bigram overlap): mean "
+            f"{features['echo_mean']:.2f}, "
+            f"{_value(features, 'echo_turn_fraction', '.0%')} of user turns "
+            f"at or above {ECHO_THRESHOLD:g}"
+        )
+    return "\n".join(lines)
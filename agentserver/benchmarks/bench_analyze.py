@@ -0,0 +1,280 @@
+"""Benchmark the /analyze pipeline against synthetic sessions.
+
+``main.app`` is driven in-process through an ASGI client and
+``analyzer.autism_agent`` is replaced by a stand-in with fixed latency, so
+the numbers measure this server rather than the model provider. The result
+and prompt-prefix caches are disabled for the run; every request carries a
+unique session id.
+
+Usage (from ``agentserver/``)::
+
+    python -m benchmarks.bench_analyze --minutes 1 10 60 --requests 50 \\
+        --concurrency 8 --latency 0.05 --output bench.json
+    python -m benchmarks.bench_analyze --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import main
+from agents import analyzer
+from benchmarks.synthetic import session_body
+from services.cache import AnalysisCache
+from services.ingest import StreamingAnalyzeParser
+
+CHUNK_SIZE = 1 << 16
+
+
+class StandInAgent:
+    """Deterministic replacement for the pydantic_ai agent."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.prompt_chars: List[int] = []
+        random.seed(0)
+        self._assessment = analyzer._create_mock_response().model_copy(
+            update={"session_id": "benchmark"}
+        )
+
+    async def run(self, prompt):
+        self.prompt_chars.append(len(prompt))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return _Result(self._assessment)
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(np.asarray(samples, dtype=np.float64), [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def _measure(fn):
+    """Time ``fn`` untraced, then run it again under tracemalloc for its peak."""
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    try:
+        value = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return value, {"seconds": elapsed, "peak_bytes": peak}
+
+
+def _parse(body: bytes):
+    parser = StreamingAnalyzeParser()
+    for start in range(0, len(body), CHUNK_SIZE):
+        parser.feed(body[start : start + CHUNK_SIZE])
+    return parser.close()
+
+
+async def _drive(body_for, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def client_loop(client):
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            response = await client.post(
+                "/analyze",
+                content=body_for(i),
+                headers={"content-type": "application/json"},
+            )
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "throughput_rps": requests / wall if wall else 0.0,
+        "latency_seconds": percentiles(latencies),
+    }
+
+
+def bench_session(
+    minutes: float, requests: int, concurrency: int, latency: float, face_hz: float
+) -> Dict[str, Any]:
+    body = session_body(minutes, face_hz=face_hz)
+    agent = StandInAgent(latency=0.0)
+    analyzer.autism_agent = agent
+
+    parsed, parse_stage = _measure(lambda: _parse(body))
+    _, analyze_stage = _measure(
+        lambda: asyncio.run(
+            analyzer.analyze(
+                parsed.conversation_data, parsed.hume_data, timeline=parsed.timeline
+            )
+        )
+    )
+    prompt_chars = agent.prompt_chars[-1]
+    del parsed
+
+    analyzer.autism_agent = StandInAgent(latency=latency)
+    marker = b'"session_id": "bench"'
+
+    def body_for(i):
+        return body.replace(marker, f'"session_id": "bench-{i}"'.encode(), 2)
+
+    http = asyncio.run(_drive(body_for, requests, concurrency))
+    _, end_to_end_stage = _measure(
+        lambda: asyncio.run(_drive(lambda i: body_for(requests + i), 1, 1))
+    )
+
+    return {
+        "minutes": minutes,
+        "payload_bytes": len(body),
+        "prompt_chars": prompt_chars,
+        "prompt_tokens_est": prompt_chars // 4 + 1,
+        "stages": {
+            "parse": parse_stage,
+            "analyze": analyze_stage,
+            "end_to_end": end_to_end_stage,
+        },
+        "http": http,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    minutes: Sequence[float] = (1, 10, 60),
+    requests: int = 20,
+    concurrency: int = 4,
+    latency: float = 0.05,
+    face_hz: float = 5.0,
+) -> Dict[str, Any]:
+    """Run every session length and return the JSON-ready report."""
+    original_agent = analyzer.autism_agent
+    original_cache = main.result_cache
+    original_prefix_cache = analyzer.prefix_cache
+    main.result_cache = AnalysisCache()
+    analyzer.prefix_cache = None
+    try:
+        results = [
+            bench_session(m, requests, concurrency, latency, face_hz) for m in minutes
+        ]
+    finally:
+        analyzer.autism_agent = original_agent
+        main.result_cache = original_cache
+        analyzer.prefix_cache = original_prefix_cache
+
+    return {
+        "commit": _git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {
+            "requests": requests,
+            "concurrency": concurrency,
+            "agent_latency_seconds": latency,
+            "face_hz": face_hz,
+            "prompt_mode": analyzer.PROMPT_MODE,
+        },
+        "results": results,
+    }
+
+
+COMPARED_METRICS = (
+    ("http", "latency_seconds", "p50"),
+    ("http", "latency_seconds", "p95"),
+    ("http", "latency_seconds", "p99"),
+    ("http", "throughput_rps"),
+    ("prompt_chars",),
+    ("stages", "parse", "peak_bytes"),
+    ("stages", "analyze", "seconds"),
+    ("stages", "end_to_end", "peak_bytes"),
+)
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> List[str]:
+    """Render per-metric ratios (after / before) for matching session lengths."""
+    baseline = {r["minutes"]: r for r in before["results"]}
+    lines = [f"{before.get('commit')} -> {after.get('commit')}"]
+    for result in after["results"]:
+        old = baseline.get(result["minutes"])
+        if old is None:
+            continue
+        lines.append(f"{result['minutes']} min:")
+        for path in COMPARED_METRICS:
+            a, b = old, result
+            for key in path:
+                a, b = a[key], b[key]
+            ratio = b / a if a else float("inf")
+            lines.append(f"  {'.'.join(path):<32} {a:>14.4g} {b:>14.4g} x{ratio:.2f}")
+    return lines
+
+
+def main_cli(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 60])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--face-hz", type=float, default=5.0)
+    parser.add_argument("--output", default="-")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f_before, open(args.compare[1]) as f_after:
+            print("\n".join(compare(json.load(f_before), json.load(f_after))))
+        return
+
+    report = run_benchmark(
+        args.minutes, args.requests, args.concurrency, args.latency, args.face_hz
+    )
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,141 @@
+"""Cold-start benchmark: import profile and time until a fresh server answers.
+
+``import_profile`` runs ``python -X importtime -c "import main"`` in a clean
+interpreter and returns cumulative import times per module.
+``measure_startup`` launches ``uvicorn main:app`` and polls ``/health``
+(liveness) and ``/ready`` (agent and HTTP pool warm) until each answers 200.
+
+Usage::
+
+    python -m benchmarks.bench_startup --runs 5 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import httpx
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+# cold start to a live /health on a warm container image
+HEALTH_TARGET_SECONDS = 1.5
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+
+def import_profile(module: str = "main") -> Dict[str, float]:
+    """Cumulative import time in milliseconds for every module ``module`` loads."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    profile: Dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            profile[match.group(4)] = int(match.group(2)) / 1000.0
+    return profile
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    # not shared with bench_analyze, which imports the app into this process
+    p50, p95, p99 = np.percentile(np.asarray(samples, dtype=np.float64), [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_startup(
+    port: Optional[int] = None, timeout: float = 30.0
+) -> Dict[str, Any]:
+    """Seconds from process launch until ``/health`` and ``/ready`` return 200."""
+    port = port or _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env={**os.environ, "ANALYZER_CONTEXT_CACHE": "none"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    timings: Dict[str, Any] = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            for path in ("/health", "/ready"):
+                while time.perf_counter() - started < timeout:
+                    if server.poll() is not None:
+                        raise RuntimeError(f"server exited with {server.returncode}")
+                    try:
+                        if client.get(path).status_code == 200:
+                            break
+                    except httpx.TransportError:
+                        pass
+                    time.sleep(0.01)
+                else:
+                    raise TimeoutError(f"{path} not ready within {timeout}s")
+                timings[path.strip("/") + "_seconds"] = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return timings
+
+
+def run_benchmark(runs: int = 5) -> Dict[str, Any]:
+    samples = [measure_startup() for _ in range(runs)]
+    health = [sample["health_seconds"] for sample in samples]
+    profile = import_profile()
+    return {
+        "runs": runs,
+        "health_seconds": percentiles(health),
+        "ready_seconds": percentiles([sample["ready_seconds"] for sample in samples]),
+        "health_target_seconds": HEALTH_TARGET_SECONDS,
+        "meets_target": max(health) <= HEALTH_TARGET_SECONDS,
+        "import_ms": {
+            name: round(profile[name], 1)
+            for name in sorted(profile, key=profile.get, reverse=True)[:15]
+        },
+    }
+
+
+def main_cli(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default="-")
+    args = parser.parse_args(argv)
+
+    text = json.dumps(run_benchmark(args.runs), indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,88 @@
+"""Compare /analyze body encodings: wire size and server-side decode time.
+
+For each session length the synthetic JSON body is re-encoded as gzip JSON,
+the packed timeline format and gzip packed timeline; decode time covers
+decompression plus parsing into a ``Timeline``, as the server does it.
+
+Usage (from ``agentserver/``)::
+
+    python -m benchmarks.bench_transport --minutes 10 60 --repeats 5
+"""
+
+import argparse
+import gzip
+import json
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from benchmarks.synthetic import session_body
+from services.ingest import StreamingAnalyzeParser
+from services.transport import decode_timeline, encode_timeline
+
+CHUNK_SIZE = 1 << 16
+
+
+def _parse_json(body: bytes):
+    parser = StreamingAnalyzeParser()
+    for start in range(0, len(body), CHUNK_SIZE):
+        parser.feed(body[start : start + CHUNK_SIZE])
+    return parser.close()
+
+
+def _gunzip(body: bytes) -> bytes:
+    return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+
+
+def _best_seconds(fn: Callable[[], Any], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_session(minutes: float, repeats: int = 3) -> Dict[str, Any]:
+    body = session_body(minutes)
+    parsed = _parse_json(body)
+    packed = encode_timeline(parsed.conversation_data, parsed.timeline)
+    encodings = {
+        "json": (body, lambda: _parse_json(body)),
+        "json+gzip": (gzip.compress(body, 6), None),
+        "timeline": (packed, lambda: decode_timeline(packed)),
+        "timeline+gzip": (gzip.compress(packed, 6), None),
+    }
+    results: Dict[str, Any] = {}
+    for name, (wire, decode) in encodings.items():
+        if decode is None:
+            plain = encodings[name.split("+")[0]][0]
+            parse = _parse_json if name.startswith("json") else decode_timeline
+            decode = lambda wire=wire, parse=parse: parse(_gunzip(wire))  # noqa: E731
+            assert _gunzip(wire) == plain
+        seconds = _best_seconds(decode, repeats)
+        results[name] = {"bytes": len(wire), "decode_ms": round(seconds * 1000, 3)}
+    baseline = results["json"]
+    for entry in results.values():
+        entry["size_ratio"] = round(baseline["bytes"] / entry["bytes"], 1)
+        entry["decode_speedup"] = round(
+            baseline["decode_ms"] / max(entry["decode_ms"], 1e-6), 1
+        )
+    return {"minutes": minutes, "encodings": results}
+
+
+def main_cli(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, nargs="+", default=[10, 60])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+    print(
+        json.dumps(
+            [bench_session(minutes, args.repeats) for minutes in args.minutes],
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,125 @@
+"""Synthetic sessions shaped like the Next.js client's /analyze payload.
+
+Scores follow a bounded random walk per emotion so consecutive frames are
+correlated the way real Hume predictions are. Bodies are produced directly
+as JSON bytes, frame by frame, so generating a 60 minute session does not
+need the whole dict tree in memory.
+"""
+
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+from agents.features import EMOTIONS
+
+SPEECH = (
+    "I like trains a lot.",
+    "Sometimes it is loud at school and I cover my ears.",
+    "Can you tell me more about that?",
+    "What do you usually do after school?",
+    "I line up my cars by color.",
+    "That sounds interesting, how does it make you feel?",
+)
+
+
+def _walk(rng: np.random.Generator, frames: int) -> np.ndarray:
+    steps = rng.normal(0.0, 0.02, size=(frames, len(EMOTIONS)))
+    start = rng.uniform(0.0, 0.4, size=len(EMOTIONS))
+    return np.clip(start + np.cumsum(steps, axis=0), 0.0, 1.0)
+
+
+def _emotions(row: np.ndarray) -> List[Dict[str, Any]]:
+    return [{"name": name, "score": float(score)} for name, score in zip(EMOTIONS, row)]
+
+
+def _frames(minutes: float, seed: int, face_hz: float) -> Dict[str, Iterator[str]]:
+    rng = np.random.default_rng(seed)
+    seconds = minutes * 60.0
+    face_count = int(seconds * face_hz)
+    audio_count = int(seconds / 3.0)
+    burst_count = int(minutes * 4)
+
+    face_scores = _walk(rng, face_count)
+    prosody_scores = _walk(rng, audio_count)
+    burst_scores = _walk(rng, burst_count)
+    burst_times = np.sort(rng.uniform(0.0, seconds, size=burst_count))
+
+    def face():
+        for i in range(face_count):
+            yield json.dumps(
+                {
+                    "timestamp": i * 1000.0 / face_hz,
+                    "emotions": _emotions(face_scores[i]),
+                    "confidence": 0.9,
+                }
+            )
+
+    def audio(scores, times):
+        for i, begin in enumerate(times):
+            yield json.dumps(
+                {
+                    "emotions": _emotions(scores[i]),
+                    "time": {"begin": float(begin), "end": float(begin) + 1.5},
+                }
+            )
+
+    return {
+        "face_emotions": face(),
+        "prosody_emotions": audio(prosody_scores, np.arange(audio_count) * 3.0),
+        "burst_analysis": audio(burst_scores, burst_times),
+    }
+
+
+def conversation_data(
+    minutes: float, session_id: str, seed: int = 0, turn_seconds: float = 6.0
+) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed + 1)
+    start = datetime(2025, 9, 6, 10, 0, 0)
+    turns = int(minutes * 60.0 / turn_seconds)
+    messages = []
+    for i in range(turns):
+        offset = i * turn_seconds + float(rng.uniform(0.0, 2.0))
+        messages.append(
+            {
+                "id": f"m{i}",
+                "role": "replica" if i % 2 == 0 else "user",
+                "speech": SPEECH[int(rng.integers(len(SPEECH)))],
+                "timestamp": (start + timedelta(seconds=offset)).isoformat() + "Z",
+            }
+        )
+    return {
+        "session_id": session_id,
+        "duration": minutes * 60.0,
+        "start_time": start.isoformat() + "Z",
+        "end_time": (start + timedelta(minutes=minutes)).isoformat() + "Z",
+        "metadata": {"session_type": "multimodal_assessment"},
+        "transcript_messages": messages,
+    }
+
+
+def session_body(
+    minutes: float, session_id: str = "bench", seed: int = 0, face_hz: float = 5.0
+) -> bytes:
+    """Serialized /analyze body for a session of the given length."""
+    parts = [
+        '{"conversation_data": ',
+        json.dumps(conversation_data(minutes, session_id, seed)),
+        ', "hume_data": {"session_id": ',
+        json.dumps(session_id),
+        ', "emotion_timeline": {',
+    ]
+    for i, (name, frames) in enumerate(_frames(minutes, seed, face_hz).items()):
+        parts.append(f'{", " if i else ""}"{name}": [')
+        parts.append(", ".join(frames))
+        parts.append("]")
+    parts.append("}}}")
+    return "".join(parts).encode("utf-8")
+
+
+def session_payload(
+    minutes: float, session_id: str = "bench", seed: int = 0, face_hz: float = 5.0
+) -> Dict[str, Any]:
+    """Same session as ``session_body`` as a dict (for small sessions)."""
+    return json.loads(session_body(minutes, session_id, seed, face_hz))
@@ -1,15 +1,137 @@
-from fastapi import FastAPI
+from dotenv import load_dotenv
+
+# Before the imports below: agents and services read settings from the
+# environment at import time.
+load_dotenv()
+
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from models.flat_assessment import FlatAutismAssessment
-from agents.analyzer import analyze
+from models.hume_input import SessionEventBatch
+from models.job import JobStatus
+from models.stored_assessment import AssessmentPage, StoredAssessment
+from agents import analyzer
+from agents.analyzer import analyze, analyze_stream, is_fallback
+from agents.features import Timeline
+from agents.prompt import SIMILAR_SESSIONS_KEY
+from services.assessments import assessment_writer_from_env, epoch_seconds
+from services.batch import aiter_lines, batch_runner_from_env, spool_body
+from services.cache import cache_from_env, fingerprint
+from services.ingest import PayloadValidationError, parse_analyze_request
+from services.jobs import QueueFullError, job_manager_from_env
+from services.live import LiveAnalysis, LiveSessionBusyError, live_analyzer_from_env
+from services.logs import configure_logging
+from services import http, metrics, workers
+from services.sessions import SessionBuffer, session_store_from_env
+from services.similarity import (
+    SessionFeatures,
+    anchor_summaries,
+    reuse_assessment,
+    session_features,
+    similarity_index_from_env,
+)
+from services.transport import (
+    TIMELINE_CONTENT_TYPE,
+    BodyEncodingError,
+    DecompressionMiddleware,
+    StreamingGZipMiddleware,
+    parse_timeline_request,
+)
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
 from datetime import datetime
-from dotenv import load_dotenv
-import uvicorn
+from pydantic import ValidationError
+from typing import Any, Dict, Literal, Optional, Tuple
 
-load_dotenv()
+configure_logging()
 
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Agent Server", description="Autism assessment analysis server")
+result_cache = cache_from_env()
+job_manager = job_manager_from_env()
+batch_runner = batch_runner_from_env()
+session_store = session_store_from_env()
+live_analyzer = live_analyzer_from_env()
+assessment_writer = assessment_writer_from_env()
+similarity_index = similarity_index_from_env()
+
+# cap on a request body after Content-Encoding is undone
+MAX_DECODED_BODY_BYTES = int(
+    os.getenv("ANALYZE_MAX_DECODED_BODY_BYTES", str(256 << 20))
+)
+WARMUP = os.getenv("ANALYZER_WARMUP", "false").lower() in ("1", "true", "yes")
+WARMUP_URL = os.getenv(
+    "ANALYZER_WARMUP_URL", "https://generativelanguage.googleapis.com/"
+)
+
+
+def _prepare_agent() -> bool:
+    # Runs in a thread: importing the provider SDK and httpx is the bulk of
+    # the cold-start cost and must not hold up the event loop.
+    http.open_client()
+    workers.limits.start()
+    return analyzer.warm_agent()
+
+
+async def _warm_up(app: FastAPI) -> None:
+    agent_ready = await asyncio.to_thread(_prepare_agent)
+    if WARMUP:
+        await http.warm_up(WARMUP_URL)
+    app.state.agent_ready = agent_ready
+    app.state.ready = True
+    logger.info("Worker warm (agent ready: %s)", agent_ready)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start serving at once and warm the worker in the background.
+
+    ``/health`` answers as soon as the app is up; the shared HTTP pool and the
+    agent (with its provider SDK imports) are built afterwards and ``/ready``
+    reports 503 until that has finished, so a load balancer only routes to
+    warm workers.
+    """
+    app.state.ready = False
+    job_manager.start()
+    if assessment_writer is not None:
+        assessment_writer.start()
+    warming = asyncio.create_task(_warm_up(app))
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        warming.cancel()
+        await asyncio.gather(warming, return_exceptions=True)
+        await job_manager.shutdown()
+        if assessment_writer is not None:
+            await assessment_writer.shutdown()
+        if similarity_index is not None and similarity_index.path:
+            await asyncio.to_thread(similarity_index.save, similarity_index.path)
+        await asyncio.to_thread(workers.limits.shutdown)
+        # the agent's models hold the client being closed
+        analyzer.reset_agent()
+        await http.close_client()
+
+
+app = FastAPI(
+    title="Agent Server",
+    description="Autism assessment analysis server",
+    lifespan=lifespan,
+)
+app.state.ready = False
+app.state.agent_ready = False
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,29 +140,498 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(DecompressionMiddleware, max_size=MAX_DECODED_BODY_BYTES)
+# SSE events and NDJSON batch results are sent uncompressed, as they are produced
+app.add_middleware(StreamingGZipMiddleware, minimum_size=1024)
+
+metrics.REGISTRY.counter_func(
+    "agentserver_cache_hits_total",
+    "Analyze requests answered from the result cache.",
+    lambda: result_cache.hits,
+)
+metrics.REGISTRY.counter_func(
+    "agentserver_cache_coalesced_total",
+    "Analyze requests that joined an identical in-flight analysis.",
+    lambda: result_cache.coalesced,
+)
+metrics.REGISTRY.counter_func(
+    "agentserver_cache_misses_total",
+    "Analyze requests that ran a fresh analysis.",
+    lambda: result_cache.misses,
+)
 
 
 @app.post("/analyze", response_model=FlatAutismAssessment)
-async def analyze_expressions(request: dict):
-    print(f"🔄 Received analyze request at {datetime.now()}")
+async def analyze_expressions(request: Request):
+    conversation_data, hume_data, timeline = await _read_analyze_request(request)
+    result = await _run_analysis(conversation_data, hume_data, timeline)
+
+    logger.info(
+        "Analysis complete - likelihood: %.3f",
+        result.overall_autism_likelihood,
+        extra={"session_id": conversation_data.get("session_id")},
+    )
+    return result
+
 
-    conversation_data = request.get("conversation_data", {})
-    hume_data = request.get("hume_data", {})
+async def _read_analyze_request(request: Request) -> Tuple[dict, dict, Timeline]:
+    """Stream-parse an analyze body, or resolve ``{"session_id": ...}`` to ingested state.
 
-    print(f"💬 Conversation data keys: {list(conversation_data.keys())}")
-    print(f"📊 Hume data keys: {list(hume_data.keys())}")
-    print(f"📏 Total data size: {len(str(request))} chars")
+    JSON bodies and the packed ``TIMELINE_CONTENT_TYPE`` format are accepted,
+    either of them compressed (see ``services.transport``).
+    """
+    binary = request.headers.get("content-type", "").startswith(TIMELINE_CONTENT_TYPE)
+    parse = parse_timeline_request if binary else parse_analyze_request
+    try:
+        with metrics.span("body_parse") as span_fields:
+            # the CPU slot covers parse steps, not the wait for upload bytes
+            parsed = await parse(request.stream(), workers.limits.cpu)
+            span_fields["session_id"] = parsed.fields.get(
+                "session_id", parsed.conversation_data.get("session_id")
+            )
+    except PayloadValidationError as e:
+        raise RequestValidationError(e.errors)
+    except BodyEncodingError:
+        raise
+    except ValueError as e:
+        raise RequestValidationError(
+            [
+                {
+                    "type": "value_error" if binary else "json_invalid",
+                    "loc": ("body",),
+                    "msg": "Invalid timeline body" if binary else "JSON decode error",
+                    "input": {},
+                    "ctx": {"error": str(e)},
+                }
+            ]
+        )
 
-    result = await analyze(conversation_data, hume_data)
+    if "session_id" in parsed.fields and not parsed.has_hume_data:
+        session_id = parsed.fields["session_id"]
+        session = session_store.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail=f"Unknown session {session_id}")
+        logger.info(
+            "Analyzing ingested session: %s",
+            session.counts(),
+            extra={"session_id": session_id},
+        )
+        return session.conversation_data(), session.hume_data(), session.timeline()
 
-    print(f"✅ Analysis complete - likelihood: {result.overall_autism_likelihood:.3f}")
+    conversation_data = parsed.conversation_data
+    logger.info(
+        "Received analyze request: %d bytes, frames %s",
+        parsed.byte_count,
+        parsed.counts(),
+        extra={"session_id": conversation_data.get("session_id")},
+    )
+    return conversation_data, parsed.hume_data, parsed.timeline
+
+
+async def _run_analysis(
+    conversation_data: dict, hume_data: dict, timeline: Optional[Timeline] = None
+) -> FlatAutismAssessment:
+    key = fingerprint(conversation_data, hume_data, timeline)
+    return await result_cache.get_or_compute(
+        key,
+        lambda: _analyze_and_store(conversation_data, hume_data, timeline, key),
+        cacheable=lambda assessment: not is_fallback(assessment),
+    )
+
+
+async def _analyze_and_store(
+    conversation_data: dict,
+    hume_data: dict,
+    timeline: Optional[Timeline],
+    key: Optional[str],
+    similar: bool = True,
+) -> FlatAutismAssessment:
+    """Analyze and persist a session, indexing it for similarity search.
+
+    With ``similar`` off (batch re-scoring) no near-duplicate is reused or
+    handed to the model as an anchor; the result is still indexed.
+    """
+    run_info: Dict[str, Any] = {}
+    features: Optional[SessionFeatures] = None
+    if similarity_index is not None:
+        features = await workers.limits.run_cpu(
+            session_features, conversation_data, hume_data, timeline
+        )
+    if features is not None and similar:
+        matches = similarity_index.search(
+            features, conversation_data.get("session_id"), key
+        )
+        reused = similarity_index.reusable(matches)
+        if reused is not None:
+            metrics.SIMILARITY_LOOKUPS.inc(outcome="reused")
+            result = reuse_assessment(
+                reused, conversation_data.get("session_id", "unknown")
+            )
+            _store_assessment(result, key, {"model": f"reuse:{reused.session_id}"})
+            return result
+        metrics.SIMILARITY_LOOKUPS.inc(outcome="anchors" if matches else "none")
+        if matches:
+            # a copy: the caller's dict was fingerprinted without the anchors
+            conversation_data = {
+                **conversation_data,
+                SIMILAR_SESSIONS_KEY: anchor_summaries(matches),
+            }
+    result = await analyze(
+        conversation_data, hume_data, timeline=timeline, run_info=run_info
+    )
+    _store_assessment(result, key, run_info)
+    if features is not None and not is_fallback(result):
+        similarity_index.add(result.session_id, features, result, key or "")
     return result
 
 
+def _store_assessment(
+    result: FlatAutismAssessment, key: Optional[str], run_info: Dict[str, Any]
+) -> None:
+    """Queue a freshly computed (not cache-served) assessment for persistence."""
+    if assessment_writer is not None:
+        assessment_writer.submit(
+            result,
+            fingerprint=key,
+            model=run_info.get("model"),
+            prompt_version=run_info.get("prompt_version"),
+            fallback=is_fallback(result),
+        )
+
+
+@app.post("/analyze/stream")
+async def analyze_expressions_stream(request: Request):
+    """Server-sent events: ``started``, ``partial`` field batches, then ``result``.
+
+    Partials arrive in schema order (scores before text summaries); the
+    ``result`` event carries the validated assessment and is authoritative.
+    """
+    conversation_data, hume_data, timeline = await _read_analyze_request(request)
+    key = fingerprint(conversation_data, hume_data, timeline)
+    session_id = conversation_data.get("session_id")
+
+    async def event_stream():
+        yield _sse("started", json.dumps({"session_id": session_id}))
+        cached = result_cache.lookup(key)
+        if cached is not None:
+            yield _sse("result", cached.model_dump_json())
+            return
+        run_info: Dict[str, Any] = {}
+        async for kind, payload in analyze_stream(
+            conversation_data, hume_data, timeline=timeline, run_info=run_info
+        ):
+            if kind == "result":
+                if not is_fallback(payload):
+                    result_cache.store(key, payload)
+                _store_assessment(payload, key, run_info)
+                yield _sse("result", payload.model_dump_json())
+            else:
+                yield _sse(kind, json.dumps(payload))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(
+    request: Request,
+    concurrency: Optional[int] = Query(None, ge=1),
+    rpm: Optional[float] = Query(None, ge=0),
+    batch_id: Optional[str] = None,
+):
+    """Re-score many sessions; streams one NDJSON result record per input item.
+
+    The body is NDJSON, one ``/analyze`` body per line, spooled to a temporary
+    file before results start streaming; a JSON ``{"sessions": [...]}`` body is also accepted for small batches.
+    Results bypass the result cache and similar-session reuse and anchors,
+    since re-scoring exists to pick up prompt or model changes the cache key
+    does not see. Passing ``batch_id`` records
+    completed sessions so that re-posting the same input resumes the batch.
+    """
+    try:
+        checkpoint = batch_runner.checkpoint(batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            sessions = json.loads(await request.body())["sessions"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise HTTPException(
+                status_code=422, detail=f'Expected {{"sessions": [...]}}: {e}'
+            )
+        body = None
+        lines = aiter_lines(json.dumps(item).encode("utf-8") for item in sessions)
+    else:
+        body = await spool_body(request.stream())
+        lines = aiter_lines(body)
+
+    async def analyze_fn(conversation_data, hume_data, timeline):
+        key = None
+        if assessment_writer is not None or similarity_index is not None:
+            key = fingerprint(conversation_data, hume_data, timeline)
+        # re-scoring must not copy or lean on earlier assessments
+        return await _analyze_and_store(
+            conversation_data, hume_data, timeline, key, similar=False
+        )
+
+    async def record_stream():
+        try:
+            async for record in batch_runner.run(
+                lines,
+                analyze_fn,
+                is_fallback,
+                concurrency=concurrency,
+                rpm=rpm,
+                checkpoint=checkpoint,
+            ):
+                yield json.dumps(record, default=str) + "\n"
+        finally:
+            if body is not None:
+                body.close()
+
+    return StreamingResponse(record_stream(), media_type="application/x-ndjson")
+
+
+@app.exception_handler(BodyEncodingError)
+async def body_encoding_error(request: Request, exc: BodyEncodingError):
+    return JSONResponse({"detail": str(exc)}, status_code=exc.status_code)
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+@app.post("/sessions/{session_id}/events")
+async def ingest_session_events(session_id: str, batch: SessionEventBatch):
+    session = session_store.get_or_create(session_id)
+    session.add_events(batch)
+    live_analyzer.notify(session_id)
+    return {"session_id": session_id, "counts": session.counts()}
+
+
+@app.websocket("/sessions/{session_id}/live")
+async def live_session(websocket: WebSocket, session_id: str):
+    """Push provisional assessments while the session runs, then the final one.
+
+    The client sends event batches (the ``POST /sessions/{id}/events`` body,
+    optionally tagged ``"type": "events"``) and ``{"type": "end"}`` once the
+    session is over. The server sends ``provisional`` messages as
+    ``services.live`` produces them and a ``final`` one before closing; the
+    final assessment also answers a later ``/analyze`` of the session id from
+    the result cache.
+    """
+    session = session_store.get_or_create(session_id)
+    try:
+        live = live_analyzer.open(session, _analyze_live, is_fallback)
+    except LiveSessionBusyError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    await websocket.accept()
+
+    async def push_updates():
+        async for kind, result in live.updates():
+            if kind == "final":
+                result = _finish_live(session, live, result)
+            await websocket.send_json(
+                {
+                    "type": kind,
+                    "snapshot": live.snapshots,
+                    "counts": session.counts(),
+                    "assessment": result.model_dump(mode="json"),
+                }
+            )
+
+    sender = asyncio.create_task(push_updates())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                if message.get("type") == "end":
+                    break
+                message.pop("type", None)
+                batch = SessionEventBatch.model_validate(message)
+            except (ValueError, AttributeError) as e:
+                detail = (
+                    json.loads(e.json()) if isinstance(e, ValidationError) else str(e)
+                )
+                await websocket.send_json({"type": "error", "detail": detail})
+                continue
+            session_store.get_or_create(session_id).add_events(batch)
+            live.notify()
+        live.end()
+        await sender
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("Live client disconnected", extra={"session_id": session_id})
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        live_analyzer.close(session_id)
+
+
+async def _analyze_live(
+    conversation_data: dict,
+    hume_data: dict,
+    timeline: Timeline,
+    run_info: Dict[str, Any],
+    scoring_data: Tuple[dict, Timeline],
+) -> FlatAutismAssessment:
+    return await analyze(
+        conversation_data,
+        hume_data,
+        timeline=timeline,
+        run_info=run_info,
+        scoring_data=scoring_data,
+    )
+
+
+def _finish_live(
+    session: SessionBuffer, live: LiveAnalysis, result: FlatAutismAssessment
+) -> FlatAutismAssessment:
+    """Cache and store a live session's final assessment as if analyzed whole.
+
+    The measured fields are recomputed on the whole session: the final result
+    may be an earlier snapshot kept because the last update fell back.
+    """
+    conversation_data, timeline = session.conversation_data(), session.timeline()
+    result = analyzer.remeasure(result, conversation_data, timeline)
+    key = fingerprint(conversation_data, session.hume_data(), timeline)
+    if not is_fallback(result):
+        result_cache.store(key, result)
+    _store_assessment(result, key, live.run_info)
+    return result
+
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown session {session_id}")
+    return session.summary()
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Unknown session {session_id}")
+
+
+@app.post("/analyze/jobs", response_model=JobStatus, status_code=202)
+async def submit_analysis_job(request: Request):
+    conversation_data, hume_data, timeline = await _read_analyze_request(request)
+    try:
+        job = job_manager.submit(
+            lambda: _run_analysis(conversation_data, hume_data, timeline)
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    logger.info(
+        "Queued analysis job %s (queue depth %d)", job.job_id, job_manager.queue_depth
+    )
+    return job.status()
+
+
+@app.get("/analyze/jobs/{job_id}", response_model=JobStatus)
+async def get_analysis_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.status()
+
+
+@app.get("/analyze/jobs/{job_id}/events")
+async def stream_analysis_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+
+    async def event_stream():
+        async for status in job_manager.events(job):
+            yield _sse(status.state, status.model_dump_json())
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.get("/assessments", response_model=AssessmentPage)
+async def list_assessments(
+    session_id: Optional[str] = None,
+    priority: Optional[Literal["low", "moderate", "high", "urgent"]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_fallback: bool = True,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """Stored assessments, newest first; pass ``next_cursor`` back for the next page.
+
+    ``since``/``until`` bound the time the assessment was stored (ISO 8601,
+    UTC unless an offset is given).
+    """
+    store = _assessment_store()
+    try:
+        after = int(cursor) if cursor is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor {cursor!r}")
+    return await asyncio.to_thread(
+        store.query,
+        session_id=session_id,
+        priority=priority,
+        since=epoch_seconds(since) if since is not None else None,
+        until=epoch_seconds(until) if until is not None else None,
+        include_fallback=include_fallback,
+        limit=limit,
+        cursor=after,
+    )
+
+
+@app.get("/assessments/{assessment_id}", response_model=StoredAssessment)
+async def get_assessment(assessment_id: int):
+    stored = await asyncio.to_thread(_assessment_store().get, assessment_id)
+    if stored is None:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown assessment {assessment_id}"
+        )
+    return stored
+
+
+def _assessment_store():
+    if assessment_writer is None:
+        raise HTTPException(
+            status_code=503, detail="Assessment store is not configured"
+        )
+    return assessment_writer.store
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness for load balancers: 200 once startup has warmed the worker."""
+    if not app.state.ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready", "agent": app.state.agent_ready}
+
+
 if __name__ == "__main__":
+    # single process for development; serve.py runs the production workers
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
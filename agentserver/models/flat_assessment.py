@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Literal
+from pydantic.json_schema import SkipJsonSchema
+from typing import Literal, Optional
 
 
 class FlatAutismAssessment(BaseModel):
@@ -39,3 +40,14 @@ class FlatAutismAssessment(BaseModel):
     observed_strengths: str
     key_recommendations: str
     assessment_limitations: str
+
+    # Measured turn-taking metrics (agents.transcript), filled in locally after
+    # the model answers; kept out of the schema the model is asked to fill
+    response_latency_median: SkipJsonSchema[Optional[float]] = None
+    response_latency_p90: SkipJsonSchema[Optional[float]] = None
+    user_words_per_turn: SkipJsonSchema[Optional[float]] = None
+    overlaps: SkipJsonSchema[Optional[float]] = None
+    user_interruptions: SkipJsonSchema[Optional[float]] = None
+    agent_question_share: SkipJsonSchema[Optional[float]] = None
+    agent_questions_answered: SkipJsonSchema[Optional[float]] = None
+    echo_mean: SkipJsonSchema[Optional[float]] = None
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, field_validator
+from typing import List, Dict, Any, Optional, Union
 from datetime import datetime
 
 
@@ -33,3 +33,120 @@ class HumeMultiModalData(BaseModel):
 class AnalyzeRequest(BaseModel):
     user_message: str
     hume_data: HumeMultiModalData
+
+
+# Wire format actually posted by the Next.js client to /analyze and
+# /sessions/{id}/events. Timeline frames are validated in batches through the
+# TypeAdapters below and then copied into float32 columns (agents.features),
+# so the validated objects only live for one batch.
+
+
+class EmotionScore(BaseModel):
+    name: str
+    score: float = Field(ge=0.0, le=1.0)
+
+
+def _normalize_emotions(value: Any) -> Any:
+    # Accept {name: score} mappings as well as [{"name": ..., "score": ...}].
+    if isinstance(value, dict):
+        value = [value]
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        if "name" not in value[0]:
+            return [
+                {"name": name, "score": score}
+                for mapping in value
+                for name, score in mapping.items()
+            ]
+    return value
+
+
+class FaceEmotionFrame(BaseModel):
+    timestamp: float  # milliseconds since session start
+    emotions: List[EmotionScore]
+    confidence: Optional[float] = None
+
+    @field_validator("emotions", mode="before")
+    @classmethod
+    def _normalize(cls, value: Any) -> Any:
+        return _normalize_emotions(value)
+
+    @property
+    def start_seconds(self) -> float:
+        return self.timestamp / 1000.0
+
+
+class TimeRange(BaseModel):
+    begin: float
+    end: float
+
+
+class AudioEmotionFrame(BaseModel):
+    emotions: List[EmotionScore]
+    time: TimeRange  # seconds
+
+    @field_validator("emotions", mode="before")
+    @classmethod
+    def _normalize(cls, value: Any) -> Any:
+        return _normalize_emotions(value)
+
+    @property
+    def start_seconds(self) -> float:
+        return self.time.begin
+
+
+class TranscriptMessage(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    id: Optional[str] = None
+    role: str
+    speech: str
+    timestamp: Optional[Union[str, float]] = None
+
+
+class ConversationData(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    session_id: Optional[str] = None
+    duration: Optional[float] = None
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    metadata: Dict[str, Any] = {}
+    transcript_messages: List[TranscriptMessage] = []
+
+
+class EmotionTimeline(BaseModel):
+    face_emotions: List[FaceEmotionFrame] = []
+    prosody_emotions: List[AudioEmotionFrame] = []
+    burst_analysis: List[AudioEmotionFrame] = []
+
+
+class HumeSessionData(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    session_id: Optional[str] = None
+    emotion_timeline: EmotionTimeline = EmotionTimeline()
+
+
+class AnalyzePayload(BaseModel):
+    """Body of POST /analyze (parsed incrementally, see services.ingest)"""
+
+    conversation_data: ConversationData = ConversationData()
+    hume_data: HumeSessionData = HumeSessionData()
+
+
+class SessionEventBatch(BaseModel):
+    """Body of POST /sessions/{id}/events"""
+
+    face_emotions: List[FaceEmotionFrame] = []
+    prosody_emotions: List[AudioEmotionFrame] = []
+    burst_analysis: List[AudioEmotionFrame] = []
+    transcript_messages: List[TranscriptMessage] = []
+    conversation_data: Dict[str, Any] = {}
+
+
+FRAME_ADAPTERS = {
+    "face_emotions": TypeAdapter(List[FaceEmotionFrame]),
+    "prosody_emotions": TypeAdapter(List[AudioEmotionFrame]),
+    "burst_analysis": TypeAdapter(List[AudioEmotionFrame]),
+}
+CONVERSATION_ADAPTER = TypeAdapter(ConversationData)
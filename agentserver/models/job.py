@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Literal, Optional
+
+from models.flat_assessment import FlatAutismAssessment
+
+
+class JobStatus(BaseModel):
+    """State of an asynchronous analysis job"""
+
+    job_id: str
+    state: Literal["queued", "running", "succeeded", "failed"]
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    result: Optional[FlatAutismAssessment] = None
+    error: Optional[str] = None
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+from models.flat_assessment import FlatAutismAssessment
+
+
+class StoredAssessment(BaseModel):
+    """A persisted assessment with the inputs and versions that produced it"""
+
+    id: int
+    session_id: str
+    created_at: str
+    fingerprint: Optional[str] = None
+    model: Optional[str] = None
+    prompt_version: Optional[str] = None
+    fallback: bool = False
+    assessment: FlatAutismAssessment
+
+
+class AssessmentPage(BaseModel):
+    """One page of stored assessments, newest first"""
+
+    items: List[StoredAssessment]
+    next_cursor: Optional[str] = None
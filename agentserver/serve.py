@@ -0,0 +1,58 @@
+"""Production entry point: ``main:app`` served by several uvicorn worker processes.
+
+Each worker is its own process with its own event loop, agent, HTTP pool and
+per-worker limits (``services.workers``), so the limits below apply per
+worker: ``--workers 4`` with ``AGENTSERVER_LLM_CONCURRENCY=8`` allows up to 32
+model calls in flight across the server.
+
+Usage::
+
+    python serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import os
+from typing import Optional, Sequence
+
+
+def main_cli(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("SERVE_HOST", "0.0.0.0"))
+    parser.add_argument(
+        "--port", type=int, default=int(os.getenv("SERVE_PORT", "8000"))
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("SERVE_WORKERS", str(os.cpu_count() or 1))),
+    )
+    parser.add_argument(
+        "--limit-concurrency",
+        type=int,
+        default=int(os.getenv("SERVE_LIMIT_CONCURRENCY", "0")),
+        help="open connections per worker before answering 503; 0 for no limit",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=int,
+        default=int(os.getenv("SERVE_KEEP_ALIVE_SECONDS", "5")),
+    )
+    parser.add_argument("--log-level", default=os.getenv("SERVE_LOG_LEVEL", "info"))
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    # an import string, not the app object: every worker imports its own app
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=max(args.workers, 1),
+        limit_concurrency=args.limit_concurrency or None,
+        timeout_keep_alive=args.keep_alive,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,292 @@
+"""Persistent store of the assessments the server produces.
+
+Each assessment computed by ``/analyze`` (and its stream, job and batch
+variants) is kept in an embedded SQLite database in WAL mode, together with
+the input fingerprint, the model that produced it and the prompt version.
+Request handlers only enqueue records; an ``AssessmentWriter`` task commits
+them in batches from a worker thread, so persistence adds no latency to the
+request. Listing uses keyset pagination on the row id, newest first, so deep
+pages cost the same as the first one.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterable, List, NamedTuple, Optional
+
+from models.flat_assessment import FlatAutismAssessment
+from models.stored_assessment import AssessmentPage, StoredAssessment
+from services.metrics import ASSESSMENTS_STORED
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = (
+    "id, session_id, created_at, fingerprint, model, prompt_version, fallback,"
+    " assessment"
+)
+
+
+class AssessmentRecord(NamedTuple):
+    assessment: FlatAutismAssessment
+    fingerprint: Optional[str]
+    model: Optional[str]
+    prompt_version: Optional[str]
+    fallback: bool
+    created_at: float
+
+
+def epoch_seconds(value: datetime) -> float:
+    """Seconds since the epoch; naive datetimes are taken as UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class AssessmentStore:
+    """SQLite table of assessments indexed by session, time and priority.
+
+    Writes and reads use separate connections: in WAL mode readers see the
+    last committed batch without waiting for a write in progress, and several
+    server processes can share one database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._write_conn = self._connect()
+        with self._write_lock, self._write_conn:
+            self._write_conn.execute(
+                "CREATE TABLE IF NOT EXISTS assessments ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " session_id TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " fingerprint TEXT,"
+                " model TEXT,"
+                " prompt_version TEXT,"
+                " evaluation_priority TEXT NOT NULL,"
+                " overall_autism_likelihood REAL NOT NULL,"
+                " fallback INTEGER NOT NULL,"
+                " assessment TEXT NOT NULL)"
+            )
+            # (column, id): filters stay index-only scans in keyset order
+            for column in ("session_id", "created_at", "evaluation_priority"):
+                self._write_conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS assessments_{column}"
+                    f" ON assessments ({column}, id)"
+                )
+        self._read_conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def insert_many(self, records: Iterable[AssessmentRecord]) -> int:
+        rows = [
+            (
+                record.assessment.session_id,
+                record.created_at,
+                record.fingerprint,
+                record.model,
+                record.prompt_version,
+                record.assessment.evaluation_priority,
+                record.assessment.overall_autism_likelihood,
+                int(record.fallback),
+                record.assessment.model_dump_json(),
+            )
+            for record in records
+        ]
+        with self._write_lock, self._write_conn:
+            self._write_conn.executemany(
+                "INSERT INTO assessments (session_id, created_at, fingerprint,"
+                " model, prompt_version, evaluation_priority,"
+                " overall_autism_likelihood, fallback, assessment)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def get(self, assessment_id: int) -> Optional[StoredAssessment]:
+        with self._read_lock:
+            row = self._read_conn.execute(
+                f"SELECT {_COLUMNS} FROM assessments WHERE id = ?", (assessment_id,)
+            ).fetchone()
+        return _stored(row) if row is not None else None
+
+    def query(
+        self,
+        session_id: Optional[str] = None,
+        priority: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        include_fallback: bool = True,
+        limit: int = 50,
+        cursor: Optional[int] = None,
+    ) -> AssessmentPage:
+        """One page of matching assessments, newest first.
+
+        ``cursor`` is the ``next_cursor`` of the previous page; ``since`` and
+        ``until`` bound ``created_at`` (epoch seconds, until exclusive).
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        for clause, value in (
+            ("session_id = ?", session_id),
+            ("evaluation_priority = ?", priority),
+            ("created_at >= ?", since),
+            ("created_at < ?", until),
+            ("id < ?", cursor),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if not include_fallback:
+            clauses.append("fallback = 0")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                f"SELECT {_COLUMNS} FROM assessments{where}"
+                " ORDER BY id DESC LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+        items = [_stored(row) for row in rows[:limit]]
+        next_cursor = str(items[-1].id) if len(rows) > limit else None
+        return AssessmentPage(items=items, next_cursor=next_cursor)
+
+    def __len__(self) -> int:
+        with self._read_lock:
+            return self._read_conn.execute(
+                "SELECT COUNT(*) FROM assessments"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._write_lock, self._read_lock:
+            self._write_conn.close()
+            self._read_conn.close()
+
+
+def _stored(row: tuple) -> StoredAssessment:
+    (
+        assessment_id,
+        session_id,
+        created_at,
+        fingerprint,
+        model,
+        prompt_version,
+        fallback,
+        assessment,
+    ) = row
+    return StoredAssessment(
+        id=assessment_id,
+        session_id=session_id,
+        created_at=datetime.fromtimestamp(created_at, timezone.utc).isoformat(),
+        fingerprint=fingerprint,
+        model=model,
+        prompt_version=prompt_version,
+        fallback=bool(fallback),
+        assessment=FlatAutismAssessment.model_validate_json(assessment),
+    )
+
+
+class AssessmentWriter:
+    """Queue of records committed to the store in batches off the request path.
+
+    ``submit`` never blocks; when ``max_queue`` records are already waiting
+    (the disk cannot keep up) further records are dropped and counted.
+    """
+
+    def __init__(
+        self, store: AssessmentStore, max_batch: int = 100, max_queue: int = 10000
+    ):
+        self.store = store
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional["asyncio.Queue[AssessmentRecord]"] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def _ensure_task(self) -> None:
+        # Like the job workers, the writer task is bound to the serving loop
+        # and started lazily so the writer can be created at import time.
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = loop.create_task(self._run())
+
+    def start(self) -> None:
+        """Start the writer task on the running loop (app startup)."""
+        self._ensure_task()
+
+    def submit(
+        self,
+        assessment: FlatAutismAssessment,
+        fingerprint: Optional[str] = None,
+        model: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+        fallback: bool = False,
+    ) -> bool:
+        self._ensure_task()
+        record = AssessmentRecord(
+            assessment, fingerprint, model, prompt_version, fallback, time.time()
+        )
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            ASSESSMENTS_STORED.inc(outcome="dropped")
+            logger.warning(
+                "Assessment store queue full; dropping result",
+                extra={"session_id": assessment.session_id},
+            )
+            return False
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await asyncio.to_thread(self.store.insert_many, batch)
+                ASSESSMENTS_STORED.inc(len(batch), outcome="stored")
+            except Exception as e:
+                ASSESSMENTS_STORED.inc(len(batch), outcome="failed")
+                logger.error("Failed to store %d assessments: %s", len(batch), e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def flush(self) -> None:
+        """Wait until every submitted record has been committed (or failed)."""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def shutdown(self) -> None:
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._loop = None
+
+
+def assessment_writer_from_env() -> Optional[AssessmentWriter]:
+    """Build the writer configured by ``ASSESSMENT_STORE_*`` environment variables.
+
+    Persistence is off (None) unless ``ASSESSMENT_STORE_PATH`` is set.
+    """
+    path = os.getenv("ASSESSMENT_STORE_PATH")
+    if not path:
+        return None
+    return AssessmentWriter(
+        AssessmentStore(path),
+        max_batch=int(os.getenv("ASSESSMENT_STORE_BATCH", "100")),
+        max_queue=int(os.getenv("ASSESSMENT_STORE_MAX_QUEUE", "10000")),
+    )
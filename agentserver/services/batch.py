@@ -0,0 +1,373 @@
+"""Batch re-scoring of stored sessions.
+
+Each input line is one ``/analyze`` body (NDJSON). Lines are parsed with the
+same streaming parser as the online endpoint and run through
+``analyzer.analyze``, so batch and online assessments share prompt building.
+At most ``concurrency`` items are parsed and in flight at once and results are
+emitted as they complete, so memory stays flat however long the input is.
+Starts are paced to ``rpm`` requests per minute; the pace halves whenever an
+item falls back (typically upstream rate limiting) and recovers on success.
+Fingerprints of successful items are appended to a checkpoint file so an interrupted batch
+resumes where it stopped.
+
+Usage::
+
+    python -m services.batch sessions.ndjson --output results.ndjson \\
+        --checkpoint sessions.ckpt --concurrency 4 --rpm 60
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    IO,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+)
+
+from agents.features import Timeline
+from models.flat_assessment import FlatAutismAssessment
+from services.cache import fingerprint
+from services.ingest import PayloadValidationError, StreamingAnalyzeParser
+from services.metrics import BATCH_ITEMS
+
+logger = logging.getLogger(__name__)
+
+AnalyzeFn = Callable[
+    [Dict[str, Any], Dict[str, Any], Optional[Timeline]],
+    Awaitable[FlatAutismAssessment],
+]
+
+SPOOL_MEMORY_BYTES = 1 << 20
+
+_BATCH_ID = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+
+class BatchItem(NamedTuple):
+    index: int
+    item_id: str
+    key: str
+    conversation_data: Dict[str, Any]
+    hume_data: Dict[str, Any]
+    timeline: Optional[Timeline]
+
+
+def parse_item(line: bytes, index: int) -> BatchItem:
+    """Parse one NDJSON line with the online ``/analyze`` body parser."""
+    parser = StreamingAnalyzeParser()
+    parser.feed(line)
+    parsed = parser.close()
+    conversation_data = parsed.conversation_data
+    item_id = str(conversation_data.get("session_id") or f"line-{index}")
+    key = fingerprint(conversation_data, parsed.hume_data, parsed.timeline)
+    return BatchItem(
+        index, item_id, key, conversation_data, parsed.hume_data, parsed.timeline
+    )
+
+
+async def spool_body(
+    chunks: AsyncIterable[bytes], max_memory: int = SPOOL_MEMORY_BYTES
+) -> IO[bytes]:
+    """Drain a request body into a temporary file (in memory up to ``max_memory``).
+
+    The body has to be read before a streaming response starts: for ASGI
+    servers below spec 2.4 Starlette listens for disconnects on the same
+    ``receive`` channel and would consume body messages meant for a reader
+    running inside the response.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    async for chunk in chunks:
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+async def aiter_lines(lines: Iterable[bytes]) -> AsyncIterator[bytes]:
+    for line in lines:
+        if line.strip():
+            yield line
+
+
+class Pacer:
+    """Space request starts to ``rpm`` per minute, slowing down after fallbacks."""
+
+    def __init__(
+        self,
+        rpm: float = 0.0,
+        max_slowdown: float = 8.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ):
+        self.base_interval = 60.0 / rpm if rpm > 0 else 0.0
+        self.max_slowdown = max_slowdown
+        self.slowdown = 1.0
+        self._clock = clock
+        self._sleep = sleep
+        self._next_start = 0.0
+
+    @property
+    def interval(self) -> float:
+        return self.base_interval * self.slowdown
+
+    async def wait(self) -> None:
+        if self.base_interval <= 0:
+            return
+        now = self._clock()
+        if self._next_start > now:
+            await self._sleep(self._next_start - now)
+            now = self._next_start
+        self._next_start = now + self.interval
+
+    def record(self, ok: bool) -> None:
+        if ok:
+            self.slowdown = max(1.0, self.slowdown * 0.8)
+        else:
+            self.slowdown = min(self.max_slowdown, self.slowdown * 2.0)
+
+
+class Checkpoint:
+    """Append-only file of completed item fingerprints.
+
+    Keys are ``services.cache.fingerprint`` values rather than session ids, so
+    a re-ordered input or two lines sharing a session id resume correctly.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._done: Set[str] = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._done.update(line.strip() for line in f if line.strip())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._done
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def mark(self, key: str) -> None:
+        self._done.add(key)
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(key + "\n")
+
+
+def _record(
+    index: int, item_id: Optional[str], status: str, **fields
+) -> Dict[str, Any]:
+    BATCH_ITEMS.inc(status=status)
+    return {"index": index, "id": item_id, "status": status, **fields}
+
+
+async def run_batch(
+    lines: AsyncIterable[bytes],
+    analyze_fn: AnalyzeFn,
+    concurrency: int = 4,
+    pacer: Optional[Pacer] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    is_fallback: Callable[[FlatAutismAssessment], bool] = lambda _: False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield one result record per input line, in completion order.
+
+    Records carry ``status`` ``succeeded``, ``fallback``, ``failed`` (the line
+    could not be parsed or the analysis raised) or ``skipped`` (already in the
+    checkpoint, or identical to an earlier line of this batch). Only succeeded
+    items are checkpointed, so fallbacks are retried on resume.
+    """
+    pacer = pacer or Pacer()
+    checkpoint = checkpoint if checkpoint is not None else Checkpoint()
+
+    async def run(item: BatchItem) -> Dict[str, Any]:
+        try:
+            assessment = await analyze_fn(
+                item.conversation_data, item.hume_data, item.timeline
+            )
+        except Exception as e:
+            logger.warning(
+                "Batch item %d failed: %s",
+                item.index,
+                e,
+                extra={"session_id": item.item_id},
+            )
+            pacer.record(False)
+            return _record(item.index, item.item_id, "failed", error=str(e))
+        fallback = is_fallback(assessment)
+        pacer.record(not fallback)
+        if not fallback:
+            checkpoint.mark(item.key)
+        return _record(
+            item.index,
+            item.item_id,
+            "fallback" if fallback else "succeeded",
+            result=assessment.model_dump(),
+        )
+
+    pending: Set["asyncio.Task[Dict[str, Any]]"] = set()
+    # fingerprints started in this run; catches duplicates still in flight
+    started: Set[str] = set()
+    try:
+        index = -1
+        async for line in lines:
+            index += 1
+            try:
+                item = parse_item(line, index)
+            except PayloadValidationError as e:
+                yield _record(index, None, "failed", error=str(e), errors=e.errors)
+                continue
+            except ValueError as e:
+                yield _record(index, None, "failed", error=f"Invalid JSON: {e}")
+                continue
+            if item.key in checkpoint or item.key in started:
+                yield _record(index, item.item_id, "skipped")
+                continue
+            started.add(item.key)
+
+            while len(pending) >= concurrency:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+            await pacer.wait()
+            pending.add(asyncio.ensure_future(run(item)))
+            for task in [task for task in pending if task.done()]:
+                pending.discard(task)
+                yield task.result()
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class BatchRunner:
+    """Server-side defaults and limits for ``POST /analyze/batch``."""
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        max_concurrency: int = 16,
+        rpm: float = 0.0,
+        checkpoint_dir: Optional[str] = None,
+    ):
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.checkpoint_dir = checkpoint_dir
+
+    def checkpoint(self, batch_id: Optional[str]) -> Checkpoint:
+        """Checkpoint for ``batch_id``; raises ``ValueError`` if unusable."""
+        if batch_id is None:
+            return Checkpoint()
+        if not self.checkpoint_dir:
+            raise ValueError("Batch checkpointing is not configured")
+        if not _BATCH_ID.match(batch_id):
+            raise ValueError(f"Invalid batch id {batch_id!r}")
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        return Checkpoint(os.path.join(self.checkpoint_dir, f"{batch_id}.ckpt"))
+
+    def run(
+        self,
+        lines: AsyncIterable[bytes],
+        analyze_fn: AnalyzeFn,
+        is_fallback: Callable[[FlatAutismAssessment], bool],
+        concurrency: Optional[int] = None,
+        rpm: Optional[float] = None,
+        checkpoint: Optional[Checkpoint] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        concurrency = min(max(concurrency or self.concurrency, 1), self.max_concurrency)
+        return run_batch(
+            lines,
+            analyze_fn,
+            concurrency=concurrency,
+            pacer=Pacer(self.rpm if rpm is None else rpm),
+            checkpoint=checkpoint,
+            is_fallback=is_fallback,
+        )
+
+
+def batch_runner_from_env() -> BatchRunner:
+    """Build the batch runner configured by ``ANALYZE_BATCH_*`` environment variables."""
+    return BatchRunner(
+        concurrency=int(os.getenv("ANALYZE_BATCH_CONCURRENCY", "4")),
+        max_concurrency=int(os.getenv("ANALYZE_BATCH_MAX_CONCURRENCY", "16")),
+        rpm=float(os.getenv("ANALYZE_BATCH_RPM", "0")),
+        checkpoint_dir=os.getenv("ANALYZE_BATCH_CHECKPOINT_DIR") or None,
+    )
+
+
+async def _run_cli(args: argparse.Namespace) -> Dict[str, int]:
+    from agents.analyzer import analyze, is_fallback
+
+    async def analyze_fn(conversation_data, hume_data, timeline):
+        return await analyze(conversation_data, hume_data, timeline=timeline)
+
+    counts: Dict[str, int] = {}
+    source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    # resuming from a checkpoint appends to the earlier results
+    mode = "a" if args.checkpoint else "w"
+    sink = sys.stdout if args.output == "-" else open(args.output, mode)
+    try:
+        async for record in run_batch(
+            aiter_lines(source),
+            analyze_fn,
+            concurrency=args.concurrency,
+            pacer=Pacer(args.rpm),
+            checkpoint=Checkpoint(args.checkpoint),
+            is_fallback=is_fallback,
+        ):
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+            sink.write(json.dumps(record, default=str) + "\n")
+            sink.flush()
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    return counts
+
+
+def main_cli(argv: Optional[Sequence[str]] = None) -> None:
+    from services.logs import configure_logging, shutdown_logging
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="NDJSON file of /analyze bodies, or - for stdin")
+    parser.add_argument("--output", default="-")
+    parser.add_argument("--checkpoint", help="file of completed ids, for resuming")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=0.0, help="0 disables pacing")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    configure_logging()
+    try:
+        counts = asyncio.run(_run_cli(args))
+        logger.info("Batch finished: %s", counts)
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,272 @@
+"""Content-addressed cache for /analyze results.
+
+Retries and double-clicks send the same session twice; each miss costs a full
+LLM call. Results are keyed by a canonical hash of the request payload, and
+concurrent identical requests share a single in-flight computation.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from agents.features import Timeline
+from models.flat_assessment import FlatAutismAssessment
+
+# Top-level conversation_data fields that change on every retry of a session.
+VOLATILE_FIELDS = frozenset({"end_time", "duration"})
+
+
+def fingerprint(
+    conversation_data: Dict[str, Any],
+    hume_data: Dict[str, Any],
+    timeline: Optional[Timeline] = None,
+) -> str:
+    """Canonical SHA-256 of an analyze payload, ignoring volatile fields.
+
+    A pre-built ``timeline`` (e.g. from session ingestion) is hashed from its
+    raw array bytes rather than re-serialized.
+    """
+    canonical = json.dumps(
+        {
+            "conversation_data": {
+                k: v for k, v in conversation_data.items() if k not in VOLATILE_FIELDS
+            },
+            "hume_data": hume_data,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    digest = hashlib.sha256(canonical.encode("utf-8"))
+    if timeline is not None:
+        for arrays in timeline.modalities.values():
+            digest.update(arrays.timestamps.tobytes())
+            digest.update(arrays.scores.tobytes())
+    return digest.hexdigest()
+
+
+class NullBackend:
+    """Stores nothing; in-flight coalescing still applies."""
+
+    name = "none"
+
+    def get(self, key: str) -> Optional[FlatAutismAssessment]:
+        return None
+
+    def set(self, key: str, value: FlatAutismAssessment) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return 0
+
+
+class MemoryBackend:
+    """In-process LRU cache with a per-entry TTL."""
+
+    name = "memory"
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, FlatAutismAssessment]]" = (
+            OrderedDict()
+        )
+
+    def get(self, key: str) -> Optional[FlatAutismAssessment]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: FlatAutismAssessment) -> None:
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk cache that survives restarts and is shared by local workers."""
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 10000,
+        ttl_seconds: float = 86400.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyze_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS analyze_cache_last_used"
+                " ON analyze_cache (last_used)"
+            )
+
+    def get(self, key: str) -> Optional[FlatAutismAssessment]:
+        now = self._clock()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM analyze_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM analyze_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE analyze_cache SET last_used = ? WHERE key = ?", (now, key)
+            )
+        return FlatAutismAssessment.model_validate_json(row[0])
+
+    def set(self, key: str, value: FlatAutismAssessment) -> None:
+        now = self._clock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyze_cache VALUES (?, ?, ?, ?)",
+                (key, value.model_dump_json(), now + self.ttl_seconds, now),
+            )
+            self._conn.execute(
+                "DELETE FROM analyze_cache WHERE expires_at <= ? OR key IN ("
+                " SELECT key FROM analyze_cache ORDER BY last_used DESC"
+                " LIMIT -1 OFFSET ?)",
+                (now, self.max_entries),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM analyze_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analyze_cache").fetchone()[
+                0
+            ]
+
+
+class AnalysisCache:
+    """Result cache with in-flight request coalescing and hit/miss counters."""
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else NullBackend()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, "asyncio.Future[FlatAutismAssessment]"] = {}
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[FlatAutismAssessment]],
+        cacheable: Callable[[FlatAutismAssessment], bool] = lambda result: True,
+    ) -> FlatAutismAssessment:
+        """Return the cached result for ``key`` or run ``compute`` once for it.
+
+        The computation runs in its own task, so a caller that disconnects does
+        not cancel it for the other callers waiting on the same key.
+        """
+        cached = self.backend.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._compute(key, compute, cacheable))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute, cacheable) -> FlatAutismAssessment:
+        try:
+            result = await compute()
+            if cacheable(result):
+                self.backend.set(key, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def lookup(self, key: str) -> Optional[FlatAutismAssessment]:
+        """Plain read for callers that produce results outside ``get_or_compute``."""
+        cached = self.backend.get(key)
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    def store(self, key: str, result: FlatAutismAssessment) -> None:
+        self.backend.set(key, result)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "backend": self.backend.name,
+            "entries": len(self.backend),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+def cache_from_env() -> AnalysisCache:
+    """Build the cache configured by ``ANALYZE_CACHE_*`` environment variables."""
+    backend_name = os.getenv("ANALYZE_CACHE_BACKEND", "memory")
+    ttl_seconds = float(os.getenv("ANALYZE_CACHE_TTL_SECONDS", "3600"))
+    max_entries = int(os.getenv("ANALYZE_CACHE_MAX_ENTRIES", "256"))
+    if backend_name == "sqlite":
+        backend = SQLiteBackend(
+            os.getenv("ANALYZE_CACHE_PATH", "analyze_cache.sqlite3"),
+            max_entries=max_entries,
+            ttl_seconds=ttl_seconds,
+        )
+    elif backend_name == "memory":
+        backend = MemoryBackend(max_entries=max_entries, ttl_seconds=ttl_seconds)
+    else:
+        backend = NullBackend()
+    return AnalysisCache(backend)
@@ -0,0 +1,72 @@
+"""Process-wide keep-alive HTTP client for model provider calls.
+
+The app lifespan opens one ``httpx.AsyncClient`` with pooled keep-alive
+connections and the analyzer hands it to every provider model, so requests
+reuse warm TLS connections instead of each agent owning its own pool. httpx
+itself is imported only when the client is opened. Outside the lifespan
+(tests, the batch CLI) no client is open and providers fall back to their own.
+"""
+
+import logging
+import os
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def limits_from_env() -> "httpx.Limits":
+    """Pool limits configured by ``HTTP_POOL_*`` environment variables."""
+    import httpx
+
+    return httpx.Limits(
+        max_connections=int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "64")),
+        max_keepalive_connections=int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "16")),
+        keepalive_expiry=float(os.getenv("HTTP_POOL_KEEPALIVE_SECONDS", "120")),
+    )
+
+
+def get_client() -> Optional["httpx.AsyncClient"]:
+    """The shared client, or None outside the app lifespan."""
+    return _client
+
+
+def open_client() -> "httpx.AsyncClient":
+    global _client
+    # httpx is imported here, off the import path of the app itself
+    import httpx
+
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=limits_from_env(),
+            timeout=httpx.Timeout(
+                float(os.getenv("HTTP_TIMEOUT_SECONDS", "120")),
+                connect=float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "10")),
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def warm_up(url: str, timeout: float = 5.0) -> bool:
+    """Open a pooled connection (DNS + TLS) to ``url`` without a model call."""
+    import httpx
+
+    client = open_client()
+    try:
+        response = await client.head(url, timeout=timeout)
+    except httpx.HTTPError as e:
+        logger.warning("Connection warm-up to %s failed: %s", url, e)
+        return False
+    logger.info("Warmed connection to %s (HTTP %d)", url, response.status_code)
+    return True
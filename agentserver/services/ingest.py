@@ -0,0 +1,290 @@
+"""Incremental parsing of /analyze request bodies.
+
+A long session's body is several MB of JSON, almost all of it the three
+``hume_data.emotion_timeline`` frame lists. Rather than materializing the
+whole dict tree, ``StreamingAnalyzeParser`` walks the top-level structure as
+bytes arrive and decodes each timeline frame on its own, handing frames to a
+``TimelineBuilder`` in small batches. Only ``conversation_data`` and scalar
+fields are kept as Python objects.
+"""
+
+import codecs
+import json
+from contextlib import nullcontext
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from pydantic import ValidationError
+
+from agents.features import MODALITIES, Timeline, TimelineBuilder
+from models.hume_input import CONVERSATION_ADAPTER, FRAME_ADAPTERS
+
+# Containers walked structurally; every other value is decoded in one piece.
+_DESCEND_PATHS = {(), ("hume_data",), ("hume_data", "emotion_timeline")}
+# Arrays whose elements are decoded and handed off one at a time.
+_STREAM_PATHS = {("hume_data", "emotion_timeline", name): name for name in MODALITIES}
+_WHITESPACE = " \t\n\r"
+_COMPACT_AFTER = 1 << 16
+
+
+class PayloadValidationError(ValueError):
+    """Well-formed JSON whose timeline or conversation data fails validation."""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} validation errors")
+        self.errors = errors
+
+
+class ParsedAnalyzeRequest:
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.hume_data: Dict[str, Any] = {}
+        self.has_hume_data = False
+        self.builder = TimelineBuilder()
+        self.timeline: Optional[Timeline] = None
+        self.byte_count = 0
+
+    @property
+    def conversation_data(self) -> Dict[str, Any]:
+        return self.fields.get("conversation_data") or {}
+
+    def counts(self) -> Dict[str, int]:
+        if self.timeline is not None:
+            return {name: len(self.timeline[name]) for name in MODALITIES}
+        return self.builder.counts()
+
+
+def validate_conversation(conversation_data: Dict[str, Any]) -> None:
+    """Raise ``PayloadValidationError`` if ``conversation_data`` fails the schema."""
+    try:
+        CONVERSATION_ADAPTER.validate_python(conversation_data)
+    except ValidationError as e:
+        raise PayloadValidationError(
+            [
+                {**error, "loc": ("body", "conversation_data") + tuple(error["loc"])}
+                for error in e.errors(include_url=False)
+            ]
+        )
+
+
+class _Frame:
+    __slots__ = ("is_object", "path", "state", "key")
+
+    def __init__(self, is_object: bool, path: Tuple[str, ...]):
+        self.is_object = is_object
+        self.path = path
+        self.state = "first"
+        self.key: Optional[str] = None
+
+
+class StreamingAnalyzeParser:
+    """Push parser: call ``feed`` with body chunks, then ``close`` for the result.
+
+    Timeline frames are validated ``batch_size`` at a time against
+    ``models.hume_input`` and copied into the builder's float32 columns.
+    Raises ``PayloadValidationError`` for schema violations and ``ValueError``
+    (``json.JSONDecodeError`` for syntax errors) for malformed JSON.
+    """
+
+    def __init__(self, batch_size: int = 256):
+        self.batch_size = batch_size
+        self.result = ParsedAnalyzeRequest()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._retry_at = 0
+        self._stack: List[_Frame] = []
+        self._done = False
+        self._pending: Dict[str, List[Any]] = {name: [] for name in MODALITIES}
+        self._validated: Dict[str, int] = {name: 0 for name in MODALITIES}
+
+    def feed(self, chunk: bytes) -> None:
+        self.result.byte_count += len(chunk)
+        self._buf += self._text_decoder.decode(chunk)
+        # After an incomplete value, wait until the buffer has doubled before
+        # re-trying it so large values are not re-scanned on every chunk.
+        if len(self._buf) >= self._retry_at:
+            self._parse(final=False)
+
+    def close(self) -> ParsedAnalyzeRequest:
+        self._buf += self._text_decoder.decode(b"", final=True)
+        self._parse(final=True)
+        if not self._done:
+            raise ValueError("Truncated JSON body")
+        for name in MODALITIES:
+            self._flush(name)
+        validate_conversation(self.result.conversation_data)
+        self.result.timeline = self.result.builder.timeline()
+        return self.result
+
+    def _decode(self, final: bool) -> Optional[Tuple[Any, int]]:
+        try:
+            value, end = self._json_decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None
+        # A number at the very end of the buffer may continue in the next chunk.
+        if end == len(self._buf) and not final and isinstance(value, (int, float)):
+            return None
+        return value, end
+
+    def _parse(self, final: bool) -> None:
+        buf, stack = self._buf, self._stack
+        while True:
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos >= len(buf):
+                break
+            ch = buf[pos]
+
+            if not stack:
+                if self._done:
+                    raise ValueError(f"Unexpected data after JSON body at {pos}")
+                if ch != "{":
+                    raise ValueError("Request body must be a JSON object")
+                stack.append(_Frame(True, ()))
+                self._pos += 1
+                continue
+
+            frame = stack[-1]
+            if frame.state == "next":
+                closer = "}" if frame.is_object else "]"
+                if ch == ",":
+                    frame.state = "key" if frame.is_object else "value"
+                elif ch == closer:
+                    self._pop()
+                else:
+                    raise ValueError(f"Expected ',' or '{closer}' at {pos}")
+                self._pos += 1
+            elif frame.is_object and frame.state in ("first", "key"):
+                if ch == "}" and frame.state == "first":
+                    self._pop()
+                    self._pos += 1
+                    continue
+                if ch != '"':
+                    raise ValueError(f"Expected object key at {pos}")
+                decoded = self._decode(final)
+                if decoded is None:
+                    break
+                frame.key, self._pos = decoded
+                frame.state = "colon"
+            elif frame.state == "colon":
+                if ch != ":":
+                    raise ValueError(f"Expected ':' at {pos}")
+                frame.state = "value"
+                self._pos += 1
+            else:
+                if not frame.is_object and frame.state == "first" and ch == "]":
+                    self._pop()
+                    self._pos += 1
+                    continue
+                path = frame.path + (frame.key,) if frame.is_object else frame.path
+                if frame.is_object and ch == "{" and path in _DESCEND_PATHS:
+                    frame.state = "next"
+                    stack.append(_Frame(True, path))
+                    self._pos += 1
+                    self._on_container(path)
+                    continue
+                if frame.is_object and ch == "[" and path in _STREAM_PATHS:
+                    frame.state = "next"
+                    stack.append(_Frame(False, path))
+                    self._pos += 1
+                    continue
+                decoded = self._decode(final)
+                if decoded is None:
+                    break
+                value, self._pos = decoded
+                frame.state = "next"
+                if frame.is_object:
+                    self._on_value(path, value)
+                else:
+                    self._on_element(_STREAM_PATHS[path], value)
+
+        if self._pos < len(buf) and not final:
+            self._retry_at = self._pos + 2 * (len(buf) - self._pos)
+        else:
+            self._retry_at = 0
+        if self._pos > _COMPACT_AFTER:
+            self._buf = buf[self._pos :]
+            self._retry_at = max(0, self._retry_at - self._pos)
+            self._pos = 0
+
+    def _pop(self) -> None:
+        self._stack.pop()
+        if not self._stack:
+            self._done = True
+
+    def _on_container(self, path: Tuple[str, ...]) -> None:
+        if path == ("hume_data",):
+            self.result.has_hume_data = True
+
+    def _on_value(self, path: Tuple[str, ...], value: Any) -> None:
+        if len(path) == 1:
+            if path == ("hume_data",):
+                # hume_data that is not an object (e.g. null) carries no timeline.
+                self.result.has_hume_data = True
+                return
+            self.result.fields[path[0]] = value
+        elif len(path) == 2:
+            self.result.hume_data[path[1]] = value
+        else:
+            self.result.hume_data.setdefault("emotion_timeline", {})[path[2]] = value
+
+    def _on_element(self, modality: str, value: Any) -> None:
+        pending = self._pending[modality]
+        pending.append(value)
+        if len(pending) >= self.batch_size:
+            self._flush(modality)
+
+    def _flush(self, modality: str) -> None:
+        pending = self._pending[modality]
+        if not pending:
+            return
+        try:
+            frames = FRAME_ADAPTERS[modality].validate_python(pending)
+        except ValidationError as e:
+            offset = self._validated[modality]
+            raise PayloadValidationError(
+                [
+                    {
+                        **error,
+                        "loc": ("body", "hume_data", "emotion_timeline", modality)
+                        + (offset + error["loc"][0],)
+                        + tuple(error["loc"][1:]),
+                    }
+                    for error in e.errors(include_url=False)
+                ]
+            )
+        self.result.builder.extend_frames(modality, frames)
+        self._validated[modality] += len(pending)
+        pending.clear()
+
+
+async def parse_analyze_request(
+    chunks: AsyncIterator[bytes],
+    slot: Callable[[], AsyncContextManager[Any]] = nullcontext,
+) -> ParsedAnalyzeRequest:
+    """Parse an /analyze body from an async byte stream (e.g. ``request.stream()``).
+
+    ``slot`` is entered around each parse step only, not while waiting on the
+    client, so a slow upload does not hold a CPU slot.
+    """
+    parser = StreamingAnalyzeParser()
+    async for chunk in chunks:
+        if chunk:
+            async with slot():
+                parser.feed(chunk)
+    async with slot():
+        return parser.close()
@@ -0,0 +1,163 @@
+"""Asynchronous analysis jobs executed by a bounded asyncio worker pool.
+
+``POST /analyze/jobs`` returns as soon as the job is queued; a fixed number of
+workers drain the queue so at most ``concurrency`` LLM runs are in flight, and
+submissions beyond ``max_queue`` waiting jobs are rejected.
+"""
+
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from models.flat_assessment import FlatAutismAssessment
+from models.job import JobStatus
+
+TERMINAL_STATES = ("succeeded", "failed")
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity."""
+
+
+class Job:
+    def __init__(self, run: Callable[[], Awaitable[FlatAutismAssessment]]):
+        self.job_id = uuid.uuid4().hex
+        self.state = "queued"
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.result: Optional[FlatAutismAssessment] = None
+        self.error: Optional[str] = None
+        self._run = run
+        self._listeners: List["asyncio.Queue[JobStatus]"] = []
+
+    @property
+    def done(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+    def status(self) -> JobStatus:
+        return JobStatus(
+            job_id=self.job_id,
+            state=self.state,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            result=self.result,
+            error=self.error,
+        )
+
+    def _publish(self) -> None:
+        status = self.status()
+        for listener in self._listeners:
+            listener.put_nowait(status)
+
+
+class JobManager:
+    def __init__(
+        self, concurrency: int = 2, max_queue: int = 100, max_jobs: int = 1000
+    ):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional["asyncio.Queue[Job]"] = None
+        self._workers: List["asyncio.Task[None]"] = []
+
+    def _ensure_workers(self) -> None:
+        # Workers are bound to the loop that serves requests; start them lazily
+        # so the manager can be created at import time.
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [
+            loop.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+
+    def start(self) -> None:
+        """Start the workers on the running loop (app startup)."""
+        self._ensure_workers()
+
+    def submit(self, run: Callable[[], Awaitable[FlatAutismAssessment]]) -> Job:
+        """Queue ``run`` for execution; raises ``QueueFullError`` under backpressure."""
+        self._ensure_workers()
+        if self._queue.full():
+            raise QueueFullError(f"{self._queue.qsize()} analysis jobs already queued")
+        job = Job(run)
+        self._queue.put_nowait(job)
+        self._jobs[job.job_id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def events(self, job: Job) -> AsyncIterator[JobStatus]:
+        """Yield the job's current status, then every transition until it finishes."""
+        listener: "asyncio.Queue[JobStatus]" = asyncio.Queue()
+        job._listeners.append(listener)
+        try:
+            status = job.status()
+            yield status
+            while status.state not in TERMINAL_STATES:
+                status = await listener.get()
+                yield status
+        finally:
+            job._listeners.remove(listener)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.state = "running"
+            job.started_at = datetime.now().isoformat()
+            job._publish()
+            try:
+                job.result = await job._run()
+                job.state = "succeeded"
+            except asyncio.CancelledError:
+                # Shutdown cancelled the run; report it as finished so pollers
+                # and event streams do not wait on it forever.
+                job.error = "cancelled"
+                job.state = "failed"
+                raise
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                job.state = "failed"
+            finally:
+                # Drop the closure so finished jobs do not pin their payloads.
+                job._run = None
+                job.finished_at = datetime.now().isoformat()
+                job._publish()
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        # Forget the oldest finished jobs once more than max_jobs are tracked.
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            if self._jobs[job_id].done:
+                del self._jobs[job_id]
+
+    async def shutdown(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._loop = None
+
+
+def job_manager_from_env() -> JobManager:
+    """Build the job manager configured by ``ANALYZE_JOB_*`` environment variables."""
+    return JobManager(
+        concurrency=int(os.getenv("ANALYZE_JOB_CONCURRENCY", "2")),
+        max_queue=int(os.getenv("ANALYZE_JOB_MAX_QUEUE", "100")),
+    )
@@ -0,0 +1,233 @@
+"""Rolling provisional assessments of sessions that are still running.
+
+A client connected to ``/sessions/{id}/live`` pushes event batches into the
+session's ``SessionBuffer`` as usual; ``LiveAnalysis`` watches the buffer and,
+every ``interval_seconds`` or once ``min_events`` new frames and messages
+have arrived, analyzes only what came in since the last snapshot. The
+previous provisional result travels with the delta (under
+``prompt.PREVIOUS_ASSESSMENT_KEY``), so each update refines the last one and
+costs a prompt sized by the delta rather than by the session so far. When the
+session ends only the events since the last snapshot are left to analyze,
+which makes the final result nearly instant. Only the prompt is built from the
+delta: the cheap local scores and measured fields always cover the whole
+session so far.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from agents.features import MODALITIES, ModalityArrays, Timeline
+from agents.prompt import PREVIOUS_ASSESSMENT_KEY
+from models.flat_assessment import FlatAutismAssessment
+from services.metrics import LIVE_UPDATES
+from services.sessions import SessionBuffer
+
+logger = logging.getLogger(__name__)
+
+# (delta conversation data, hume data, delta timeline, run_info,
+#  (whole-session conversation data, timeline) for local scoring)
+AnalyzeFn = Callable[
+    [
+        Dict[str, Any],
+        Dict[str, Any],
+        Timeline,
+        Dict[str, Any],
+        Tuple[Dict[str, Any], Timeline],
+    ],
+    Awaitable[FlatAutismAssessment],
+]
+
+
+class LiveSessionBusyError(RuntimeError):
+    """The session already has a live connection."""
+
+
+def _since(arrays: ModalityArrays, cutoff: float) -> ModalityArrays:
+    start = int(np.searchsorted(arrays.timestamps, cutoff, side="right"))
+    return ModalityArrays(arrays.timestamps[start:], arrays.scores[start:])
+
+
+class LiveAnalysis:
+    """Snapshot state and update loop for one live session."""
+
+    def __init__(
+        self,
+        session: SessionBuffer,
+        analyze_fn: AnalyzeFn,
+        is_fallback: Callable[[FlatAutismAssessment], bool],
+        interval_seconds: float = 30.0,
+        min_events: int = 1000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.session = session
+        self.analyze_fn = analyze_fn
+        self.is_fallback = is_fallback
+        self.interval_seconds = interval_seconds
+        self.min_events = min_events
+        self._clock = clock
+        # latest timestamp covered per modality and transcript messages seen
+        self._cutoffs: Dict[str, float] = {name: -np.inf for name in MODALITIES}
+        self._counts: Dict[str, int] = {}
+        self._messages = 0
+        self.previous: Optional[FlatAutismAssessment] = None
+        self.run_info: Dict[str, Any] = {}
+        self.snapshots = 0
+        self.last_at = clock()
+        self._ended = False
+        self._wake = asyncio.Event()
+
+    def pending_events(self) -> int:
+        """Frames and transcript messages added since the last snapshot."""
+        counts = self.session.counts()
+        return sum(
+            max(count - self._counts.get(name, 0), 0) for name, count in counts.items()
+        )
+
+    def due(self) -> bool:
+        pending = self.pending_events()
+        return pending >= self.min_events or (
+            pending > 0 and self._clock() - self.last_at >= self.interval_seconds
+        )
+
+    def notify(self) -> None:
+        """Wake the update loop after events were added."""
+        self._wake.set()
+
+    def end(self) -> None:
+        """Finish after one last update; ``updates`` then yields ``final``."""
+        self._ended = True
+        self._wake.set()
+
+    def delta(
+        self, whole: Optional[Tuple[Dict[str, Any], Timeline]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], Timeline]:
+        """Conversation data, hume data and timeline of the new events only.
+
+        ``whole`` is the session's full conversation data and timeline, when
+        the caller already has them.
+        """
+        full_conversation, timeline = whole or (
+            self.session.conversation_data(),
+            self.session.timeline(),
+        )
+        conversation_data = {
+            **full_conversation,
+            "transcript_messages": full_conversation["transcript_messages"][
+                self._messages :
+            ],
+        }
+        if self.previous is not None:
+            conversation_data[PREVIOUS_ASSESSMENT_KEY] = self.previous.model_dump(
+                exclude={"session_id", "timestamp", "analysis_version"}
+            )
+        sliced = Timeline(
+            {name: _since(timeline[name], self._cutoffs[name]) for name in MODALITIES}
+        )
+        return conversation_data, self.session.hume_data(), sliced
+
+    async def update(self) -> FlatAutismAssessment:
+        """Analyze the delta and advance the snapshot."""
+        counts = self.session.counts()
+        whole = (self.session.conversation_data(), self.session.timeline())
+        conversation_data, hume_data, timeline = self.delta(whole)
+        run_info: Dict[str, Any] = {}
+        result = await self.analyze_fn(
+            conversation_data, hume_data, timeline, run_info, whole
+        )
+        for name in MODALITIES:
+            if len(timeline[name]):
+                self._cutoffs[name] = float(timeline[name].timestamps[-1])
+        self._counts = counts
+        self._messages = counts["transcript_messages"]
+        self.snapshots += 1
+        self.last_at = self._clock()
+        if self.is_fallback(result):
+            # keep refining the last real assessment, not the placeholder
+            LIVE_UPDATES.inc(kind="fallback")
+        else:
+            LIVE_UPDATES.inc(kind="provisional")
+            self.previous, self.run_info = result, run_info
+        logger.info(
+            "Live snapshot %d: %d frames and messages so far",
+            self.snapshots,
+            sum(counts.values()),
+            extra={"session_id": self.session.session_id},
+        )
+        return result
+
+    async def finish(self) -> FlatAutismAssessment:
+        """The final assessment: the last snapshot brought up to date."""
+        result = self.previous
+        if result is None or self.pending_events():
+            result = await self.update()
+            if self.is_fallback(result) and self.previous is not None:
+                result = self.previous
+        LIVE_UPDATES.inc(kind="final")
+        return result
+
+    async def updates(self) -> AsyncIterator[Tuple[str, FlatAutismAssessment]]:
+        """Yield ``("provisional", result)`` whenever due, then ``("final", result)``."""
+        while not self._ended:
+            self._wake.clear()
+            if self.due():
+                yield "provisional", await self.update()
+                continue
+            timeout = None
+            if self.pending_events():
+                elapsed = self._clock() - self.last_at
+                timeout = max(self.interval_seconds - elapsed, 0.0)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        yield "final", await self.finish()
+
+
+class LiveAnalyzer:
+    """Registry of live sessions; at most one live connection per session."""
+
+    def __init__(self, interval_seconds: float = 30.0, min_events: int = 1000):
+        self.interval_seconds = interval_seconds
+        self.min_events = min_events
+        self._active: Dict[str, LiveAnalysis] = {}
+
+    def open(
+        self,
+        session: SessionBuffer,
+        analyze_fn: AnalyzeFn,
+        is_fallback: Callable[[FlatAutismAssessment], bool],
+    ) -> LiveAnalysis:
+        if session.session_id in self._active:
+            raise LiveSessionBusyError(
+                f"Session {session.session_id} already has a live connection"
+            )
+        live = LiveAnalysis(
+            session, analyze_fn, is_fallback, self.interval_seconds, self.min_events
+        )
+        self._active[session.session_id] = live
+        return live
+
+    def close(self, session_id: str) -> None:
+        self._active.pop(session_id, None)
+
+    def notify(self, session_id: str) -> None:
+        """Wake a session's live loop after events arrived by HTTP."""
+        live = self._active.get(session_id)
+        if live is not None:
+            live.notify()
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+
+def live_analyzer_from_env() -> LiveAnalyzer:
+    """Build the live analyzer configured by ``LIVE_*`` environment variables."""
+    return LiveAnalyzer(
+        interval_seconds=float(os.getenv("LIVE_INTERVAL_SECONDS", "30")),
+        min_events=int(os.getenv("LIVE_MIN_EVENTS", "1000")),
+    )
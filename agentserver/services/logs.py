@@ -0,0 +1,67 @@
+"""Non-blocking logging setup.
+
+Request handlers only enqueue log records; a ``QueueListener`` thread does the
+formatting and the stderr write. Structured fields passed through ``extra``
+(``session_id``, ``stage``, ``duration_ms`` ...) are appended as key=value
+pairs so the lines stay grep- and aggregation-friendly.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+_STANDARD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[QueueHandler] = None
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = [
+            f"{key}={value}"
+            for key, value in record.__dict__.items()
+            if key not in _STANDARD_ATTRS and value is not None
+        ]
+        return f"{line} {' '.join(fields)}" if fields else line
+
+
+def configure_logging(level: Optional[str] = None) -> None:
+    """Route the root logger through a queue; safe to call more than once."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(
+        KeyValueFormatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+    )
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    _handler = QueueHandler(records)
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,357 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Counters and histograms are kept in plain dicts keyed by label values so that
+recording a sample is a lock and a few additions; nothing is exported until
+``GET /metrics`` renders the registry. ``span`` times a pipeline stage into
+``agentserver_stage_seconds`` and logs the duration with the session id.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+SIZE_BUCKETS = tuple(float(1024 * 4**i) for i in range(8))  # 1 KiB .. 16 MiB
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in items
+        ]
+
+
+class CounterFunc(_Metric):
+    """Counter whose value is read from a callback at scrape time."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name} {_format_value(self.fn())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def counter_func(
+        self, name: str, help: str, fn: Callable[[], float]
+    ) -> CounterFunc:
+        return self.register(CounterFunc(name, help, fn))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUESTS = REGISTRY.counter(
+    "agentserver_http_requests_total",
+    "HTTP requests by route and status code.",
+    ("method", "route", "status"),
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "agentserver_http_request_seconds",
+    "HTTP request latency by route.",
+    ("method", "route"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "agentserver_stage_seconds",
+    "Time spent in each analyze pipeline stage.",
+    ("stage",),
+)
+ANALYSES = REGISTRY.counter(
+    "agentserver_analyses_total",
+    "Completed analyses by outcome (success or fallback).",
+    ("outcome",),
+)
+LLM_RETRIES = REGISTRY.counter(
+    "agentserver_llm_retries_total",
+    "Model requests beyond the first made while producing one assessment.",
+)
+PROMPT_BYTES = REGISTRY.histogram(
+    "agentserver_prompt_bytes",
+    "Size of the analysis prompt sent to the model, in UTF-8 bytes.",
+    buckets=SIZE_BUCKETS,
+)
+
+CONTEXT_CACHE = REGISTRY.counter(
+    "agentserver_context_cache_total",
+    "Provider prompt-prefix cache events (created, hit, create_failed, generate_failed).",
+    ("event",),
+)
+INPUT_TOKENS = REGISTRY.counter(
+    "agentserver_llm_input_tokens_total",
+    "Model input tokens reported by the provider, split by cached prefix vs rest.",
+    ("kind",),
+)
+
+MODEL_REQUESTS = REGISTRY.counter(
+    "agentserver_model_requests_total",
+    "Requests per routed model by outcome (success, error, cancelled).",
+    ("model", "outcome"),
+)
+HEDGES = REGISTRY.counter(
+    "agentserver_model_hedges_total",
+    "Hedge requests sent because a model exceeded its p95 latency.",
+)
+
+FANOUT_BRANCHES = REGISTRY.counter(
+    "agentserver_fanout_branches_total",
+    "Fan-out domain sub-analyses by branch and outcome (success, timeout, error).",
+    ("branch", "outcome"),
+)
+
+LIVE_UPDATES = REGISTRY.counter(
+    "agentserver_live_updates_total",
+    "Live session assessments by kind (provisional, fallback, final).",
+    ("kind",),
+)
+
+SIMILARITY_LOOKUPS = REGISTRY.counter(
+    "agentserver_similarity_lookups_total",
+    "Similarity index lookups by outcome (none, anchors, reused).",
+    ("outcome",),
+)
+
+LIMIT_WAIT_SECONDS = REGISTRY.histogram(
+    "agentserver_limit_wait_seconds",
+    "Time spent waiting for a per-worker concurrency slot (llm or cpu).",
+    ("limit",),
+)
+
+ASSESSMENTS_STORED = REGISTRY.counter(
+    "agentserver_assessments_stored_total",
+    "Assessments handed to the persistent store by outcome (stored, failed, dropped).",
+    ("outcome",),
+)
+
+BATCH_ITEMS = REGISTRY.counter(
+    "agentserver_batch_items_total",
+    "Batch re-scoring items by status (succeeded, fallback, failed, skipped).",
+    ("status",),
+)
+
+
+@contextmanager
+def span(stage: str, session_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Time a pipeline stage, record it, and log it with the session id.
+
+    Yields the span's log fields so a stage that only learns the session id
+    part-way through (body parsing) can fill it in.
+    """
+    fields: Dict[str, Any] = {"stage": stage, "session_id": session_id}
+    started = time.perf_counter()
+    fields["failed"] = True
+    try:
+        yield fields
+        fields["failed"] = False
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        fields["duration_ms"] = round(elapsed * 1000, 3)
+        logger.debug("span %s", stage, extra=fields)
+
+
+@contextmanager
+def timed(stage: str, timings: Dict[str, float]) -> Iterator[None]:
+    """Time a stage into ``timings`` without recording it; see ``record_stages``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - started
+
+
+def record_stages(timings: Dict[str, float], session_id: Optional[str] = None) -> None:
+    """Record stage durations measured by ``timed``, e.g. in a CPU pool process
+    whose own registry is never scraped."""
+    for stage, elapsed in timings.items():
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        logger.debug(
+            "span %s",
+            stage,
+            extra={
+                "stage": stage,
+                "session_id": session_id,
+                "failed": False,
+                "duration_ms": round(elapsed * 1000, 3),
+            },
+        )
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and latency per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope.get("method", "")
+            REQUESTS.inc(method=method, route=route, status=str(status["code"]))
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method=method, route=route
+            )
@@ -0,0 +1,130 @@
+"""Per-session state for incremental timeline ingestion.
+
+Clients push small batches of timeline frames and transcript messages to
+``POST /sessions/{id}/events`` while the session runs. Frames go straight
+into array-backed buffers with running aggregates, so ``/analyze`` can be
+called with just a session id instead of re-sending the whole timeline.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from agents.features import EMOTIONS, MODALITIES, Timeline, TimelineBuilder
+from models.hume_input import SessionEventBatch
+
+
+class SessionBuffer:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.builder = TimelineBuilder()
+        self.metadata: Dict[str, Any] = {}
+        self.transcript: List[Dict[str, Any]] = []
+        self._transcript_index: Dict[str, int] = {}
+        self.updated_at = 0.0
+
+    def add_events(self, batch: SessionEventBatch) -> None:
+        for name in MODALITIES:
+            self.builder.extend_frames(name, getattr(batch, name))
+        for validated in batch.transcript_messages:
+            message = validated.model_dump(exclude_unset=True)
+            # The transcript widget re-sends edited messages with the same id.
+            message_id = validated.id
+            if message_id is not None and message_id in self._transcript_index:
+                self.transcript[self._transcript_index[message_id]] = message
+                continue
+            if message_id is not None:
+                self._transcript_index[message_id] = len(self.transcript)
+            self.transcript.append(message)
+        self.metadata.update(batch.conversation_data)
+
+    def conversation_data(self) -> Dict[str, Any]:
+        return {
+            **self.metadata,
+            "session_id": self.session_id,
+            "transcript_messages": list(self.transcript),
+        }
+
+    def hume_data(self) -> Dict[str, Any]:
+        return {"session_id": self.session_id}
+
+    def timeline(self) -> Timeline:
+        return self.builder.timeline()
+
+    def counts(self) -> Dict[str, int]:
+        return {**self.builder.counts(), "transcript_messages": len(self.transcript)}
+
+    def summary(self, top_k: int = 5) -> Dict[str, Any]:
+        """Session-level aggregates straight from the running sums."""
+        modalities = {}
+        for name, buffer in self.builder.buffers.items():
+            mean = buffer.mean()
+            top = np.argsort(-mean, kind="stable")[:top_k]
+            modalities[name] = {
+                "frames": buffer.size,
+                "top_emotions": {
+                    EMOTIONS[i]: round(float(mean[i]), 4) for i in top if buffer.size
+                },
+            }
+        return {
+            "session_id": self.session_id,
+            "counts": self.counts(),
+            "modalities": modalities,
+            "buffer_bytes": sum(b.nbytes for b in self.builder.buffers.values()),
+        }
+
+
+class SessionStore:
+    """Bounded map of live sessions; idle sessions expire after ``ttl_seconds``."""
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._sessions: "OrderedDict[str, SessionBuffer]" = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[SessionBuffer]:
+        self._expire()
+        return self._sessions.get(session_id)
+
+    def get_or_create(self, session_id: str) -> SessionBuffer:
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = SessionBuffer(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        session.updated_at = self._clock()
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self) -> None:
+        # Sessions are kept in least-recently-updated order.
+        cutoff = self._clock() - self.ttl_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.updated_at > cutoff:
+                break
+            self._sessions.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+def session_store_from_env() -> SessionStore:
+    """Build the session store configured by ``ANALYZE_SESSION_*`` environment variables."""
+    return SessionStore(
+        max_sessions=int(os.getenv("ANALYZE_SESSION_MAX", "1000")),
+        ttl_seconds=float(os.getenv("ANALYZE_SESSION_TTL_SECONDS", "3600")),
+    )
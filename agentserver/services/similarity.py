@@ -0,0 +1,486 @@
+"""Near-duplicate search over previously assessed sessions.
+
+Many sessions are short scripted screenings with nearly the same transcript
+and a similar affect profile, which the exact-hash cache cannot match. Each
+assessed session is indexed by two local features, computed without any
+network call:
+
+- text: word unigrams and bigrams of the transcript hashed into
+  ``TEXT_DIMENSIONS`` buckets, sublinear counts weighted by IDF over the
+  indexed sessions;
+- affect: per-modality mean and standard deviation of every emotion,
+  centred on the indexed sessions' average profile.
+
+Both parts are L2-normalized and scaled by the square roots of
+``TEXT_WEIGHT`` and ``1 - TEXT_WEIGHT`` before concatenation, so the inner
+product of two session vectors is the weighted mean of the text and affect
+cosine similarities. Corpus statistics are refitted (and the backend
+rebuilt) each time the index has grown by ``REFIT_GROWTH``, which is also
+the point at which an approximate backend would rebuild its structure;
+``BruteForceBackend`` searches exactly.
+
+``SimilarityIndex.search`` returns prior sessions at or above ``threshold``.
+``/analyze`` hands them to the model as few-shot anchors
+(``prompt.SIMILAR_SESSIONS_KEY``) and, in ``reuse`` mode, serves a match at
+or above ``reuse_threshold`` instead of running a new analysis. A session
+never matches itself: entries with the searched session's id or payload
+fingerprint are skipped, and re-indexing a session id replaces its entry.
+"""
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from agents.features import EMOTIONS, MODALITIES, Timeline
+from agents.transcript import MEASURED_FIELDS, tokenize
+from models.flat_assessment import FlatAutismAssessment
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: saves merge without the file lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TEXT_DIMENSIONS = 1024
+AFFECT_DIMENSIONS = 2 * len(MODALITIES) * len(EMOTIONS)
+# share of the similarity carried by the transcript (the rest by affect)
+TEXT_WEIGHT = 0.6
+# IDF and the affect centre are fitted once this many sessions are indexed
+MIN_FIT_SESSIONS = 20
+# refit once the index has grown by this fraction since the last fit
+REFIT_GROWTH = 0.25
+MODES = ("anchors", "reuse")
+
+
+class SessionFeatures(NamedTuple):
+    """Corpus-independent features of one session (before weighting)."""
+
+    text: np.ndarray  # float32 (TEXT_DIMENSIONS,) 1 + log(count) per bucket
+    affect: np.ndarray  # float32 (AFFECT_DIMENSIONS,) mean and std per modality
+
+
+class Match(NamedTuple):
+    session_id: str
+    fingerprint: str
+    similarity: float
+    assessment: FlatAutismAssessment
+
+
+def _bucket(gram: str) -> int:
+    return zlib.crc32(gram.encode("utf-8")) % TEXT_DIMENSIONS
+
+
+def session_features(
+    conversation_data: Dict[str, Any],
+    hume_data: Dict[str, Any],
+    timeline: Optional[Timeline] = None,
+) -> SessionFeatures:
+    """Hashed transcript n-gram counts and the emotion profile of a session.
+
+    ``timeline`` is built from ``hume_data`` when not given.
+    """
+    if timeline is None:
+        timeline = Timeline.from_hume_data(hume_data)
+    messages = conversation_data.get("transcript_messages") or []
+    grams: Counter = Counter()
+    for tokens in tokenize([str(m.get("speech") or "") for m in messages]):
+        grams.update(tokens)
+        grams.update(map(" ".join, zip(tokens, tokens[1:])))
+    counts = np.zeros(TEXT_DIMENSIONS, dtype=np.float64)
+    if grams:
+        buckets = np.fromiter(map(_bucket, grams), dtype=np.int64, count=len(grams))
+        np.add.at(counts, buckets, np.fromiter(grams.values(), dtype=np.float64))
+    text = np.zeros(TEXT_DIMENSIONS, dtype=np.float32)
+    present = counts > 0
+    text[present] = 1.0 + np.log(counts[present])
+
+    parts = []
+    for name in MODALITIES:
+        scores = timeline[name].scores
+        if len(scores):
+            parts += [scores.mean(axis=0), scores.std(axis=0)]
+        else:
+            parts += [np.zeros(len(EMOTIONS)), np.zeros(len(EMOTIONS))]
+    return SessionFeatures(text, np.concatenate(parts).astype(np.float32))
+
+
+def _normalize(rows: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(rows, axis=-1, keepdims=True)
+    return np.divide(rows, norms, out=np.zeros_like(rows), where=norms > 0)
+
+
+class BruteForceBackend:
+    """Exact top-k by inner product over one matrix of unit vectors.
+
+    The backend interface is ``reset(vectors)``, ``add(vectors)``,
+    ``search(query, k) -> (rows, scores)`` and ``len()``; rows are positions
+    in insertion order since the last ``reset``.
+    """
+
+    name = "numpy"
+
+    def __init__(self):
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._size = 0
+
+    def reset(self, vectors: np.ndarray) -> None:
+        self._vectors = np.array(vectors, dtype=np.float32)
+        self._size = vectors.shape[0]
+
+    def add(self, vectors: np.ndarray) -> None:
+        needed = self._size + vectors.shape[0]
+        if (
+            needed > self._vectors.shape[0]
+            or self._vectors.shape[1:] != vectors.shape[1:]
+        ):
+            grown = np.zeros(
+                (max(needed, 2 * self._size, 64), vectors.shape[1]), dtype=np.float32
+            )
+            if self._size:
+                grown[: self._size] = self._vectors[: self._size]
+            self._vectors = grown
+        self._vectors[self._size : needed] = vectors
+        self._size = needed
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self._size == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self._vectors[: self._size] @ query.astype(np.float32)
+        k = min(k, self._size)
+        rows = np.argpartition(-scores, k - 1)[:k]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return rows, scores[rows]
+
+    def __len__(self) -> int:
+        return self._size
+
+
+BACKENDS = {BruteForceBackend.name: BruteForceBackend}
+
+
+def _grow(rows: np.ndarray) -> np.ndarray:
+    """``rows`` with capacity for at least as many more (zero-filled)."""
+    extra = np.zeros((max(64, rows.shape[0]), rows.shape[1]), dtype=np.float32)
+    return np.vstack([rows, extra])
+
+
+class SimilarityIndex:
+    """Bounded index of assessed sessions searchable by session similarity.
+
+    Sessions are kept in insertion order; beyond ``max_entries`` the oldest
+    are dropped. ``save``/``load`` keep the index across restarts (the
+    server saves to ``path`` on shutdown). Every uvicorn worker saves its
+    own index, so ``save`` merges into the file already at ``path`` under a
+    lock rather than overwriting the other workers' sessions.
+    """
+
+    def __init__(
+        self,
+        mode: str = "anchors",
+        threshold: float = 0.85,
+        reuse_threshold: float = 0.97,
+        top_k: int = 3,
+        max_entries: int = 10000,
+        backend: Optional[Any] = None,
+        path: Optional[str] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown similarity mode {mode!r}")
+        self.mode = mode
+        self.threshold = threshold
+        self.reuse_threshold = reuse_threshold
+        self.top_k = top_k
+        self.max_entries = max_entries
+        self.backend = backend if backend is not None else BruteForceBackend()
+        self.path = path
+        self._lock = threading.Lock()
+        self._session_ids: List[str] = []
+        self._fingerprints: List[str] = []
+        self._assessments: List[FlatAutismAssessment] = []
+        self._text = np.zeros((0, TEXT_DIMENSIONS), dtype=np.float32)
+        self._affect = np.zeros((0, AFFECT_DIMENSIONS), dtype=np.float32)
+        self._idf = np.ones(TEXT_DIMENSIONS, dtype=np.float32)
+        self._centre = np.zeros(AFFECT_DIMENSIONS, dtype=np.float32)
+        self._fitted_at = 0
+
+    def _vectors(self, text: np.ndarray, affect: np.ndarray) -> np.ndarray:
+        return np.hstack(
+            [
+                np.sqrt(TEXT_WEIGHT) * _normalize(text * self._idf),
+                np.sqrt(1.0 - TEXT_WEIGHT) * _normalize(affect - self._centre),
+            ]
+        )
+
+    def _rows(self) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(self._session_ids)
+        return self._text[:n], self._affect[:n]
+
+    def _refit(self) -> None:
+        text, affect = self._rows()
+        if len(text) >= MIN_FIT_SESSIONS:
+            document_frequency = np.count_nonzero(text, axis=0)
+            self._idf = (
+                np.log((1.0 + len(text)) / (1.0 + document_frequency)) + 1.0
+            ).astype(np.float32)
+            self._centre = affect.mean(axis=0)
+        self._fitted_at = len(text)
+        self.backend.reset(self._vectors(text, affect))
+
+    def add(
+        self,
+        session_id: str,
+        features: SessionFeatures,
+        assessment: FlatAutismAssessment,
+        fingerprint: str = "",
+    ) -> None:
+        """Index a session, replacing any earlier entry for ``session_id``."""
+        with self._lock:
+            n = len(self._session_ids)
+            replaced = session_id in self._session_ids
+            if replaced:
+                row = self._session_ids.index(session_id)
+                del self._session_ids[row], self._fingerprints[row]
+                del self._assessments[row]
+                self._text[row : n - 1] = self._text[row + 1 : n]
+                self._affect[row : n - 1] = self._affect[row + 1 : n]
+                n -= 1
+            if n == self._text.shape[0]:
+                self._text, self._affect = _grow(self._text), _grow(self._affect)
+            self._text[n], self._affect[n] = features.text, features.affect
+            self._session_ids.append(session_id)
+            self._fingerprints.append(fingerprint)
+            self._assessments.append(assessment)
+            n += 1
+            if n > self.max_entries:
+                # drop a tenth at once so evictions do not rebuild every time
+                drop = max(n - self.max_entries, self.max_entries // 10)
+                del self._session_ids[:drop], self._fingerprints[:drop]
+                del self._assessments[:drop]
+                self._text = self._text[drop:n].copy()
+                self._affect = self._affect[drop:n].copy()
+                self._refit()
+            elif n >= max(MIN_FIT_SESSIONS, self._fitted_at * (1.0 + REFIT_GROWTH)):
+                self._refit()
+            elif replaced:
+                # backend rows follow insertion order: rebuild on the same fit
+                self.backend.reset(self._vectors(*self._rows()))
+            else:
+                self.backend.add(
+                    self._vectors(features.text[None], features.affect[None])
+                )
+
+    def search(
+        self,
+        features: SessionFeatures,
+        session_id: Optional[str] = None,
+        fingerprint: Optional[str] = None,
+    ) -> List[Match]:
+        """The ``top_k`` most similar sessions at or above ``threshold``.
+
+        Entries for ``session_id`` or with ``fingerprint`` are the searched
+        session itself (or an earlier run of it) and are left out.
+        """
+        with self._lock:
+            query = self._vectors(features.text[None], features.affect[None])[0]
+            k = self.top_k
+            while True:
+                rows, scores = self.backend.search(query, k)
+                matches = [
+                    Match(
+                        self._session_ids[row],
+                        self._fingerprints[row],
+                        float(score),
+                        self._assessments[row],
+                    )
+                    for row, score in zip(rows.tolist(), scores.tolist())
+                    if score >= self.threshold
+                    and self._session_ids[row] != session_id
+                    and not (fingerprint and self._fingerprints[row] == fingerprint)
+                ]
+                # widen the search only while excluded entries crowd out matches
+                if (
+                    len(matches) >= self.top_k
+                    or len(rows) < k
+                    or scores[-1] < self.threshold
+                ):
+                    return matches[: self.top_k]
+                k *= 2
+
+    def reusable(self, matches: List[Match]) -> Optional[Match]:
+        """The match to serve instead of a new analysis, in ``reuse`` mode.
+
+        Nothing is reused before the corpus statistics are fitted: unweighted
+        n-grams and uncentred profiles overstate similarity.
+        """
+        if self.mode != "reuse" or not matches or self._fitted_at < MIN_FIT_SESSIONS:
+            return None
+        best = matches[0]
+        return best if best.similarity >= self.reuse_threshold else None
+
+    def __len__(self) -> int:
+        return len(self._session_ids)
+
+    def save(self, path: str) -> None:
+        """Merge the index into the file at ``path`` (replaced atomically).
+
+        Sessions in the file but not in this index (saved by another worker)
+        are kept ahead of this index's own, which win on a shared session id;
+        the newest ``max_entries`` are written.
+        """
+        with self._lock:
+            n = len(self._session_ids)
+            session_ids = list(self._session_ids)
+            fingerprints = list(self._fingerprints)
+            assessments = [a.model_dump_json() for a in self._assessments]
+            text, affect = self._text[:n].copy(), self._affect[:n].copy()
+        with _locked(path):
+            if os.path.exists(path):
+                saved = _read(path)
+                own = set(session_ids)
+                keep = [
+                    row
+                    for row, session_id in enumerate(saved["session_ids"])
+                    if session_id not in own
+                ]
+                session_ids = [saved["session_ids"][r] for r in keep] + session_ids
+                fingerprints = [saved["fingerprints"][r] for r in keep] + fingerprints
+                assessments = [saved["assessments"][r] for r in keep] + assessments
+                text = np.vstack([saved["text"][keep], text])
+                affect = np.vstack([saved["affect"][keep], affect])
+            newest = slice(max(len(session_ids) - self.max_entries, 0), None)
+            # per process, so concurrent workers never write the same file
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    session_ids=np.array(session_ids[newest], dtype=str),
+                    fingerprints=np.array(fingerprints[newest], dtype=str),
+                    assessments=np.array(assessments[newest], dtype=str),
+                    text=text[newest],
+                    affect=affect[newest],
+                )
+            os.replace(temporary, path)
+
+    def load(self, path: str) -> None:
+        saved = _read(path)
+        assessments = [
+            FlatAutismAssessment.model_validate_json(text)
+            for text in saved["assessments"]
+        ]
+        with self._lock:
+            self._session_ids = saved["session_ids"]
+            self._fingerprints = saved["fingerprints"]
+            self._assessments = assessments
+            self._text, self._affect = saved["text"], saved["affect"]
+            self._refit()
+
+
+def _read(path: str) -> Dict[str, Any]:
+    """A saved index: id, fingerprint and assessment JSON lists, feature rows."""
+    with np.load(path) as data:
+        session_ids = data["session_ids"].tolist()
+        if "fingerprints" in data.files:
+            fingerprints = data["fingerprints"].tolist()
+        else:  # saved before fingerprints were indexed
+            fingerprints = [""] * len(session_ids)
+        return {
+            "session_ids": session_ids,
+            "fingerprints": fingerprints,
+            "assessments": data["assessments"].tolist(),
+            "text": data["text"],
+            "affect": data["affect"],
+        }
+
+
+@contextmanager
+def _locked(path: str):
+    """Hold an exclusive lock on ``{path}.lock``, shared by all workers."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def reuse_assessment(
+    match: Match, session_id: str, timestamp: Optional[datetime] = None
+) -> FlatAutismAssessment:
+    """A near-duplicate's assessment re-issued for ``session_id``.
+
+    The measured turn-taking fields belonged to the other session's
+    transcript and are cleared.
+    """
+    limitations = (
+        f"{match.assessment.assessment_limitations}; reused the assessment of "
+        f"near-duplicate session {match.session_id} "
+        f"(similarity {match.similarity:.3f}) without a new analysis"
+    )
+    return match.assessment.model_copy(
+        update={
+            "session_id": session_id,
+            "timestamp": (timestamp or datetime.now()).isoformat(),
+            "assessment_limitations": limitations,
+            **{name: None for name in MEASURED_FIELDS},
+        }
+    )
+
+
+def anchor_summaries(matches: List[Match]) -> List[Dict[str, Any]]:
+    """Compact records of the matches for the prompt's few-shot section."""
+    return [
+        {
+            "session_id": match.session_id,
+            "similarity": round(match.similarity, 3),
+            **json.loads(
+                match.assessment.model_dump_json(
+                    exclude={"session_id", "timestamp", "analysis_version"}
+                )
+            ),
+        }
+        for match in matches
+    ]
+
+
+def similarity_index_from_env() -> Optional[SimilarityIndex]:
+    """Build the index configured by ``SIMILARITY_*`` environment variables.
+
+    Off (None) unless ``SIMILARITY_MODE`` is ``anchors`` or ``reuse``; with
+    ``SIMILARITY_INDEX_PATH`` the index is loaded from (and saved to) that
+    ``.npz`` file.
+    """
+    mode = os.getenv("SIMILARITY_MODE", "off")
+    if mode not in MODES:
+        return None
+    backend_name = os.getenv("SIMILARITY_BACKEND", BruteForceBackend.name)
+    path = os.getenv("SIMILARITY_INDEX_PATH")
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown similarity backend {backend_name!r}")
+    index = SimilarityIndex(
+        mode=mode,
+        threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.85")),
+        reuse_threshold=float(os.getenv("SIMILARITY_REUSE_THRESHOLD", "0.97")),
+        top_k=int(os.getenv("SIMILARITY_TOP_K", "3")),
+        max_entries=int(os.getenv("SIMILARITY_MAX_ENTRIES", "10000")),
+        backend=BACKENDS[backend_name](),
+        path=path,
+    )
+    if path and os.path.exists(path):
+        try:
+            index.load(path)
+            logger.info("Loaded %d sessions into the similarity index", len(index))
+        except Exception as e:
+            logger.warning("Could not load similarity index %s: %s", path, e)
+    return index
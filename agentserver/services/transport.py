@@ -0,0 +1,387 @@
+"""Compressed and binary request bodies.
+
+``DecompressionMiddleware`` undoes ``Content-Encoding: gzip``, ``deflate`` or
+``zstd`` as a request body streams in, so every endpoint accepts compressed
+uploads (zstd needs Python 3.14's ``compression.zstd`` or the optional
+``zstandard`` package). Decompressed bodies are capped at ``max_size`` bytes.
+``StreamingGZipMiddleware`` compresses responses except streamed media types.
+
+``/analyze`` bodies may also use the compact ``TIMELINE_CONTENT_TYPE`` format,
+which carries the emotion timeline as packed arrays instead of JSON frames::
+
+    b"AGTL" | uint32 header length | header (UTF-8 JSON) | padding to 8 bytes
+    then per modality, in ``agents.features.MODALITIES`` order:
+    float64[frames] timestamps (seconds) | float32[frames, emotions] scores
+
+with each array padded to 8 bytes. The header holds ``conversation_data``,
+the remaining ``hume_data`` fields, the ``emotions`` name dictionary (column
+order of the score matrices) and ``frames`` per modality. Decoding maps the
+arrays onto the body buffer with ``np.frombuffer``; only a body whose emotion
+dictionary differs from ``EMOTIONS`` is scattered into a new matrix.
+"""
+
+import json
+import struct
+import zlib
+from contextlib import nullcontext
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+)
+
+import numpy as np
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse
+
+from agents.features import (
+    EMOTION_INDEX,
+    EMOTIONS,
+    MODALITIES,
+    ModalityArrays,
+    Timeline,
+)
+from services.ingest import (
+    ParsedAnalyzeRequest,
+    PayloadValidationError,
+    validate_conversation,
+)
+
+TIMELINE_CONTENT_TYPE = "application/x-agentserver-timeline"
+MAGIC = b"AGTL"
+_PREFIX = struct.Struct("<4sI")
+
+
+class BodyEncodingError(ValueError):
+    """A request body that cannot be decoded; ``status_code`` is the HTTP answer."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _ZstdDecompressor:
+    """Incremental zstd decoder from ``compression.zstd`` or ``zstandard``.
+
+    ``compression.zstd`` honours ``max_length`` itself. ``zstandard``'s
+    decompressobj has no output limit, so input is fed in slices small enough
+    that each can expand to at most ``max_length``: a zstd block of a few bytes
+    decodes to at most 128 KiB, bounding the ratio by ``MAX_RATIO``.
+    """
+
+    MAX_RATIO = 1 << 15
+    MIN_SLICE = 64
+
+    def __init__(self):
+        try:
+            from compression import zstd  # type: ignore
+
+            self._obj = zstd.ZstdDecompressor()
+            self._bounded = True
+        except ImportError:
+            try:
+                import zstandard  # type: ignore
+            except ImportError:
+                raise BodyEncodingError(
+                    "zstd request bodies are not supported on this server", 415
+                )
+            self._obj = zstandard.ZstdDecompressor().decompressobj()
+            self._bounded = False
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        if self._bounded:
+            return self._obj.decompress(data, max_length)
+        out = bytearray()
+        view = memoryview(data)
+        while view and len(out) < max_length:
+            size = max(self.MIN_SLICE, (max_length - len(out)) // self.MAX_RATIO)
+            out += self._obj.decompress(view[:size])
+            view = view[size:]
+            if self._obj.eof:
+                break
+        return bytes(out)
+
+    @property
+    def unconsumed_tail(self) -> bytes:
+        return b""
+
+    @property
+    def eof(self) -> bool:
+        return self._obj.eof
+
+
+class BodyDecoder:
+    """Incremental decoder for one ``Content-Encoding``, bounded to ``max_size``."""
+
+    def __init__(self, encoding: str, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        if encoding in ("gzip", "x-gzip"):
+            self._obj: Any = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self._obj = zlib.decompressobj()
+        elif encoding == "zstd":
+            self._obj = _ZstdDecompressor()
+        else:
+            raise BodyEncodingError(f"Unsupported Content-Encoding {encoding!r}", 415)
+
+    def decode(self, data: bytes, final: bool) -> bytes:
+        try:
+            # max_length bounds what one chunk can expand to (zlib); anything
+            # left unconsumed means the limit was crossed
+            out = self._obj.decompress(data, self.max_size - self.size + 1)
+        except Exception as e:  # zlib.error, ZstdError
+            raise BodyEncodingError(f"Corrupt compressed body: {e}")
+        self.size += len(out)
+        if self.size > self.max_size or self._obj.unconsumed_tail:
+            raise BodyEncodingError(
+                f"Decompressed body exceeds {self.max_size} bytes", 413
+            )
+        if final and not self._obj.eof:
+            raise BodyEncodingError("Truncated compressed body")
+        return out
+
+
+class DecompressionMiddleware:
+    """ASGI middleware decoding compressed request bodies for every route."""
+
+    def __init__(self, app, max_size: int = 256 << 20):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = Headers(scope=scope).get("content-encoding", "").strip().lower()
+        if encoding in ("", "identity"):
+            await self.app(scope, receive, send)
+            return
+        try:
+            decoder = BodyDecoder(encoding, self.max_size)
+        except BodyEncodingError as e:
+            response = JSONResponse({"detail": str(e)}, status_code=e.status_code)
+            await response(scope, receive, send)
+            return
+
+        scope = {
+            **scope,
+            "headers": [
+                (name, value)
+                for name, value in scope["headers"]
+                if name not in (b"content-encoding", b"content-length")
+            ],
+        }
+
+        async def receive_decoded():
+            message = await receive()
+            if message["type"] == "http.request":
+                more_body = message.get("more_body", False)
+                body = decoder.decode(message.get("body", b""), final=not more_body)
+                message = {**message, "body": body}
+            return message
+
+        await self.app(scope, receive_decoded, send)
+
+
+class StreamingGZipMiddleware:
+    """``GZipMiddleware`` that leaves streamed media types uncompressed.
+
+    Gzip buffers output, which would hold back SSE events and NDJSON records.
+    Every Starlette release passes a response through untouched when it
+    already has a ``Content-Encoding``, so excluded responses are marked with
+    ``identity`` on the way into the gzip layer and unmarked on the way out.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 500,
+        excluded_content_types: Sequence[str] = (
+            "text/event-stream",
+            "application/x-ndjson",
+        ),
+    ):
+        self.app = app
+        self.excluded_content_types = tuple(excluded_content_types)
+        self.gzip = GZipMiddleware(self._mark_excluded, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_unmarked(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                if headers.get("content-encoding") == "identity":
+                    del headers["content-encoding"]
+                    message = {**message, "headers": headers.raw}
+            await send(message)
+
+        await self.gzip(scope, receive, send_unmarked)
+
+    async def _mark_excluded(self, scope, receive, send):
+        async def send_marked(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                content_type = headers.get("content-type", "")
+                if "content-encoding" not in headers and content_type.startswith(
+                    self.excluded_content_types
+                ):
+                    headers["content-encoding"] = "identity"
+                    message = {**message, "headers": headers.raw}
+            await send(message)
+
+        await self.app(scope, receive, send_marked)
+
+
+def _pad(length: int) -> int:
+    return -length % 8
+
+
+def encode_timeline(
+    conversation_data: Dict[str, Any],
+    timeline: Timeline,
+    hume_data: Optional[Dict[str, Any]] = None,
+) -> bytes:
+    """Serialize an /analyze request in the ``TIMELINE_CONTENT_TYPE`` format."""
+    hume_fields = {
+        k: v for k, v in (hume_data or {}).items() if k != "emotion_timeline"
+    }
+    header = json.dumps(
+        {
+            "conversation_data": conversation_data,
+            "hume_data": hume_fields,
+            "emotions": list(EMOTIONS),
+            "frames": {name: len(timeline[name]) for name in MODALITIES},
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    parts: List[bytes] = [_PREFIX.pack(MAGIC, len(header)), header]
+    parts.append(b"\0" * _pad(_PREFIX.size + len(header)))
+    for name in MODALITIES:
+        arrays = timeline[name]
+        for data in (
+            np.ascontiguousarray(arrays.timestamps, dtype="<f8").tobytes(),
+            np.ascontiguousarray(arrays.scores, dtype="<f4").tobytes(),
+        ):
+            parts.append(data)
+            parts.append(b"\0" * _pad(len(data)))
+    return b"".join(parts)
+
+
+def decode_timeline(body: bytes) -> ParsedAnalyzeRequest:
+    """Decode a ``TIMELINE_CONTENT_TYPE`` body; arrays are views onto ``body``.
+
+    Raises ``ValueError`` for malformed bodies and ``PayloadValidationError``
+    for scores outside [0, 1] or invalid conversation data.
+    """
+    buffer = memoryview(body)
+    if len(buffer) < _PREFIX.size:
+        raise ValueError("Truncated timeline body")
+    magic, header_length = _PREFIX.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("Not an agentserver timeline body")
+    offset = _PREFIX.size + header_length
+    header = json.loads(bytes(buffer[_PREFIX.size : offset]))
+    offset += _pad(offset)
+    if not isinstance(header, dict):
+        raise ValueError("Timeline header must be a JSON object")
+
+    emotions: Sequence[str] = header.get("emotions") or ()
+    frames: Dict[str, int] = header.get("frames") or {}
+    if not isinstance(emotions, list) or not all(
+        isinstance(name, str) for name in emotions
+    ):
+        raise ValueError("Timeline header 'emotions' must be a list of names")
+    if not isinstance(frames, dict):
+        raise ValueError("Timeline header 'frames' must be an object")
+    if not isinstance(header.get("hume_data") or {}, dict):
+        raise ValueError("Timeline header 'hume_data' must be an object")
+    modalities: Dict[str, ModalityArrays] = {}
+    for name in MODALITIES:
+        count = frames.get(name, 0)
+        if not isinstance(count, int) or count < 0:
+            raise ValueError(f"Timeline header frame count for {name} is invalid")
+        timestamps = _array(buffer, offset, "<f8", count)
+        offset += timestamps.nbytes + _pad(timestamps.nbytes)
+        scores = _array(buffer, offset, "<f4", count * len(emotions))
+        offset += scores.nbytes + _pad(scores.nbytes)
+        scores = _to_vocabulary(scores.reshape(count, len(emotions)), emotions)
+        _check_scores(name, timestamps, scores)
+        if count > 1 and np.any(np.diff(timestamps) < 0):
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, scores = timestamps[order], scores[order]
+        modalities[name] = ModalityArrays(timestamps, scores)
+
+    result = ParsedAnalyzeRequest()
+    result.byte_count = len(buffer)
+    result.fields = {k: v for k, v in header.items() if k == "conversation_data"}
+    result.hume_data = dict(header.get("hume_data") or {})
+    result.has_hume_data = True
+    validate_conversation(result.conversation_data)
+    result.timeline = Timeline(modalities)
+    return result
+
+
+def _array(buffer: memoryview, offset: int, dtype: str, count: int) -> np.ndarray:
+    size = np.dtype(dtype).itemsize * count
+    if offset + size > len(buffer):
+        raise ValueError("Truncated timeline body")
+    return np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+
+
+def _to_vocabulary(scores: np.ndarray, emotions: Sequence[str]) -> np.ndarray:
+    if tuple(emotions) == EMOTIONS:
+        return scores
+    # a sender with another vocabulary: keep known names, drop the rest
+    mapped = np.zeros((scores.shape[0], len(EMOTIONS)), dtype=np.float32)
+    for column, name in enumerate(emotions):
+        index = EMOTION_INDEX.get(name)
+        if index is not None:
+            mapped[:, index] = scores[:, column]
+    return mapped
+
+
+def _check_scores(name: str, timestamps: np.ndarray, scores: np.ndarray) -> None:
+    bad_times = ~np.isfinite(timestamps)
+    bad_rows = bad_times | ~np.all((scores >= 0.0) & (scores <= 1.0), axis=1)
+    if not bad_rows.any():
+        return
+    row = int(np.argmax(bad_rows))
+    loc = ("body", "hume_data", "emotion_timeline", name, row)
+    if bad_times[row]:
+        error = {
+            "type": "finite_number",
+            "loc": loc + ("timestamp",),
+            "msg": "Input should be a finite number",
+        }
+    else:
+        error = {
+            "type": "value_error",
+            "loc": loc + ("emotions",),
+            "msg": "Emotion scores must be between 0 and 1",
+        }
+    raise PayloadValidationError([{**error, "input": None}])
+
+
+async def parse_timeline_request(
+    chunks: AsyncIterator[bytes],
+    slot: Callable[[], AsyncContextManager[Any]] = nullcontext,
+) -> ParsedAnalyzeRequest:
+    """Read a ``TIMELINE_CONTENT_TYPE`` body from an async byte stream.
+
+    ``slot`` is held while decoding, once the whole body has arrived.
+    """
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+    async with slot():
+        return decode_timeline(body)
@@ -0,0 +1,113 @@
+"""Per-worker concurrency limits and the CPU offload pool.
+
+Every serving process (see ``serve.py``) caps how many model calls it has in
+flight and, separately, how many request bodies and prompts it processes at
+once, so one slow analysis plus a few large uploads cannot starve the event
+loop that also answers ``/health`` and accepts new connections. With
+``AGENTSERVER_CPU_PROCESSES`` above zero, prompt building and feature
+extraction run in a process pool; at zero (the default, which avoids spawning
+interpreters per uvicorn worker) they run in a thread, which keeps the event
+loop responsive but shares the GIL. Both are bounded by the CPU limit.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, TypeVar
+
+from services.metrics import LIMIT_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WorkerLimits:
+    def __init__(
+        self, llm_concurrency: int = 8, cpu_concurrency: int = 4, cpu_processes: int = 0
+    ):
+        self.llm_concurrency = llm_concurrency
+        self.cpu_concurrency = cpu_concurrency
+        self.cpu_processes = cpu_processes
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _semaphore(self, limit: str) -> asyncio.Semaphore:
+        # Semaphores are bound to the loop that serves requests; create them
+        # lazily so the limits can be built at import time.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphores = {
+                "llm": asyncio.Semaphore(self.llm_concurrency),
+                "cpu": asyncio.Semaphore(self.cpu_concurrency),
+            }
+        return self._semaphores[limit]
+
+    @asynccontextmanager
+    async def _slot(self, limit: str) -> AsyncIterator[None]:
+        semaphore = self._semaphore(limit)
+        started = time.perf_counter()
+        async with semaphore:
+            LIMIT_WAIT_SECONDS.observe(time.perf_counter() - started, limit=limit)
+            yield
+
+    def llm(self):
+        """Hold one of the ``llm_concurrency`` model-call slots."""
+        return self._slot("llm")
+
+    def cpu(self):
+        """Hold one of the ``cpu_concurrency`` payload-processing slots."""
+        return self._slot("cpu")
+
+    async def run_cpu(self, fn: Callable[..., T], *args) -> T:
+        """Run ``fn(*args)`` under the CPU limit, in the process pool if configured.
+
+        ``fn`` and its arguments must be picklable when a pool is configured.
+        """
+        async with self.cpu():
+            # None runs fn in the loop's default thread pool, off the event loop
+            return await asyncio.get_running_loop().run_in_executor(
+                self._ensure_pool(), fn, *args
+            )
+
+    def _ensure_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._pool is None and self.cpu_processes > 0:
+            # spawn rather than fork: the serving process runs threads (logging,
+            # agent warm-up) that a forked child would inherit mid-flight
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.cpu_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def start(self) -> None:
+        """Start the pool's processes ahead of the first request (app startup)."""
+        pool = self._ensure_pool()
+        if pool is not None:
+            for future in [pool.submit(os.getpid) for _ in range(self.cpu_processes)]:
+                future.result()
+            logger.info("CPU pool started with %d processes", self.cpu_processes)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+def worker_limits_from_env() -> WorkerLimits:
+    """Build the limits configured by ``AGENTSERVER_*`` environment variables."""
+    return WorkerLimits(
+        llm_concurrency=int(os.getenv("AGENTSERVER_LLM_CONCURRENCY", "8")),
+        cpu_concurrency=int(os.getenv("AGENTSERVER_CPU_CONCURRENCY", "4")),
+        cpu_processes=int(os.getenv("AGENTSERVER_CPU_PROCESSES", "0")),
+    )
+
+
+# One set of limits per process: each uvicorn worker enforces its own.
+limits = worker_limits_from_env()
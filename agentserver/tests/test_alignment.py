@@ -0,0 +1,124 @@
+import sys
+import pathlib
+import time
+
+import numpy as np
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from agents.alignment import align_turns, align_windows, render_joint_timeline
+from agents.features import EMOTION_INDEX, EMOTIONS, ModalityArrays, Timeline
+from agents.scoring import message_times
+from benchmarks.synthetic import session_payload
+
+JOY = EMOTION_INDEX["Joy"]
+
+
+def small_session():
+    face_times = np.arange(0.0, 20.0, 0.5)
+    face = np.full((face_times.size, len(EMOTIONS)), 0.1, dtype=np.float32)
+    face[(face_times >= 5.0) & (face_times < 10.0), JOY] = 0.9
+    bursts = ModalityArrays(
+        np.array([1.0, 7.0]), np.full((2, len(EMOTIONS)), 0.2, dtype=np.float32)
+    )
+    timeline = Timeline(
+        {"face_emotions": ModalityArrays(face_times, face), "burst_analysis": bursts}
+    )
+    conversation = {
+        "start_time": "2025-09-06T10:00:00Z",
+        "transcript_messages": [
+            {
+                "role": "replica",
+                "speech": "Hello!",
+                "timestamp": "2025-09-06T10:00:02Z",
+            },
+            {
+                "role": "user",
+                "speech": "I like trains a lot.",
+                "timestamp": "2025-09-06T10:00:05Z",
+            },
+            {
+                "role": "replica",
+                "speech": "Tell me more.",
+                "timestamp": "2025-09-06T10:00:10Z",
+            },
+        ],
+    }
+    return conversation, timeline
+
+
+def test_turns_aggregate_frames_and_bursts_within_their_span():
+    conversation, timeline = small_session()
+    turns = align_turns(conversation, timeline)
+
+    np.testing.assert_allclose(turns.start, [2.0, 5.0, 10.0])
+    np.testing.assert_allclose(turns.end[:2], [5.0, 10.0])
+    assert turns.counts["face_emotions"].tolist() == [6, 10, 20]
+    assert turns.counts["prosody_emotions"].tolist() == [0, 0, 0]
+    face = timeline["face_emotions"]
+    for i in range(3):
+        inside = (face.timestamps >= turns.start[i]) & (face.timestamps < turns.end[i])
+        np.testing.assert_allclose(
+            turns.means["face_emotions"][i], face.scores[inside].mean(axis=0), rtol=1e-6
+        )
+        np.testing.assert_allclose(
+            turns.peaks["face_emotions"][i], face.scores[inside].max(axis=0)
+        )
+    # the burst before the first turn belongs to none
+    assert turns.burst_turn.tolist() == [-1, 1]
+    assert turns.bursts(1).tolist() == [1]
+
+    windows = align_windows(timeline, turns, window_seconds=10.0)
+    assert windows.counts["face_emotions"].tolist() == [20, 20]
+    assert windows.user_turns.tolist() == [1, 0]
+    assert windows.agent_turns.tolist() == [1, 1]
+
+    text = render_joint_timeline(conversation, timeline, window_seconds=10.0)
+    assert "[0-10s] turns user 1 agent 1" in text
+    assert '#1 [5.0-10.0s] "I like trains a lot." | FACE: Joy 0.90' in text
+    assert "bursts 1" in text
+
+
+def test_long_session_aligns_quickly_within_budget():
+    payload = session_payload(60, session_id="long")
+    timeline = Timeline.from_hume_data(payload["hume_data"])
+    conversation = payload["conversation_data"]
+    times = message_times(conversation["transcript_messages"])
+
+    started = time.perf_counter()
+    turns = align_turns(conversation, timeline, times)
+    assert time.perf_counter() - started < 0.25
+    assert turns.counts["face_emotions"].sum() > 0.95 * len(timeline["face_emotions"])
+
+    text = render_joint_timeline(conversation, timeline, token_budget=2000)
+    assert len(text) // 4 <= 2000
+    assert "Affect during user turns" in text
+
+
+def test_windows_cover_only_occupied_spans_of_epoch_scale_times():
+    conversation, timeline = small_session()
+    # frames stamped in epoch seconds, transcript without a start time
+    epoch = 1.7e9
+    del conversation["start_time"]
+    face = timeline["face_emotions"]
+    timeline = Timeline(
+        {"face_emotions": ModalityArrays(face.timestamps + epoch, face.scores)}
+    )
+    turns = align_turns(conversation, timeline)
+
+    started = time.perf_counter()
+    windows = align_windows(timeline, turns, window_seconds=10.0)
+    assert time.perf_counter() - started < 0.05
+    assert windows.start.tolist() == [0.0, epoch, epoch + 10.0]
+    assert windows.counts["face_emotions"].tolist() == [0, 20, 20]
+    assert windows.user_turns.tolist() == [1, 0, 0]
+    assert windows.agent_turns.tolist() == [2, 0, 0]
+
+    text = render_joint_timeline(conversation, timeline, window_seconds=10.0)
+    assert len(text.splitlines()) < 10
+    for bad in (0.0, -5.0, float("nan")):
+        with pytest.raises(ValueError):
+            align_windows(timeline, turns, window_seconds=bad)
+        with pytest.raises(ValueError):
+            render_joint_timeline(conversation, timeline, window_seconds=bad)
@@ -38,7 +38,7 @@ def test_analyze_fallback_called(monkeypatch):
 
     dummy_agent = types.SimpleNamespace(run=failing_run)
     monkeypatch.setattr(analyzer, "autism_agent", dummy_agent)
-    monkeypatch.setattr(analyzer, "_create_mock_response", lambda: sentinel)
+    monkeypatch.setattr(analyzer, "_create_mock_response", lambda *args: sentinel)
 
     result = asyncio.run(analyzer.analyze({}, {}))
     assert result is sentinel
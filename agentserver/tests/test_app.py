@@ -39,7 +39,7 @@ def test_health_endpoint():
 def test_analyze_endpoint(monkeypatch):
     sample = analyzer._create_mock_response()
 
-    async def fake_analyze(conversation_data, hume_data):
+    async def fake_analyze(conversation_data, hume_data, timeline=None, run_info=None):
         return sample
 
     monkeypatch.setattr(main, "analyze", fake_analyze)
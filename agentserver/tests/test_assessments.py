@@ -0,0 +1,112 @@
+import sys
+import pathlib
+import time
+import types
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+dotenv_stub = types.ModuleType("dotenv")
+dotenv_stub.load_dotenv = lambda: None
+sys.modules.setdefault("dotenv", dotenv_stub)
+
+import main
+from agents import analyzer
+from services.assessments import AssessmentRecord, AssessmentStore, AssessmentWriter
+from services.cache import AnalysisCache, MemoryBackend
+
+
+def assessment(session_id, priority="low"):
+    return analyzer._create_mock_response().model_copy(
+        update={"session_id": session_id, "evaluation_priority": priority}
+    )
+
+
+def test_store_filters_and_pages_by_keyset(tmp_path):
+    store = AssessmentStore(str(tmp_path / "assessments.sqlite3"))
+    records = [
+        AssessmentRecord(
+            assessment(f"s{i % 3}", "high" if i % 2 else "low"),
+            f"fp{i}",
+            "gemini-1.5-flash",
+            "v1",
+            i == 4,
+            1000.0 + i,
+        )
+        for i in range(10)
+    ]
+    assert store.insert_many(records) == 10
+    assert len(store) == 10
+
+    ids, cursor = [], None
+    while True:
+        page = store.query(limit=3, cursor=cursor)
+        ids.extend(item.id for item in page.items)
+        if page.next_cursor is None:
+            break
+        cursor = int(page.next_cursor)
+    assert ids == sorted(ids, reverse=True) and len(set(ids)) == 10
+
+    page = store.query(session_id="s1", priority="high")
+    assert [item.fingerprint for item in page.items] == ["fp7", "fp1"]
+    page = store.query(since=1004.0, until=1008.0, include_fallback=False)
+    assert [item.fingerprint for item in page.items] == ["fp7", "fp6", "fp5"]
+    assert store.get(page.items[0].id).assessment.session_id == "s1"
+
+    plan = store._read_conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM assessments"
+        " WHERE evaluation_priority = ? ORDER BY id DESC",
+        ("high",),
+    ).fetchall()
+    assert "assessments_evaluation_priority" in str(plan)
+
+
+def test_fresh_results_are_stored_off_the_request_path(monkeypatch, tmp_path):
+    async def fake_analyze(conversation_data, hume_data, timeline=None, run_info=None):
+        run_info.update(model="gemini-1.5-flash", prompt_version="v1")
+        return assessment(conversation_data["session_id"], "moderate")
+
+    writer = AssessmentWriter(AssessmentStore(str(tmp_path / "a.sqlite3")))
+    monkeypatch.setattr(main, "analyze", fake_analyze)
+    monkeypatch.setattr(main, "result_cache", AnalysisCache(MemoryBackend()))
+    monkeypatch.setattr(main, "assessment_writer", writer)
+
+    with TestClient(main.app) as client:
+        for session_id in ("a", "b", "a"):  # second "a" is a cache hit
+            payload = {"conversation_data": {"session_id": session_id}}
+            assert client.post("/analyze", json=payload).status_code == 200
+
+        deadline = time.monotonic() + 5
+        while len(writer.store) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        first = client.get("/assessments", params={"limit": 1}).json()
+        assert first["items"][0]["session_id"] == "b"
+        assert first["items"][0]["model"] == "gemini-1.5-flash"
+        second = client.get(
+            "/assessments", params={"limit": 1, "cursor": first["next_cursor"]}
+        ).json()
+        assert second["items"][0]["session_id"] == "a"
+        assert second["next_cursor"] is None
+        stored = client.get(f"/assessments/{second['items'][0]['id']}").json()
+        assert stored["fingerprint"] == main.fingerprint({"session_id": "a"}, {})
+        assert (
+            client.get("/assessments", params={"priority": "low"}).json()["items"] == []
+        )
+        assert client.get("/assessments", params={"cursor": "x"}).status_code == 400
+
+    monkeypatch.setattr(main, "assessment_writer", None)
+    assert TestClient(main.app).get("/assessments").status_code == 503
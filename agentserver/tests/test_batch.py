@@ -0,0 +1,171 @@
+import asyncio
+import json
+import sys
+import pathlib
+import threading
+import types
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+dotenv_stub = types.ModuleType("dotenv")
+dotenv_stub.load_dotenv = lambda: None
+sys.modules.setdefault("dotenv", dotenv_stub)
+
+import main
+from agents import analyzer
+from services.batch import BatchRunner, Checkpoint, Pacer, aiter_lines, run_batch
+
+SAMPLE = analyzer._create_mock_response().model_copy(update={"session_id": "ok"})
+
+
+def ndjson(session_ids):
+    return [
+        json.dumps({"conversation_data": {"session_id": sid}, "hume_data": {}}).encode()
+        for sid in session_ids
+    ]
+
+
+def post(client, url, timeout=10.0, **kwargs):
+    """POST from a daemon thread so a hung streaming response fails the test."""
+    result = {}
+    thread = threading.Thread(
+        target=lambda: result.update(response=client.post(url, **kwargs)),
+        daemon=True,
+    )
+    thread.start()
+    thread.join(timeout)
+    assert "response" in result, f"POST {url} did not finish within {timeout}s"
+    return result["response"]
+
+
+async def collect(records):
+    return [record async for record in records]
+
+
+def test_run_batch_bounds_concurrency_dedupes_and_resumes_from_checkpoint(tmp_path):
+    in_flight = []
+    seen = []
+
+    async def fake_analyze(conversation_data, hume_data, timeline):
+        in_flight.append(1)
+        seen.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        if conversation_data["session_id"] == "s3":
+            return analyzer._create_mock_response()
+        return SAMPLE
+
+    path = str(tmp_path / "batch.ckpt")
+    lines = ndjson([f"s{i}" for i in range(8)] + ["s1"]) + [b"{not json"]
+    records = asyncio.run(
+        collect(
+            run_batch(
+                aiter_lines(lines),
+                fake_analyze,
+                concurrency=3,
+                checkpoint=Checkpoint(path),
+                is_fallback=analyzer.is_fallback,
+            )
+        )
+    )
+    statuses = {record["index"]: record["status"] for record in records}
+    assert max(seen) == 3
+    assert statuses[3] == "fallback"
+    assert statuses[8] == "skipped"  # same payload as line 1
+    assert statuses[9] == "failed"
+    assert sum(status == "succeeded" for status in statuses.values()) == 7
+
+    seen.clear()
+    resumed = asyncio.run(
+        collect(
+            run_batch(
+                aiter_lines(reversed(lines[:8])),
+                fake_analyze,
+                checkpoint=Checkpoint(path),
+                is_fallback=analyzer.is_fallback,
+            )
+        )
+    )
+    assert [r["id"] for r in resumed if r["status"] != "skipped"] == ["s3"]
+    assert len(seen) == 1
+
+
+def test_pacer_spaces_starts_and_backs_off_after_fallbacks():
+    now = [0.0]
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    pacer = Pacer(rpm=60, clock=lambda: now[0], sleep=fake_sleep)
+
+    async def start(n):
+        for _ in range(n):
+            await pacer.wait()
+
+    asyncio.run(start(3))
+    assert sleeps == [1.0, 1.0]
+    pacer.record(False)
+    assert pacer.interval == 2.0
+    for _ in range(10):
+        pacer.record(True)
+    assert pacer.interval == 1.0
+
+
+def test_batch_endpoint_streams_ndjson_and_bypasses_cache(monkeypatch, tmp_path):
+    calls = []
+
+    async def fake_analyze(conversation_data, hume_data, timeline=None, run_info=None):
+        calls.append(conversation_data["session_id"])
+        return SAMPLE
+
+    monkeypatch.setattr(main, "analyze", fake_analyze)
+    monkeypatch.setattr(main, "batch_runner", BatchRunner(checkpoint_dir=str(tmp_path)))
+    client = TestClient(main.app)
+
+    body = b"\n".join(ndjson(["a", "b", "c"])) + b"\n"
+    response = post(
+        client,
+        "/analyze/batch?batch_id=nightly",
+        content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(r["id"] for r in records) == ["a", "b", "c"]
+    assert all(r["status"] == "succeeded" for r in records)
+
+    response = post(
+        client,
+        "/analyze/batch?batch_id=nightly",
+        json={
+            "sessions": [
+                {"conversation_data": {"session_id": sid}, "hume_data": {}}
+                for sid in ("a", "d")
+            ]
+        },
+    )
+    statuses = {
+        r["id"]: r["status"] for r in map(json.loads, response.text.splitlines())
+    }
+    assert statuses == {"a": "skipped", "d": "succeeded"}
+    assert sorted(calls) == ["a", "b", "c", "d"]
+
+    assert post(client, "/analyze/batch?batch_id=../x", content=body).status_code == 400
@@ -0,0 +1,50 @@
+import sys
+import pathlib
+import types
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+import main
+from agents import analyzer
+from agents.features import Timeline
+from benchmarks.bench_analyze import compare, run_benchmark
+from benchmarks.synthetic import session_payload
+
+
+def test_synthetic_session_has_all_modalities():
+    payload = session_payload(1, session_id="s", face_hz=2)
+    timeline = Timeline.from_hume_data(payload["hume_data"])
+    assert len(timeline["face_emotions"]) == 120
+    assert len(timeline["prosody_emotions"]) == 20
+    assert len(timeline["burst_analysis"]) == 4
+    assert payload["conversation_data"]["session_id"] == "s"
+    assert len(payload["conversation_data"]["transcript_messages"]) == 10
+
+
+def test_benchmark_smoke_report():
+    original_agent, original_cache = analyzer.autism_agent, main.result_cache
+    report = run_benchmark(minutes=[0.2], requests=3, concurrency=2, latency=0)
+
+    assert analyzer.autism_agent is original_agent
+    assert main.result_cache is original_cache
+    (result,) = report["results"]
+    assert result["http"]["requests"] == 3
+    assert set(result["http"]["latency_seconds"]) == {"p50", "p95", "p99"}
+    assert result["prompt_chars"] > 0
+    assert set(result["stages"]) == {"parse", "analyze", "end_to_end"}
+    assert all(stage["peak_bytes"] > 0 for stage in result["stages"].values())
+    assert len(compare(report, report)) > 1
@@ -0,0 +1,129 @@
+import sys
+import pathlib
+import types
+import asyncio
+
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+import main
+from agents import analyzer
+from services.cache import (
+    AnalysisCache,
+    MemoryBackend,
+    SQLiteBackend,
+    fingerprint,
+)
+
+
+def make_assessment(session_id="s1"):
+    return analyzer._create_mock_response().model_copy(
+        update={"session_id": session_id}
+    )
+
+
+def test_fingerprint_ignores_volatile_fields():
+    hume_data = {"emotion_timeline": {"face_emotions": [{"timestamp": 1}]}}
+    first = fingerprint(
+        {"session_id": "s1", "end_time": "a", "duration": 1.0}, hume_data
+    )
+    retry = fingerprint(
+        {"duration": 9.5, "end_time": "b", "session_id": "s1"}, hume_data
+    )
+    other = fingerprint({"session_id": "s2"}, hume_data)
+    assert first == retry
+    assert first != other
+
+
+def test_memory_backend_lru_and_ttl():
+    now = [0.0]
+    backend = MemoryBackend(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    backend.set("a", make_assessment("a"))
+    backend.set("b", make_assessment("b"))
+    assert backend.get("a").session_id == "a"
+    backend.set("c", make_assessment("c"))
+    assert backend.get("b") is None  # least recently used
+    now[0] = 11
+    assert backend.get("a") is None and backend.get("c") is None
+
+
+def test_sqlite_backend_roundtrip(tmp_path):
+    now = [100.0]
+    path = str(tmp_path / "cache.sqlite3")
+    backend = SQLiteBackend(path, max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    stored = make_assessment("a")
+    backend.set("a", stored)
+    reopened = SQLiteBackend(path, clock=lambda: now[0])
+    assert reopened.get("a") == stored
+    backend.set("b", make_assessment("b"))
+    backend.set("c", make_assessment("c"))
+    assert len(backend) == 2
+    now[0] = 200
+    assert backend.get("c") is None
+
+
+def test_concurrent_requests_are_coalesced():
+    cache = AnalysisCache(MemoryBackend())
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return make_assessment()
+
+    async def scenario():
+        results = await asyncio.gather(
+            *(cache.get_or_compute("k", compute) for _ in range(5))
+        )
+        again = await cache.get_or_compute("k", compute)
+        return results, again
+
+    results, again = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert again is results[0]
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["coalesced"] == 4
+    assert cache.stats()["hits"] == 1
+
+
+def test_analyze_endpoint_caches_successful_results(monkeypatch):
+    calls = []
+    sample = make_assessment("cached_session")
+
+    async def fake_analyze(conversation_data, hume_data, timeline=None, run_info=None):
+        calls.append(conversation_data)
+        return sample
+
+    monkeypatch.setattr(main, "analyze", fake_analyze)
+    monkeypatch.setattr(main, "result_cache", AnalysisCache(MemoryBackend()))
+    client = TestClient(main.app)
+
+    payload = {
+        "conversation_data": {"session_id": "x", "end_time": "t1"},
+        "hume_data": {},
+    }
+    assert client.post("/analyze", json=payload).status_code == 200
+    payload["conversation_data"]["end_time"] = "t2"
+    assert (
+        client.post("/analyze", json=payload).json()["session_id"] == "cached_session"
+    )
+
+    assert len(calls) == 1
+    stats = client.get("/cache/stats").json()
+    assert stats["hits"] == 1 and stats["misses"] == 1
@@ -0,0 +1,156 @@
+import sys
+import pathlib
+import types
+import asyncio
+import time
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+from agents import analyzer
+from agents.context_cache import (
+    LocalContextCache,
+    PrefixCache,
+    gemini_min_cache_tokens,
+)
+from agents.features import estimate_tokens
+from agents.prompt import INSTRUCTIONS, SYSTEM_PROMPT
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingAgent:
+    def __init__(self, sample):
+        self.sample = sample
+        self.prompts = []
+
+    async def run(self, prompt):
+        self.prompts.append(prompt)
+        return types.SimpleNamespace(data=self.sample)
+
+
+def use_router(monkeypatch, cache, agent):
+    """Install the production router: cache route first, then ``agent``."""
+    monkeypatch.setenv("ANALYZER_MODELS", "model")
+    monkeypatch.setattr(analyzer, "prefix_cache", cache)
+    monkeypatch.setattr(analyzer, "_create_model_agent", lambda name: agent)
+    monkeypatch.setattr(analyzer, "autism_agent", analyzer._create_agent())
+
+
+def run_sessions(*session_ids):
+    for session_id in session_ids:
+        asyncio.run(analyzer.analyze({"session_id": session_id}, {}))
+
+
+def test_prefix_is_cached_once_and_refreshed_before_expiry(monkeypatch):
+    clock = Clock()
+    sample = analyzer._create_mock_response().model_copy(update={"session_id": "ok"})
+    adapter = LocalContextCache(lambda suffix: sample, clock=clock)
+    agent = RecordingAgent(sample)
+    use_router(
+        monkeypatch,
+        PrefixCache(adapter, ttl_seconds=600, refresh_margin_seconds=60, clock=clock),
+        agent,
+    )
+
+    run_sessions("a", "b", "c")
+    assert len(adapter.created) == 1
+    first_id = adapter.created[0].cache_id
+    assert adapter.created[0].handle is None
+    assert adapter.created[0].prefix_tokens == estimate_tokens(
+        SYSTEM_PROMPT
+    ) + estimate_tokens(INSTRUCTIONS)
+    assert [call["cache_id"] for call in adapter.calls] == [first_id] * 3
+    assert all(INSTRUCTIONS not in call["suffix"] for call in adapter.calls)
+    assert "Session ID: b" in adapter.calls[1]["suffix"]
+    assert agent.prompts == []
+
+    clock.now += 545  # inside the refresh margin
+    run_sessions("d")
+    assert len(adapter.created) == 2
+    assert adapter.calls[-1]["cache_id"] == adapter.created[1].cache_id != first_id
+
+
+def test_cache_failures_fall_back_to_full_prompt(monkeypatch):
+    clock = Clock()
+    sample = analyzer._create_mock_response().model_copy(update={"session_id": "ok"})
+    attempts = []
+
+    class Unavailable(LocalContextCache):
+        async def create(self, system_prompt, prefix, ttl_seconds):
+            attempts.append(clock.now)
+            raise RuntimeError("prefix below minimum cacheable size")
+
+    agent = RecordingAgent(sample)
+    use_router(
+        monkeypatch,
+        PrefixCache(
+            Unavailable(lambda s: sample), retry_after_seconds=300, clock=clock
+        ),
+        agent,
+    )
+
+    run_sessions("a", "b")
+    assert len(attempts) == 1  # creation is not retried on every request
+    assert len(agent.prompts) == 2
+    assert agent.prompts[0].startswith(INSTRUCTIONS)
+
+    clock.now += 301
+    run_sessions("c")
+    assert len(attempts) == 2
+
+
+def test_prefix_below_provider_minimum_is_not_cached(monkeypatch):
+    sample = analyzer._create_mock_response().model_copy(update={"session_id": "ok"})
+    adapter = LocalContextCache(lambda s: sample, min_tokens=32768)
+    cache = PrefixCache(adapter)
+    agent = RecordingAgent(sample)
+    use_router(monkeypatch, cache, agent)
+
+    run_sessions("a", "b")
+    assert adapter.created == [] and adapter.calls == []
+    assert len(agent.prompts) == 2
+    assert cache.stats()["below_minimum_tokens"] == [
+        estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(INSTRUCTIONS)
+    ]
+    assert gemini_min_cache_tokens("gemini-2.5-flash-lite") == 1024
+    assert gemini_min_cache_tokens("gemini-2.5-pro") == 4096
+
+
+def test_slow_cached_generation_is_hedged_to_the_next_model(monkeypatch):
+    sample = analyzer._create_mock_response().model_copy(update={"session_id": "ok"})
+
+    class Slow(LocalContextCache):
+        async def generate(self, entry, suffix):
+            await asyncio.sleep(5)
+            return await super().generate(entry, suffix)
+
+    agent = RecordingAgent(sample)
+    monkeypatch.setenv("ANALYZER_HEDGE_AFTER_SECONDS", "0.05")
+    use_router(monkeypatch, PrefixCache(Slow(lambda s: sample)), agent)
+
+    started = time.perf_counter()
+    result = asyncio.run(analyzer.analyze({"session_id": "a"}, {}))
+    assert time.perf_counter() - started < 1.0
+    assert result == sample
+    assert len(agent.prompts) == 1
+    assert agent.prompts[0].startswith(INSTRUCTIONS)
@@ -0,0 +1,77 @@
+import sys
+import pathlib
+import time
+
+import numpy as np
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from agents.downsample import (
+    bounded_downsample,
+    downsample,
+    max_error,
+    render_keyframes,
+)
+from agents.features import EMOTIONS, ModalityArrays, Timeline, estimate_tokens
+
+
+def plateaus(frames=3000, hz=5.0, seed=0):
+    """Piecewise-constant emotions with small noise and one brief spike."""
+    rng = np.random.default_rng(seed)
+    levels = rng.uniform(0.0, 0.4, size=(frames // 300 + 1, len(EMOTIONS)))
+    scores = levels[np.arange(frames) // 300]
+    scores = scores + rng.normal(0, 0.002, scores.shape)
+    scores[frames // 2 - 266, 7] = 0.95
+    return ModalityArrays(
+        np.arange(frames) / hz, np.clip(scores, 0, 1).astype(np.float32)
+    )
+
+
+def test_threshold_merges_stable_stretches_and_keeps_peaks():
+    arrays = plateaus()
+    segments = downsample(arrays, threshold=1.0)
+    assert segments.frames == 3000
+    assert segments.compression_ratio > 50
+    spike = np.flatnonzero(segments.start == arrays.timestamps[1234])
+    assert spike.size == 1 and segments.peak[spike[0]]
+    assert segments.scores[spike[0], 7] == pytest.approx(0.95)
+    assert np.all(segments.end[:-1] < segments.start[1:])
+
+
+def test_target_and_error_modes_respect_their_bounds():
+    rng = np.random.default_rng(1)
+    walk = np.clip(
+        0.5 + np.cumsum(rng.normal(0, 0.01, (5000, len(EMOTIONS))), axis=0), 0, 1
+    )
+    arrays = ModalityArrays(np.arange(5000) / 5.0, walk.astype(np.float32))
+
+    for target in (10, 200, 1000):
+        assert len(downsample(arrays, target_frames=target)) <= target
+    assert len(downsample(arrays, target_frames=200)) > 150
+
+    bounded = downsample(arrays, max_error_bound=0.1)
+    assert max_error(arrays, bounded) <= 0.1
+    assert bounded.compression_ratio > 2
+    assert len(downsample(arrays, max_error_bound=0.2)) < len(bounded)
+
+    capped = bounded_downsample(arrays, 0.1, max_segments=len(bounded))
+    assert len(capped) == len(bounded) and max_error(arrays, capped) <= 0.1
+    assert bounded_downsample(arrays, 0.1, max_segments=len(bounded) // 4) is None
+
+
+def test_render_keyframes_fits_budget_quickly():
+    timeline = Timeline(
+        {"face_emotions": plateaus(frames=18000), "prosody_emotions": plateaus(600)}
+    )
+    started = time.perf_counter()
+    text = render_keyframes(timeline, token_budget=1500)
+    assert time.perf_counter() - started < 1.0
+    assert estimate_tokens(text) <= 1500
+    assert "FACE" in text and "PROSODY" in text and " peak " in text
+
+    # a bound far tighter than the budget allows is abandoned early
+    started = time.perf_counter()
+    text = render_keyframes(timeline, token_budget=1500, max_error_bound=0.001)
+    assert time.perf_counter() - started < 1.0
+    assert estimate_tokens(text) <= 1500
@@ -0,0 +1,106 @@
+import sys
+import pathlib
+import types
+import asyncio
+import time
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+from agents import analyzer, fanout
+from agents.features import Timeline
+from agents.scoring import score_session
+from benchmarks.synthetic import session_payload
+
+
+class BranchAgent:
+    def __init__(self, branch, delay, score=0.8):
+        self.branch, self.delay, self.score = branch, delay, score
+        self.prompts = []
+
+    async def run(self, prompt):
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.delay)
+        data = {name: self.score for name in self.branch.fields}
+        data.update(
+            confidence=0.7,
+            concerns=f"{self.branch.name} concern",
+            strengths="",
+            recommendations=f"{self.branch.name} follow-up",
+        )
+        return types.SimpleNamespace(data=data, model_name="gemini-2.5-flash")
+
+
+def use_fanout(monkeypatch, delays):
+    agents = {
+        branch.name: BranchAgent(branch, delays[branch.name])
+        for branch in fanout.BRANCHES
+    }
+    monkeypatch.setattr(analyzer, "FANOUT", True)
+    monkeypatch.setattr(analyzer, "FANOUT_TIMEOUT_SECONDS", 0.6)
+    monkeypatch.setattr(analyzer, "branch_agents", dict(agents))
+    payload = session_payload(2, session_id="fan")
+    return agents, payload["conversation_data"], payload["hume_data"]
+
+
+def test_branches_run_concurrently_and_merge_partial_results(monkeypatch):
+    delays = {"social": 0.3, "behavior": 0.3, "face": 0.3, "speech": 5.0}
+    agents, conversation_data, hume_data = use_fanout(monkeypatch, delays)
+    run_info = {}
+
+    started = time.perf_counter()
+    result = asyncio.run(analyzer.analyze(conversation_data, hume_data, None, run_info))
+    assert time.perf_counter() - started < 1.2
+
+    assert not analyzer.is_fallback(result)
+    assert result.analysis_version == fanout.ANALYSIS_VERSION
+    assert result.eye_contact_score == 0.8
+    assert result.social_communication_score == 0.8
+    # the timed-out branch keeps the local pre-scores
+    local = score_session(conversation_data, Timeline.from_hume_data(hume_data))
+    assert result.prosody_score == local.scores["prosody_score"]
+    assert "speech and prosody sub-analysis timed out" in result.assessment_limitations
+    assert "Facial expression: face concern" in result.primary_concerns
+    assert run_info["model"] == "gemini-2.5-flash"
+    assert run_info["prompt_version"].endswith("-fanout")
+
+    face_prompt = agents["face"].prompts[0]
+    assert "FACE" in face_prompt and "PROSODY" not in face_prompt
+    assert "CONVERSATION TRANSCRIPT" not in face_prompt
+    assert "CONVERSATION TRANSCRIPT" in agents["social"].prompts[0]
+    assert "MULTI-MODAL" not in agents["social"].prompts[0]
+
+
+def test_stream_yields_each_branch_and_all_failed_falls_back(monkeypatch):
+    delays = {"social": 0.2, "behavior": 0.05, "face": 0.1, "speech": 0.15}
+    _, conversation_data, hume_data = use_fanout(monkeypatch, delays)
+
+    async def collect():
+        return [
+            event
+            async for event in analyzer.analyze_stream(conversation_data, hume_data)
+        ]
+
+    events = asyncio.run(collect())
+    partials = [fields for kind, fields in events if kind == "partial"]
+    assert [sorted(p) for p in partials] == [
+        sorted(b.fields) for b in fanout.BRANCHES[1:] + fanout.BRANCHES[:1]
+    ]
+    assert events[-1][0] == "result" and not analyzer.is_fallback(events[-1][1])
+
+    monkeypatch.setattr(analyzer, "FANOUT_TIMEOUT_SECONDS", 0.01)
+    result = asyncio.run(analyzer.analyze(conversation_data, hume_data))
+    assert analyzer.is_fallback(result)
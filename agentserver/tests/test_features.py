@@ -0,0 +1,117 @@
+import sys
+import pathlib
+import types
+import asyncio
+
+import numpy as np
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+from agents import analyzer
+from agents.features import (
+    EMOTION_INDEX,
+    Timeline,
+    estimate_tokens,
+    render_summary,
+    window_stats,
+)
+
+
+def make_hume_data(seconds=600, face_hz=5):
+    face = [
+        {
+            "timestamp": i * 1000 / face_hz,
+            "emotions": [
+                {"name": "Calmness", "score": 0.5 + 0.3 * np.sin(i / 50)},
+                {"name": "Interest", "score": i / (seconds * face_hz)},
+            ],
+            "confidence": 0.9,
+        }
+        for i in range(seconds * face_hz)
+    ]
+    prosody = [
+        {
+            "emotions": [{"name": "Boredom", "score": 0.2}],
+            "time": {"begin": t, "end": t + 3},
+        }
+        for t in range(0, seconds, 3)
+    ]
+    return {
+        "session_id": "s1",
+        "emotion_timeline": {
+            "face_emotions": face,
+            "prosody_emotions": prosody,
+            "burst_analysis": [],
+        },
+    }
+
+
+def test_timeline_arrays_from_wire_shape():
+    timeline = Timeline.from_hume_data(make_hume_data(seconds=10))
+    face = timeline["face_emotions"]
+    assert face.scores.shape == (50, len(EMOTION_INDEX))
+    assert face.scores.dtype == np.float32
+    assert face.timestamps[-1] == 9.8
+    assert face.scores[0, EMOTION_INDEX["Calmness"]] == np.float32(0.5)
+    assert len(timeline["burst_analysis"]) == 0
+
+
+def test_window_stats_mean_slope_entropy():
+    arrays = Timeline.from_hume_data(make_hume_data(seconds=120))["face_emotions"]
+    stats = window_stats(arrays, 60.0)
+    interest = EMOTION_INDEX["Interest"]
+
+    assert list(stats["count"]) == [300, 300]
+    expected_mean = arrays.scores[:300, interest].astype(np.float64).mean()
+    assert np.isclose(stats["mean"][0, interest], expected_mean)
+    # Interest rises linearly by 1.0 over 120 s -> 0.5 per minute.
+    assert np.allclose(stats["slope"][:, interest], 0.5, atol=1e-3)
+    assert np.all((stats["entropy"] >= 0) & (stats["entropy"] <= 1))
+    assert stats["entropy"][0, EMOTION_INDEX["Anger"]] == 0
+
+
+def test_render_summary_respects_token_budget():
+    timeline = Timeline.from_hume_data(make_hume_data(seconds=1200))
+    summary = render_summary(timeline, window_seconds=30, token_budget=300)
+    assert estimate_tokens(summary) <= 300
+    assert "FACE" in summary and "PROSODY" in summary
+    with pytest.raises(ValueError):
+        render_summary(timeline, window_seconds=0, token_budget=300)
+
+
+def test_analyze_prompt_uses_summary_or_raw(monkeypatch):
+    prompts = []
+    sample = analyzer._create_mock_response()
+
+    class RecordingAgent:
+        async def run(self, prompt):
+            prompts.append(prompt)
+            return types.SimpleNamespace(data=sample)
+
+    monkeypatch.setattr(analyzer, "autism_agent", RecordingAgent())
+    monkeypatch.setattr(analyzer, "prefix_cache", None)
+    hume_data = make_hume_data(seconds=300)
+
+    asyncio.run(analyzer.analyze({}, hume_data))
+    monkeypatch.setattr(analyzer, "PROMPT_MODE", "raw")
+    asyncio.run(analyzer.analyze({}, hume_data))
+
+    summary_prompt, raw_prompt = prompts
+    assert "Emotion timeline summary" in summary_prompt
+    assert "'emotions'" not in summary_prompt
+    assert len(summary_prompt) * 10 < len(raw_prompt)
@@ -0,0 +1,128 @@
+import sys
+import pathlib
+import types
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+import main
+from agents.features import EMOTION_INDEX, TimelineBuilder
+from models.hume_input import FRAME_ADAPTERS, AnalyzePayload
+from services.ingest import PayloadValidationError, StreamingAnalyzeParser
+from services.sessions import SessionStore
+
+
+def test_frame_adapters_accept_both_emotion_shapes():
+    frames = FRAME_ADAPTERS["face_emotions"].validate_python(
+        [
+            {"timestamp": 1500, "emotions": [{"name": "Joy", "score": 0.5}]},
+            {"timestamp": 2000, "emotions": [{"Joy": 0.25, "Calmness": 0.75}]},
+        ]
+    )
+    builder = TimelineBuilder()
+    builder.extend_frames("face_emotions", frames)
+    arrays = builder.timeline()["face_emotions"]
+    assert list(arrays.timestamps) == [1.5, 2.0]
+    assert arrays.scores.dtype == np.float32
+    assert arrays.scores[1, EMOTION_INDEX["Calmness"]] == 0.75
+
+
+def test_payload_model_describes_client_wire_shape():
+    payload = AnalyzePayload.model_validate(
+        {
+            "conversation_data": {
+                "session_id": "s",
+                "transcript_messages": [
+                    {
+                        "id": "1",
+                        "role": "user",
+                        "speech": "hi",
+                        "timestamp": "2025-09-06T10:00:00Z",
+                    }
+                ],
+            },
+            "hume_data": {
+                "emotion_timeline": {
+                    "prosody_emotions": [
+                        {
+                            "emotions": [{"name": "Joy", "score": 0.1}],
+                            "time": {"begin": 1, "end": 2},
+                        }
+                    ]
+                }
+            },
+        }
+    )
+    assert payload.hume_data.emotion_timeline.prosody_emotions[0].start_seconds == 1
+
+
+def test_invalid_frame_reports_absolute_location():
+    frames = [
+        {"timestamp": i, "emotions": [{"name": "Joy", "score": 0.5}]} for i in range(40)
+    ]
+    frames[37]["emotions"][0]["score"] = 7
+    body = json.dumps({"hume_data": {"emotion_timeline": {"face_emotions": frames}}})
+    parser = StreamingAnalyzeParser(batch_size=16)
+    with pytest.raises(PayloadValidationError) as excinfo:
+        parser.feed(body.encode())
+        parser.close()
+    loc = excinfo.value.errors[0]["loc"]
+    assert loc == (
+        "body",
+        "hume_data",
+        "emotion_timeline",
+        "face_emotions",
+        37,
+        "emotions",
+        0,
+        "score",
+    )
+
+
+def test_malformed_payloads_get_422(monkeypatch):
+    monkeypatch.setattr(main, "session_store", SessionStore())
+    client = TestClient(main.app)
+
+    response = client.post(
+        "/analyze",
+        json={
+            "hume_data": {"emotion_timeline": {"face_emotions": [{"emotions": "x"}]}}
+        },
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:5] == [
+        "body",
+        "hume_data",
+        "emotion_timeline",
+        "face_emotions",
+        0,
+    ]
+
+    response = client.post(
+        "/analyze",
+        json={"conversation_data": {"transcript_messages": [{"role": "user"}]}},
+    )
+    assert response.status_code == 422
+
+    response = client.post(
+        "/sessions/s1/events", json={"burst_analysis": [{"emotions": [], "time": {}}]}
+    )
+    assert response.status_code == 422
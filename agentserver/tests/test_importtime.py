@@ -0,0 +1,53 @@
+import os
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_startup import import_profile, measure_startup
+
+# Provider SDKs and the HTTP client stack load when first needed, not at import
+DEFERRED_MODULES = (
+    "pydantic_ai",
+    "google.generativeai",
+    "google.genai",
+    "openai",
+    "httpx",
+    "uvicorn",
+)
+# generous for slow CI machines; a regression to eager SDK imports costs seconds
+IMPORT_BUDGET_MS = float(os.getenv("AGENTSERVER_IMPORT_BUDGET_MS", "2500"))
+
+
+def test_import_main_defers_heavy_modules_and_stays_in_budget():
+    profile = import_profile("main")
+    assert "main" in profile
+    eager = [
+        name
+        for name in profile
+        for deferred in DEFERRED_MODULES
+        if name == deferred or name.startswith(deferred + ".")
+    ]
+    assert not eager, f"imported at startup: {sorted(eager)}"
+    assert profile["main"] <= IMPORT_BUDGET_MS
+
+
+def test_context_cache_config_does_not_import_provider_sdks(monkeypatch, tmp_path):
+    # with a key set, "auto" context caching must still wait for the first agent;
+    # a stand-in SDK makes an eager import visible without the real package
+    sdk = tmp_path / "google" / "generativeai"
+    sdk.mkdir(parents=True)
+    (tmp_path / "google" / "__init__.py").write_text("")
+    (sdk / "__init__.py").write_text("def configure(**kwargs):\n    pass\n")
+    (sdk / "caching.py").write_text("")
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+    monkeypatch.setenv("ANALYZER_CONTEXT_CACHE", "auto")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    profile = import_profile("main")
+    assert "main" in profile
+    assert not [name for name in profile if name.startswith("google")]
+
+
+def test_server_answers_health_before_ready():
+    timings = measure_startup()
+    assert timings["health_seconds"] <= timings["ready_seconds"]
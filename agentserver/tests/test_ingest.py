@@ -0,0 +1,142 @@
+import sys
+import pathlib
+import types
+import json
+import random
+import tracemalloc
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+import main
+from agents import analyzer
+from agents.features import EMOTIONS, MODALITIES, Timeline
+from services.cache import AnalysisCache
+from services.ingest import StreamingAnalyzeParser
+
+
+def make_payload(frames=200, seed=0):
+    rng = random.Random(seed)
+
+    def emotions():
+        return [{"name": name, "score": rng.random()} for name in EMOTIONS[:12]]
+
+    return {
+        "conversation_data": {
+            "session_id": "stream",
+            "duration": 12.5,
+            "transcript_messages": [{"role": "user", "speech": 'héllo "there"'}],
+        },
+        "hume_data": {
+            "session_id": "stream",
+            "emotion_timeline": {
+                "face_emotions": [
+                    {"timestamp": i * 100, "emotions": emotions(), "confidence": 0.9}
+                    for i in range(frames)
+                ],
+                "prosody_emotions": [
+                    {
+                        "emotions": emotions(),
+                        "time": {"begin": i * 1.5, "end": i * 1.5 + 1},
+                    }
+                    for i in range(frames // 10)
+                ],
+                "burst_analysis": [],
+            },
+        },
+    }
+
+
+def parse_in_chunks(body, chunk_size):
+    parser = StreamingAnalyzeParser(batch_size=16)
+    for start in range(0, len(body), chunk_size):
+        parser.feed(body[start : start + chunk_size])
+    return parser.close()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000, 1 << 20])
+def test_streaming_parse_matches_full_parse(chunk_size):
+    payload = make_payload()
+    body = json.dumps(payload, indent=chunk_size % 2 or None).encode("utf-8")
+    parsed = parse_in_chunks(body, chunk_size)
+
+    expected = Timeline.from_hume_data(payload["hume_data"])
+    for name in MODALITIES:
+        assert np.array_equal(
+            parsed.timeline[name].timestamps, expected[name].timestamps
+        )
+        assert np.array_equal(parsed.timeline[name].scores, expected[name].scores)
+    assert parsed.conversation_data == payload["conversation_data"]
+    assert parsed.hume_data == {"session_id": "stream"}
+    assert parsed.has_hume_data
+    assert parsed.byte_count == len(body)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"",
+        b"[1, 2]",
+        b'{"hume_data": {"emotion_timeline": {"face_emotions": [1]}}}',
+        b'{"a": 1',
+        b'{"a": 1} x',
+    ],
+)
+def test_streaming_parse_rejects_malformed_bodies(body):
+    with pytest.raises(ValueError):
+        parse_in_chunks(body, 3)
+
+
+def test_streaming_parse_peak_memory_is_a_fraction_of_full_parse():
+    body = json.dumps(make_payload(frames=3000)).encode("utf-8")
+
+    tracemalloc.start()
+    Timeline.from_hume_data(json.loads(body)["hume_data"])
+    full_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    parse_in_chunks(body, 1 << 16)
+    streaming_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert streaming_peak * 5 < full_peak
+
+
+def test_analyze_endpoint_streams_body(monkeypatch):
+    captured = {}
+
+    async def fake_analyze(conversation_data, hume_data, timeline=None, run_info=None):
+        captured.update(conversation_data=conversation_data, timeline=timeline)
+        return analyzer._create_mock_response()
+
+    monkeypatch.setattr(main, "analyze", fake_analyze)
+    monkeypatch.setattr(main, "result_cache", AnalysisCache())
+    client = TestClient(main.app)
+
+    payload = make_payload(frames=50)
+    assert client.post("/analyze", json=payload).status_code == 200
+    assert len(captured["timeline"]["face_emotions"]) == 50
+    assert captured["conversation_data"]["session_id"] == "stream"
+
+    response = client.post(
+        "/analyze",
+        content=b'{"conversation_data": {',
+        headers={"content-type": "application/json"},
+    )
+    assert response.status_code == 422
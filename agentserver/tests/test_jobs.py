@@ -0,0 +1,117 @@
+import sys
+import pathlib
+import types
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+import main
+from agents import analyzer
+from services.cache import AnalysisCache
+from services.jobs import JobManager, QueueFullError
+
+
+def test_job_manager_backpressure_and_failures():
+    async def scenario():
+        manager = JobManager(concurrency=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+            return analyzer._create_mock_response()
+
+        async def failing():
+            raise RuntimeError("upstream down")
+
+        running = manager.submit(blocked)
+        await asyncio.sleep(0)  # worker picks up the first job
+        queued = manager.submit(failing)
+        with pytest.raises(QueueFullError):
+            manager.submit(blocked)
+
+        release.set()
+        states = [status.state async for status in manager.events(queued)]
+        await manager.shutdown()
+        return running, queued, states
+
+    running, queued, states = asyncio.run(scenario())
+    assert running.state == "succeeded" and running.result is not None
+    assert states == ["queued", "running", "failed"]
+    assert queued.error == "upstream down"
+    assert running._run is None and queued._run is None
+
+
+def test_shutdown_fails_running_jobs():
+    async def scenario():
+        manager = JobManager(concurrency=1)
+
+        async def hanging():
+            await asyncio.Event().wait()
+
+        job = manager.submit(hanging)
+        await asyncio.sleep(0)
+        await manager.shutdown()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.state == "failed" and job.error == "cancelled"
+    assert job.finished_at is not None and job._run is None
+
+
+def test_job_endpoints_poll_and_stream(monkeypatch):
+    sample = analyzer._create_mock_response()
+
+    async def fake_analyze(conversation_data, hume_data, timeline=None, run_info=None):
+        await asyncio.sleep(0.01)
+        return sample
+
+    monkeypatch.setattr(main, "analyze", fake_analyze)
+    monkeypatch.setattr(main, "result_cache", AnalysisCache())
+    monkeypatch.setattr(main, "job_manager", JobManager(concurrency=1, max_queue=4))
+
+    payload = {"conversation_data": {"session_id": "job"}, "hume_data": {}}
+    with TestClient(main.app) as client:
+        submitted = client.post("/analyze/jobs", json=payload)
+        assert submitted.status_code == 202
+        job_id = submitted.json()["job_id"]
+
+        with client.stream("GET", f"/analyze/jobs/{job_id}/events") as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events = [
+                json.loads(line[len("data: ") :])
+                for line in response.iter_lines()
+                if line.startswith("data: ")
+            ]
+        assert events[-1]["state"] == "succeeded"
+        assert events[-1]["result"]["session_id"] == sample.session_id
+
+        for _ in range(100):
+            status = client.get(f"/analyze/jobs/{job_id}").json()
+            if status["state"] == "succeeded":
+                break
+            time.sleep(0.01)
+        assert (
+            status["result"]["overall_autism_likelihood"]
+            == sample.overall_autism_likelihood
+        )
+
+        assert client.get("/analyze/jobs/missing").status_code == 404
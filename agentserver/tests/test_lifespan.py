@@ -0,0 +1,102 @@
+import sys
+import pathlib
+import threading
+import time
+import types
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+dotenv_stub = types.ModuleType("dotenv")
+dotenv_stub.load_dotenv = lambda: None
+sys.modules.setdefault("dotenv", dotenv_stub)
+
+import main
+from agents import analyzer
+from services import http
+
+
+def counting_factory(built, delay=0.0):
+    def create_agent():
+        time.sleep(delay)
+        built.append(1)
+        return DummyAgent()
+
+    return create_agent
+
+
+def wait_until_ready(client, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get("/ready")
+        if response.status_code == 200 or time.monotonic() > deadline:
+            return response
+        time.sleep(0.01)
+
+
+def test_concurrent_first_requests_build_one_agent(monkeypatch):
+    built = []
+    monkeypatch.setattr(analyzer, "autism_agent", None)
+    monkeypatch.setattr(analyzer, "_create_agent", counting_factory(built, 0.05))
+
+    threads = [
+        threading.Thread(target=analyzer._get_agent, args=("s",)) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+
+
+def test_lifespan_serves_health_at_once_and_reports_ready_when_warm(monkeypatch):
+    built = []
+    monkeypatch.setattr(analyzer, "autism_agent", None)
+    monkeypatch.setattr(analyzer, "_create_agent", counting_factory(built))
+
+    assert TestClient(main.app).get("/ready").status_code == 503
+    with TestClient(main.app) as client:
+        assert client.get("/health").json() == {"status": "healthy"}
+        response = wait_until_ready(client)
+        assert response.status_code == 200
+        assert response.json() == {"status": "ready", "agent": True}
+        assert len(built) == 1
+        assert http.get_client() is not None
+
+    assert http.get_client() is None
+    assert analyzer.autism_agent is None
+    assert TestClient(main.app).get("/ready").status_code == 503
+
+
+def test_gemini_models_share_the_pooled_client(monkeypatch):
+    class GeminiModel:
+        def __init__(self, name, http_client=None):
+            self.name = name
+            self.http_client = http_client
+
+    gemini = types.ModuleType("pydantic_ai.models.gemini")
+    gemini.GeminiModel = GeminiModel
+    monkeypatch.setitem(sys.modules, "pydantic_ai.models", types.ModuleType("m"))
+    monkeypatch.setitem(sys.modules, "pydantic_ai.models.gemini", gemini)
+    # pydantic-ai 0.0.14 has no providers package
+    monkeypatch.setitem(sys.modules, "pydantic_ai.providers", None)
+    client = object()
+    monkeypatch.setattr(analyzer, "get_client", lambda: client)
+
+    model = analyzer._model("google-gla:gemini-2.5-pro")
+    assert model.name == "gemini-2.5-pro" and model.http_client is client
+    assert analyzer._model("openai:gpt-4o") == "openai:gpt-4o"
@@ -0,0 +1,115 @@
+import sys
+import pathlib
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+dotenv_stub = types.ModuleType("dotenv")
+dotenv_stub.load_dotenv = lambda: None
+sys.modules.setdefault("dotenv", dotenv_stub)
+
+import main
+from agents import analyzer
+from agents.prompt import PREVIOUS_ASSESSMENT_KEY, compile_prompt
+from agents.transcript import MEASURED_FIELDS
+from services.cache import AnalysisCache, MemoryBackend
+from services.live import LiveAnalyzer
+from services.sessions import SessionStore
+
+
+def face_frames(start, count):
+    return [
+        {"timestamp": (start + i) * 200, "emotions": [{"name": "Joy", "score": 0.5}]}
+        for i in range(count)
+    ]
+
+
+def test_live_session_analyzes_deltas_and_finishes_from_cache(monkeypatch):
+    calls, scored = [], []
+
+    async def fake_analyze(
+        conversation_data, hume_data, timeline=None, run_info=None, scoring_data=None
+    ):
+        calls.append((conversation_data, len(timeline["face_emotions"])))
+        scored.append(len(scoring_data[1]["face_emotions"]))
+        run_info.update(model="gemini-2.5-flash", prompt_version="v1")
+        return analyzer._create_mock_response().model_copy(
+            update={
+                "session_id": conversation_data["session_id"],
+                "social_communication_score": len(calls) / 10,
+            }
+        )
+
+    monkeypatch.setattr(main, "analyze", fake_analyze)
+    monkeypatch.setattr(main, "result_cache", AnalysisCache(MemoryBackend()))
+    monkeypatch.setattr(main, "session_store", SessionStore())
+    monkeypatch.setattr(
+        main, "live_analyzer", LiveAnalyzer(interval_seconds=60, min_events=5)
+    )
+    client = TestClient(main.app)
+
+    with client.websocket_connect("/sessions/live1/live") as ws:
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/sessions/live1/live") as second:
+                second.receive_json()
+
+        ws.send_json({"type": "events", "face_emotions": face_frames(0, 5)})
+        first = ws.receive_json()
+        assert first["type"] == "provisional" and first["snapshot"] == 1
+
+        message = {"id": "m1", "role": "user", "speech": "hello there"}
+        ws.send_json({"face_emotions": face_frames(5, 3)})
+        ws.send_json({"face_emotions": [{"bad": 1}]})
+        assert ws.receive_json()["type"] == "error"
+        response = client.post(
+            "/sessions/live1/events", json={"transcript_messages": [message]}
+        )
+        assert response.status_code == 200
+        ws.send_json({"face_emotions": face_frames(8, 1)})
+        second = ws.receive_json()
+        assert second["snapshot"] == 2
+        assert second["assessment"]["social_communication_score"] == 0.2
+
+        ws.send_json({"type": "end"})
+        final = ws.receive_json()
+        assert final["type"] == "final"
+        # nothing left to analyze; measured fields come from the whole session
+        measured = {name: final["assessment"].pop(name) for name in MEASURED_FIELDS}
+        assert final["assessment"] == {
+            k: v for k, v in second["assessment"].items() if k not in MEASURED_FIELDS
+        }
+        assert measured["user_words_per_turn"] == 2.0
+
+    assert [frames for _, frames in calls] == [5, 4]
+    # only the prompt is a delta; local scores cover the session so far
+    assert scored == [5, 9]
+    delta = calls[1][0]
+    assert delta["transcript_messages"] == [message]
+    assert delta[PREVIOUS_ASSESSMENT_KEY]["social_communication_score"] == 0.1
+    prompt = compile_prompt("live1", delta, "", 1000).suffix
+    assert "PREVIOUS PROVISIONAL ASSESSMENT" in prompt
+    assert '"social_communication_score": 0.1' in prompt
+    assert PREVIOUS_ASSESSMENT_KEY not in prompt.split("CONVERSATION METADATA:")[1]
+
+    result = client.post("/analyze", json={"session_id": "live1"}).json()
+    assert result["social_communication_score"] == 0.2
+    assert len(calls) == 2
+    assert len(main.live_analyzer) == 0
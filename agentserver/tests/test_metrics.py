@@ -0,0 +1,104 @@
+import sys
+import pathlib
+import types
+import logging
+
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+import main
+from agents import analyzer
+from services import metrics
+from services.cache import AnalysisCache, MemoryBackend
+from services.logs import KeyValueFormatter
+
+
+def test_registry_renders_prometheus_text():
+    registry = metrics.Registry()
+    counter = registry.counter("jobs_total", "Jobs.", ("state",))
+    histogram = registry.histogram("work_seconds", "Work.", buckets=(0.1, 1.0))
+    counter.inc(state='a"b')
+    counter.inc(2, state='a"b')
+    histogram.observe(0.1)
+    histogram.observe(5)
+
+    text = registry.render()
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{state="a\\"b"} 3' in text
+    assert 'work_seconds_bucket{le="0.1"} 1' in text
+    assert 'work_seconds_bucket{le="1"} 1' in text
+    assert 'work_seconds_bucket{le="+Inf"} 2' in text
+    assert "work_seconds_sum 5.1" in text
+    assert "work_seconds_count 2" in text
+
+
+def test_metrics_endpoint_counts_stages_fallbacks_and_retries(monkeypatch):
+    sample = analyzer._create_mock_response().model_copy(update={"session_id": "ok"})
+
+    class RetryingAgent:
+        async def run(self, prompt):
+            usage = types.SimpleNamespace(requests=3)
+            return types.SimpleNamespace(data=sample, usage=lambda: usage)
+
+    class FailingAgent:
+        async def run(self, prompt):
+            raise RuntimeError("model down")
+
+    monkeypatch.setattr(main, "result_cache", AnalysisCache(MemoryBackend()))
+    monkeypatch.setattr(analyzer, "prefix_cache", None)
+    client = TestClient(main.app)
+    fallbacks = metrics.ANALYSES.value(outcome="fallback")
+    successes = metrics.ANALYSES.value(outcome="success")
+    retries = metrics.LLM_RETRIES.value()
+    runs = metrics.STAGE_SECONDS.count(stage="agent_run")
+
+    monkeypatch.setattr(analyzer, "autism_agent", RetryingAgent())
+    payload = {"conversation_data": {"session_id": "m1"}, "hume_data": {}}
+    assert client.post("/analyze", json=payload).status_code == 200
+    assert client.post("/analyze", json=payload).status_code == 200  # cache hit
+    monkeypatch.setattr(analyzer, "autism_agent", FailingAgent())
+    payload["conversation_data"]["session_id"] = "m2"
+    assert client.post("/analyze", json=payload).status_code == 200
+
+    assert metrics.ANALYSES.value(outcome="success") == successes + 1
+    assert metrics.ANALYSES.value(outcome="fallback") == fallbacks + 1
+    assert metrics.LLM_RETRIES.value() == retries + 2
+    assert metrics.STAGE_SECONDS.count(stage="agent_run") == runs + 2
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert "agentserver_cache_hits_total 1" in text
+    assert 'agentserver_stage_seconds_count{stage="body_parse"}' in text
+    assert 'agentserver_stage_seconds_count{stage="fallback"}' in text
+    assert "agentserver_prompt_bytes_count" in text
+    assert (
+        'agentserver_http_requests_total{method="POST",route="/analyze",status="200"}'
+        in text
+    )
+
+
+def test_span_logs_session_id(caplog):
+    with caplog.at_level(logging.DEBUG, logger="services.metrics"):
+        with metrics.span("unit", "s1") as fields:
+            fields["frames"] = 3
+    (record,) = [r for r in caplog.records if getattr(r, "stage", None) == "unit"]
+    line = KeyValueFormatter("%(message)s").format(record)
+    assert line.startswith("span unit ")
+    assert "session_id=s1" in line and "frames=3" in line and "failed=False" in line
@@ -0,0 +1,90 @@
+import sys
+import pathlib
+import types
+from datetime import datetime
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+from agents.features import estimate_tokens
+from agents.prompt import INSTRUCTIONS, compile_prompt, compress_transcript
+
+
+def make_messages(turns=60):
+    messages = []
+    for i in range(turns):
+        if i % 2:
+            speech = f"I went to the park on day {i} and saw a red kite."
+        else:
+            speech = (
+                f"That is wonderful to hear. Question {i}: can you tell me more about "
+                "what you enjoyed most and how it made you feel during the visit?"
+            )
+        messages.append(
+            {"id": str(i), "role": "user" if i % 2 else "replica", "speech": speech}
+        )
+    return messages
+
+
+def test_transcript_appears_once_and_prefix_is_static():
+    conversation_data = {
+        "session_id": "s1",
+        "duration": 30,
+        "transcript_messages": make_messages(4),
+    }
+    first = compile_prompt("s1", conversation_data, "DATA", 10_000)
+    second = compile_prompt(
+        "s2", {"transcript_messages": []}, "OTHER", 10_000, now=datetime(2025, 1, 1)
+    )
+
+    assert first.prefix == second.prefix == INSTRUCTIONS
+    assert first.text.startswith(INSTRUCTIONS)
+    assert first.text.count("saw a red kite") == 2  # two user turns, once each
+    assert "transcript_messages" not in first.suffix
+    assert '"duration": 30' in first.suffix
+    assert "No transcript data available" in second.suffix
+    assert first.compressed_turns == 0
+
+
+def test_budget_compresses_old_agent_turns_only():
+    messages = make_messages()
+    full, _ = compress_transcript(messages, token_budget=100_000)
+    lines, compressed = compress_transcript(messages, token_budget=600)
+
+    assert estimate_tokens("\n".join(lines)) < estimate_tokens("\n".join(full))
+    assert compressed > 0
+    user_lines = [f"[user]: {m['speech']}" for m in messages if m["role"] == "user"]
+    assert [line for line in lines if line.startswith("[user]")] == user_lines
+    assert lines[-8:] == full[-8:]
+    assert any("summarized]" in line for line in lines) or any(
+        line.startswith("[agent turns omitted") for line in lines
+    )
+
+
+def test_filler_is_collapsed():
+    messages = [
+        {"role": "user", "speech": "um um um I like   trains"},
+        {"role": "user", "speech": "Mm-hmm"},
+        {"role": "user", "speech": "mm-hmm"},
+        {"role": "user", "speech": ""},
+        {"role": "replica", "speech": "Okay."},
+    ]
+    lines, _ = compress_transcript(messages, token_budget=1000)
+    assert lines == [
+        "[user]: um I like trains",
+        "[user]: Mm-hmm (x2)",
+        "[replica]: Okay.",
+    ]
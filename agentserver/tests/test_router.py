@@ -0,0 +1,162 @@
+import sys
+import pathlib
+import types
+import asyncio
+import time
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+from agents import analyzer
+from agents.router import ModelRouter, ModelStats, RouterExhaustedError
+from services import metrics
+
+SAMPLE = analyzer._create_mock_response().model_copy(update={"session_id": "ok"})
+
+
+class StandInAgent:
+    def __init__(self, latency=0.0, fail=False):
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def run(self, prompt):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError("upstream 503")
+        return types.SimpleNamespace(data=SAMPLE.model_dump())
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ewma_p95_tracks_latency_distribution():
+    stats = ModelStats(alpha=0.1)
+    for i in range(500):
+        stats.record_success(1.0 + 0.5 * (i % 2))
+    assert stats.mean == pytest.approx(1.25, abs=0.05)
+    assert stats.p95() == pytest.approx(1.25 + 1.645 * 0.25, abs=0.05)
+    stats.record_failure()
+    assert stats.error_rate == pytest.approx(0.1)
+
+
+def test_slow_primary_is_hedged_and_first_valid_result_wins():
+    slow, fast = StandInAgent(latency=2.0), StandInAgent(latency=0.01)
+    router = ModelRouter.from_agents(
+        [slow, fast], names=["pro", "flash"], default_hedge_after=0.05
+    )
+    hedges = metrics.HEDGES.value()
+
+    started = time.perf_counter()
+    result = asyncio.run(router.run("prompt"))
+    assert time.perf_counter() - started < 0.5
+    assert result.model_name == "flash"
+    assert result.data == SAMPLE
+    assert slow.cancelled == 1
+    assert metrics.HEDGES.value() == hedges + 1
+
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = StandInAgent(latency=0.01), StandInAgent()
+    router = ModelRouter.from_agents([primary, secondary], default_hedge_after=1.0)
+    for _ in range(3):
+        assert asyncio.run(router.run("prompt")).model_name == "model-0"
+    assert secondary.calls == 0
+
+
+def test_circuit_breaker_skips_failing_model_until_cooldown():
+    clock = Clock()
+    broken, healthy = StandInAgent(fail=True), StandInAgent()
+    router = ModelRouter.from_agents(
+        [broken, healthy], failure_threshold=2, cooldown_seconds=30, clock=clock
+    )
+
+    for _ in range(4):
+        assert asyncio.run(router.run("prompt")).model_name == "model-1"
+    assert broken.calls == 2
+    assert router.routes[0].breaker.state == "open"
+
+    clock.now += 31
+    broken.fail = False
+    assert asyncio.run(router.run("prompt")).model_name == "model-0"
+    assert router.routes[0].breaker.state == "closed"
+
+
+def test_router_raises_when_every_model_fails(monkeypatch):
+    router = ModelRouter.from_agents([StandInAgent(fail=True), StandInAgent(fail=True)])
+    with pytest.raises(RouterExhaustedError):
+        asyncio.run(router.run("prompt"))
+
+    monkeypatch.setattr(analyzer, "autism_agent", router)
+    monkeypatch.setattr(analyzer, "prefix_cache", None)
+    result = asyncio.run(analyzer.analyze({"session_id": "s"}, {}))
+    assert analyzer.is_fallback(result)
+
+
+def test_half_open_breaker_admits_a_single_trial_call():
+    clock = Clock()
+    broken, healthy = StandInAgent(latency=0.05, fail=True), StandInAgent()
+    router = ModelRouter.from_agents(
+        [broken, healthy],
+        failure_threshold=1,
+        cooldown_seconds=30,
+        default_hedge_after=10,
+        clock=clock,
+    )
+    asyncio.run(router.run("prompt"))
+    assert router.routes[0].breaker.state == "open"
+
+    clock.now += 31
+
+    async def burst():
+        return await asyncio.gather(*(router.run("prompt") for _ in range(5)))
+
+    results = asyncio.run(burst())
+    assert broken.calls == 2  # the initial failure plus exactly one trial
+    assert {result.model_name for result in results} == {"model-1"}
+    assert router.routes[0].breaker.state == "open"
+
+
+def test_losing_attempt_is_cancelled_and_counted_before_run_returns():
+    slow, fast = StandInAgent(latency=2.0), StandInAgent(latency=0.01)
+    router = ModelRouter.from_agents(
+        [slow, fast], names=["slow-model", "fast-model"], default_hedge_after=0.05
+    )
+    cancelled = metrics.MODEL_REQUESTS.value(model="slow-model", outcome="cancelled")
+
+    async def run_once():
+        result = await router.run("prompt")
+        # no extra loop iterations: the loser must already be accounted for
+        return result, metrics.MODEL_REQUESTS.value(
+            model="slow-model", outcome="cancelled"
+        )
+
+    result, counted = asyncio.run(run_once())
+    assert result.model_name == "fast-model"
+    assert counted == cancelled + 1
@@ -0,0 +1,118 @@
+import asyncio
+import sys
+import pathlib
+import time
+import types
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+from agents import analyzer
+from agents.features import EMOTION_INDEX, ModalityArrays, Timeline
+from agents.scoring import DOMAIN_FIELDS, score_session, transcript_features
+from benchmarks.synthetic import session_payload
+from services import metrics
+
+
+def test_scores_are_deterministic_and_fast_for_long_sessions():
+    payload = session_payload(60, session_id="long")
+    timeline = Timeline.from_hume_data(payload["hume_data"])
+    conversation = payload["conversation_data"]
+
+    first = score_session(conversation, timeline)
+    started = time.perf_counter()
+    second = score_session(conversation, timeline)
+    elapsed = time.perf_counter() - started
+
+    assert first.scores == second.scores
+    assert first.missing == ()
+    assert all(0.0 <= value <= 1.0 for value in first.scores.values())
+    assert elapsed < 0.25
+
+
+def test_flat_affect_scores_higher_than_varied_affect():
+    rng = np.random.default_rng(3)
+    times = np.arange(600, dtype=np.float64)
+    flat = np.zeros((600, len(EMOTION_INDEX)), dtype=np.float32)
+    flat[:, EMOTION_INDEX["Calmness"]] = 0.8
+    varied = rng.uniform(0.0, 1.0, flat.shape).astype(np.float32)
+
+    flat_scores = score_session(
+        {}, Timeline({"face_emotions": ModalityArrays(times, flat)})
+    )
+    varied_scores = score_session(
+        {}, Timeline({"face_emotions": ModalityArrays(times, varied)})
+    )
+
+    assert (
+        flat_scores.scores["facial_expression_score"]
+        > varied_scores.scores["facial_expression_score"]
+    )
+    assert "prosody_score" in flat_scores.missing
+
+
+def test_fallback_uses_local_scores_and_prompt_carries_anchors(monkeypatch):
+    monkeypatch.setattr(analyzer, "prefix_cache", None)
+    monkeypatch.setattr(analyzer, "Agent", None)
+    monkeypatch.setattr(analyzer, "autism_agent", None)
+    payload = session_payload(2, session_id="anchored")
+    timeline = Timeline.from_hume_data(payload["hume_data"])
+    local = score_session(payload["conversation_data"], timeline)
+
+    result = asyncio.run(
+        analyzer.analyze(payload["conversation_data"], payload["hume_data"])
+    )
+    assert analyzer.is_fallback(result)
+    for name in DOMAIN_FIELDS:
+        assert getattr(result, name) == local.scores[name]
+    assert result.assessment_confidence <= 0.5
+
+    builds = metrics.STAGE_SECONDS.count(stage="prompt_build")
+    compiled, _ = asyncio.run(
+        analyzer._compile(
+            "anchored", payload["conversation_data"], payload["hume_data"], timeline
+        )
+    )
+    assert "LOCAL PRE-SCORES:" in compiled.suffix
+    assert (
+        f"social_communication_score: {local.scores['social_communication_score']:.2f}"
+        in compiled.suffix
+    )
+    assert metrics.STAGE_SECONDS.count(stage="prompt_build") == builds + 1
+
+
+def test_numeric_transcript_timestamps_give_the_same_latencies_as_iso():
+    messages = session_payload(2)["conversation_data"]["transcript_messages"]
+    iso = transcript_features(messages)
+    epoch_ms = [
+        {
+            **m,
+            "timestamp": datetime.fromisoformat(m["timestamp"][:-1]).timestamp() * 1000,
+        }
+        for m in messages
+    ]
+    start = epoch_ms[0]["timestamp"]
+    relative_ms = [{**m, "timestamp": m["timestamp"] - start} for m in epoch_ms]
+
+    for variant in (epoch_ms, relative_ms):
+        features = transcript_features(variant)
+        assert features["response_latency_median"] == pytest.approx(
+            iso["response_latency_median"]
+        )
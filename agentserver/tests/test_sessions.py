@@ -0,0 +1,111 @@
+import sys
+import pathlib
+import types
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+import main
+from agents import analyzer
+from agents.features import EMOTION_INDEX, ModalityBuffer, modality_arrays
+from services.cache import AnalysisCache
+from services.sessions import SessionStore
+
+
+def face_frame(ms, calmness):
+    return {"timestamp": ms, "emotions": [{"name": "Calmness", "score": calmness}]}
+
+
+def test_modality_buffer_grows_and_matches_batch_conversion():
+    frames = [face_frame(i * 100, (i % 7) / 10) for i in range(1000)]
+    frames[500], frames[501] = frames[501], frames[500]  # out-of-order arrival
+    buffer = ModalityBuffer(capacity=4)
+    for start in range(0, len(frames), 37):
+        buffer.extend(frames[start : start + 37])
+
+    expected = modality_arrays(frames)
+    arrays = buffer.arrays()
+    assert np.array_equal(arrays.timestamps, expected.timestamps)
+    assert np.array_equal(arrays.scores, expected.scores)
+    calmness = EMOTION_INDEX["Calmness"]
+    assert np.isclose(buffer.mean()[calmness], expected.scores[:, calmness].mean())
+    assert np.isclose(buffer.max[calmness], 0.6)
+
+
+def test_session_store_expires_idle_sessions():
+    now = [0.0]
+    store = SessionStore(max_sessions=2, ttl_seconds=10, clock=lambda: now[0])
+    store.get_or_create("a")
+    now[0] = 5
+    store.get_or_create("b")
+    now[0] = 8
+    store.get_or_create("c")
+    assert store.get("a") is None  # evicted by max_sessions
+    now[0] = 16
+    assert store.get("b") is None and store.get("c") is not None
+
+
+def test_ingest_then_analyze_by_session_id(monkeypatch):
+    captured = {}
+    sample = analyzer._create_mock_response()
+
+    async def fake_analyze(conversation_data, hume_data, timeline=None, run_info=None):
+        captured.update(conversation_data=conversation_data, timeline=timeline)
+        return sample
+
+    monkeypatch.setattr(main, "analyze", fake_analyze)
+    monkeypatch.setattr(main, "result_cache", AnalysisCache())
+    monkeypatch.setattr(main, "session_store", SessionStore())
+    client = TestClient(main.app)
+
+    for batch in range(3):
+        response = client.post(
+            "/sessions/live1/events",
+            json={
+                "face_emotions": [face_frame(batch * 1000 + i, 0.5) for i in range(10)],
+                "prosody_emotions": [
+                    {
+                        "emotions": [{"name": "Joy", "score": 0.3}],
+                        "time": {"begin": batch, "end": batch + 1},
+                    }
+                ],
+                "transcript_messages": [
+                    {"id": "m1", "role": "replica", "speech": "Hello" + "!" * batch},
+                ],
+                "conversation_data": {"start_time": "2025-09-06T10:00:00Z"},
+            },
+        )
+        assert response.status_code == 200
+    assert response.json()["counts"]["face_emotions"] == 30
+
+    summary = client.get("/sessions/live1").json()
+    assert summary["modalities"]["face_emotions"]["top_emotions"]["Calmness"] == 0.5
+
+    result = client.post("/analyze", json={"session_id": "live1"})
+    assert result.status_code == 200
+    assert len(captured["timeline"]["face_emotions"]) == 30
+    assert len(captured["timeline"]["prosody_emotions"]) == 3
+    assert captured["conversation_data"]["transcript_messages"] == [
+        {"id": "m1", "role": "replica", "speech": "Hello!!"}
+    ]
+    assert captured["conversation_data"]["start_time"] == "2025-09-06T10:00:00Z"
+
+    assert client.post("/analyze", json={"session_id": "missing"}).status_code == 404
+    assert client.delete("/sessions/live1").status_code == 204
+    assert client.get("/sessions/live1").status_code == 404
@@ -0,0 +1,194 @@
+import json
+import os
+import sys
+import pathlib
+import types
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+dotenv_stub = types.ModuleType("dotenv")
+dotenv_stub.load_dotenv = lambda: None
+sys.modules.setdefault("dotenv", dotenv_stub)
+
+import main
+from agents import analyzer
+from agents.features import EMOTIONS
+from agents.prompt import SIMILAR_SESSIONS_KEY
+from services.cache import AnalysisCache, MemoryBackend
+from services.similarity import SimilarityIndex, session_features
+
+SCRIPT = (
+    "Hi! What is your name?",
+    "What do you like to do after school?",
+    "Can you tell me about your friends?",
+    "How do you feel when it is loud?",
+)
+WORDS = (
+    "trains cars park mum dad school loud quiet blue red friend game book "
+    "dog cat lego music swim draw run bus rain sun play read".split()
+)
+
+
+def screening(seed, session_id=None, edited=False, noise=0.0):
+    """A scripted screening: fixed agent lines, per-child answers and affect."""
+    rng = np.random.default_rng(seed)
+    messages = []
+    for i, line in enumerate(SCRIPT):
+        answer = " ".join(rng.choice(WORDS, size=8))
+        if edited and i == 0:
+            answer = f"well {answer}"
+        messages += [
+            {"role": "replica", "speech": line, "timestamp": 10.0 * i},
+            {"role": "user", "speech": answer, "timestamp": 10.0 * i + 4},
+        ]
+    profile = rng.uniform(0.0, 0.6, len(EMOTIONS))
+    frames = [
+        {
+            "timestamp": 200.0 * t,
+            "emotions": [
+                {"name": name, "score": float(np.clip(score + noise * t, 0, 1))}
+                for name, score in zip(EMOTIONS, profile)
+            ],
+        }
+        for t in range(20)
+    ]
+    conversation = {
+        "session_id": session_id or f"s{seed}",
+        "transcript_messages": messages,
+    }
+    return conversation, {"emotion_timeline": {"face_emotions": frames}}
+
+
+def filled_index(mode):
+    index = SimilarityIndex(mode=mode, reuse_threshold=0.95)
+    for seed in range(30):
+        conversation, hume = screening(seed)
+        index.add(
+            f"s{seed}",
+            session_features(conversation, hume),
+            analyzer._create_mock_response().model_copy(
+                update={"session_id": f"s{seed}"}
+            ),
+        )
+    return index
+
+
+def test_near_duplicates_match_and_unrelated_sessions_do_not(tmp_path):
+    index = filled_index("reuse")
+    near = session_features(*screening(7, "new", edited=True, noise=0.001))
+
+    matches = index.search(near)
+    assert matches[0].session_id == "s7"
+    assert matches[0].similarity >= index.reuse_threshold
+    assert index.reusable(matches) is matches[0]
+    assert index.search(session_features(*screening(100))) == []
+
+    index.save(str(tmp_path / "index.npz"))
+    loaded = SimilarityIndex(mode="anchors")
+    loaded.load(str(tmp_path / "index.npz"))
+    assert len(loaded) == 30
+    assert loaded.search(near)[0].session_id == "s7"
+    assert loaded.reusable(loaded.search(near)) is None
+
+
+def test_a_session_never_matches_itself_and_reindexing_replaces_it():
+    index = filled_index("reuse")
+    features = session_features(*screening(7))
+    assert index.search(features)[0].session_id == "s7"
+    assert all(m.session_id != "s7" for m in index.search(features, "s7"))
+
+    renamed = analyzer._create_mock_response().model_copy(update={"session_id": "s7"})
+    index.add("s7", features, renamed, fingerprint="abc")
+    assert len(index) == 30
+    assert index.search(features)[0].assessment is renamed
+    assert all(m.session_id != "s7" for m in index.search(features, "x", "abc"))
+
+
+def test_workers_saving_one_path_merge_their_sessions(tmp_path):
+    path = str(tmp_path / "index.npz")
+    first, second = filled_index("anchors"), SimilarityIndex()
+    first.save(path)
+    second.load(path)
+    extra = analyzer._create_mock_response()
+    first.add("only-first", session_features(*screening(200)), extra)
+    second.add("only-second", session_features(*screening(201)), extra)
+    second.add("s3", session_features(*screening(202)), extra, fingerprint="new")
+
+    first.save(path)
+    second.save(path)
+    merged = SimilarityIndex()
+    merged.load(path)
+    assert len(merged) == 32
+    assert {"only-first", "only-second"} <= set(merged._session_ids)
+    assert merged._fingerprints[merged._session_ids.index("s3")] == "new"
+    assert sorted(os.listdir(tmp_path)) == ["index.npz", "index.npz.lock"]
+
+
+def test_analyze_reuses_or_anchors_on_similar_sessions(monkeypatch):
+    seen = []
+
+    async def fake_analyze(conversation_data, hume_data, timeline=None, run_info=None):
+        seen.append(conversation_data)
+        return analyzer._create_mock_response().model_copy(
+            update={"session_id": conversation_data["session_id"]}
+        )
+
+    monkeypatch.setattr(main, "analyze", fake_analyze)
+    monkeypatch.setattr(main, "result_cache", AnalysisCache(MemoryBackend()))
+    monkeypatch.setattr(main, "similarity_index", filled_index("reuse"))
+    conversation, hume = screening(7, "dup", edited=True)
+    with TestClient(main.app) as client:
+        body = {"conversation_data": conversation, "hume_data": hume}
+        result = client.post("/analyze", json=body).json()
+        assert seen == []
+        assert result["session_id"] == "dup"
+        assert "near-duplicate session s7" in result["assessment_limitations"]
+
+        monkeypatch.setattr(main, "similarity_index", filled_index("anchors"))
+        monkeypatch.setattr(main, "result_cache", AnalysisCache(MemoryBackend()))
+        assert client.post("/analyze", json=body).status_code == 200
+        assert seen[0][SIMILAR_SESSIONS_KEY][0]["session_id"] == "s7"
+        assert len(main.similarity_index) == 31
+
+
+def test_batch_rescoring_neither_reuses_nor_anchors(monkeypatch):
+    seen = []
+
+    async def fake_analyze(conversation_data, hume_data, timeline=None, run_info=None):
+        seen.append(conversation_data)
+        return analyzer._create_mock_response().model_copy(
+            update={"session_id": conversation_data["session_id"]}
+        )
+
+    monkeypatch.setattr(main, "analyze", fake_analyze)
+    monkeypatch.setattr(main, "similarity_index", filled_index("reuse"))
+    conversation, hume = screening(7, "s7")
+    body = {"conversation_data": conversation, "hume_data": hume}
+    with TestClient(main.app) as client:
+        response = client.post("/analyze/batch", json={"sessions": [body]})
+    assert json.loads(response.text)["status"] == "succeeded"
+    assert len(seen) == 1 and SIMILAR_SESSIONS_KEY not in seen[0]
+    # the re-scored session replaced its old entry, fingerprint and all
+    index = main.similarity_index
+    assert len(index) == 30
+    assert index._session_ids[-1] == "s7" and index._fingerprints[-1]
+    features = session_features(conversation, hume)
+    assert index.search(features, "other")[0].session_id == "s7"
+    assert index.search(features, "other", index._fingerprints[-1]) == []
@@ -0,0 +1,118 @@
+import sys
+import pathlib
+import types
+import json
+from contextlib import asynccontextmanager
+
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+import main
+from agents import analyzer
+from agents.streaming import PartialObjectParser
+from models.flat_assessment import FlatAutismAssessment
+from services.cache import AnalysisCache, MemoryBackend
+
+SAMPLE = analyzer._create_mock_response().model_copy(update={"session_id": "s"})
+SAMPLE_JSON = json.dumps(SAMPLE.model_dump(), indent=1)
+
+
+class StreamingAgent:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+
+    @asynccontextmanager
+    async def run_stream(self, prompt):
+        agent = self
+
+        class Result:
+            async def stream_structured(self):
+                for end in range(0, len(SAMPLE_JSON) + 1, 7):
+                    if agent.fail_after is not None and end > agent.fail_after:
+                        raise RuntimeError("connection reset")
+                    part = types.SimpleNamespace(args=SAMPLE_JSON[:end])
+                    yield types.SimpleNamespace(parts=[part]), False
+
+            async def get_data(self):
+                return SAMPLE
+
+        yield Result()
+
+
+def parse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        name, data = block.split("\n", 1)
+        events.append((name[len("event: ") :], json.loads(data[len("data: ") :])))
+    return events
+
+
+def post_stream(monkeypatch, agent):
+    monkeypatch.setattr(analyzer, "autism_agent", agent)
+    monkeypatch.setattr(main, "result_cache", AnalysisCache(MemoryBackend()))
+    client = TestClient(main.app)
+    payload = {"conversation_data": {"session_id": "s"}, "hume_data": {}}
+    response = client.post("/analyze/stream", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    return client, payload, parse_events(response.text)
+
+
+def test_partial_parser_waits_for_delimiters():
+    parser = PartialObjectParser()
+    fields = []
+    for char in SAMPLE_JSON:
+        fields.extend(parser.feed(char))
+    assert parser.done
+    assert fields == list(SAMPLE.model_dump().items())
+
+    parser = PartialObjectParser()
+    assert parser.feed('{"a": 0.6') == []
+    assert parser.feed('7, "b": "x') == [("a", 0.67)]
+    assert parser.feed('y"}') == [("b", "xy")]
+
+
+def test_stream_sends_scores_before_text_then_validated_result(monkeypatch):
+    client, payload, events = post_stream(monkeypatch, StreamingAgent())
+
+    assert events[0] == ("started", {"session_id": "s"})
+    assert events[-1][0] == "result"
+    assert FlatAutismAssessment.model_validate(events[-1][1]) == SAMPLE
+    partials = [fields for name, fields in events[1:-1]]
+    assert len(partials) > 3
+    order = [key for fields in partials for key in fields]
+    assert order == list(SAMPLE.model_dump())
+    assert order.index("overall_autism_likelihood") < order.index("primary_concerns")
+
+    # a repeat request is answered from the result cache in one event
+    cached = parse_events(client.post("/analyze/stream", json=payload).text)
+    assert [name for name, _ in cached] == ["started", "result"]
+
+
+def test_stream_falls_back_for_non_streaming_and_failing_agents(monkeypatch):
+    class PlainAgent:
+        async def run(self, prompt):
+            return types.SimpleNamespace(data=SAMPLE)
+
+    _, _, events = post_stream(monkeypatch, PlainAgent())
+    assert [name for name, _ in events] == ["started", "partial", "result"]
+    assert events[1][1] == SAMPLE.model_dump(exclude_unset=True)
+
+    _, _, events = post_stream(monkeypatch, StreamingAgent(fail_after=200))
+    assert events[-1][0] == "result"
+    assert events[-1][1]["session_id"].startswith("fallback_")
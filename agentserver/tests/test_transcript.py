@@ -0,0 +1,84 @@
+import sys
+import pathlib
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from agents.scoring import message_times, transcript_features
+from agents.transcript import analyze_turns, render_turn_analytics
+from benchmarks.synthetic import conversation_data
+
+
+def turn(role, speech, start, end=None):
+    message = {"role": role, "speech": speech, "timestamp": start}
+    if end is not None:
+        message["end_timestamp"] = end
+    return message
+
+
+def test_latency_questions_and_echo():
+    messages = [
+        turn("replica", "Do you like trains?", 0.0),
+        turn("user", "Like trains.", 2.0),
+        turn("replica", "Tell me about your day.", 6.0),
+        turn("user", "", 12.0),
+        turn("replica", "What did you eat?", 14.0),
+        turn("user", "Pasta with cheese. What about you?", 15.0),
+    ]
+    features = transcript_features(messages)
+
+    assert features["response_latency_median"] == pytest.approx(2.0)
+    assert features["slow_response_fraction"] == pytest.approx(1 / 3)
+    assert features["agent_question_share"] == pytest.approx(2 / 3)
+    assert features["agent_questions_answered"] == pytest.approx(1.0)
+    assert features["user_question_share"] == pytest.approx(1 / 3)
+    # "like trains" repeats a bigram of the question; the pasta answer does not
+    assert features["echo_mean"] == pytest.approx(0.5)
+    assert features["user_words_per_turn"] == pytest.approx(8 / 3)
+    assert "Questions: 67% of agent turns (100% answered)" in render_turn_analytics(
+        features
+    )
+
+
+def test_overlaps_use_end_timestamps_when_present():
+    messages = [
+        turn("replica", "How are you today?", 0.0, 3.0),
+        turn("user", "Fine", 2.0, 2.5),
+        turn("replica", "Great", 2.8, 3.5),
+        turn("user", "I went to the park", 5.0, 7.0),
+    ]
+    features = transcript_features(messages)
+
+    assert features["overlaps"] == 1.0
+    assert features["user_interruptions"] == 1.0
+    assert features["agent_interruptions"] == 0.0
+
+    del messages[0]["end_timestamp"]
+    # estimated from the speaking rate: 4 words end at 1.6s, before the reply
+    estimated = analyze_turns(messages, message_times(messages))
+    assert estimated["overlaps"] == 0.0
+
+
+def test_tens_of_thousands_of_turns_are_fast():
+    messages = conversation_data(2000, "long")["transcript_messages"]
+    assert len(messages) == 20000
+
+    # end to end, timestamp parsing included; best of three absorbs CI noise
+    elapsed = []
+    for _ in range(3):
+        started = time.perf_counter()
+        features = transcript_features(messages)
+        elapsed.append(time.perf_counter() - started)
+    assert min(elapsed) < 0.1
+    assert np.isfinite(features["response_latency_p90"])
+    assert 0.0 <= features["echo_mean"] <= 1.0
+
+    times = message_times(messages)
+    expected = datetime.fromisoformat(
+        messages[-1]["timestamp"].replace("Z", "+00:00")
+    ).timestamp()
+    assert times[-1] == pytest.approx(expected)
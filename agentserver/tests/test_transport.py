@@ -0,0 +1,206 @@
+import sys
+import pathlib
+import gzip
+import json
+import struct
+import types
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+dotenv_stub = types.ModuleType("dotenv")
+dotenv_stub.load_dotenv = lambda: None
+sys.modules.setdefault("dotenv", dotenv_stub)
+
+import main
+from agents import analyzer
+from agents.features import EMOTIONS, MODALITIES, ModalityArrays, Timeline
+from benchmarks.synthetic import session_body
+from services.cache import AnalysisCache
+from services.ingest import PayloadValidationError, StreamingAnalyzeParser
+from services.transport import (
+    TIMELINE_CONTENT_TYPE,
+    BodyDecoder,
+    BodyEncodingError,
+    StreamingGZipMiddleware,
+    decode_timeline,
+    encode_timeline,
+)
+
+
+def parse_json(body):
+    parser = StreamingAnalyzeParser()
+    parser.feed(body)
+    return parser.close()
+
+
+def test_binary_round_trip_is_compact_and_zero_copy():
+    body = session_body(5, session_id="packed")
+    parsed = parse_json(body)
+    packed = bytearray(
+        encode_timeline(parsed.conversation_data, parsed.timeline, parsed.hume_data)
+    )
+    assert len(body) > 5 * len(packed)
+
+    decoded = decode_timeline(packed)
+    assert decoded.conversation_data == parsed.conversation_data
+    assert decoded.hume_data == parsed.hume_data
+    for name in MODALITIES:
+        arrays = decoded.timeline[name]
+        assert np.array_equal(arrays.timestamps, parsed.timeline[name].timestamps)
+        assert np.array_equal(arrays.scores, parsed.timeline[name].scores)
+        assert np.shares_memory(arrays.scores, np.frombuffer(packed, np.uint8))
+
+    with pytest.raises(ValueError):
+        decode_timeline(packed[:-8])
+    packed[-4:] = np.float32(1.5).tobytes()
+    with pytest.raises(PayloadValidationError) as excinfo:
+        decode_timeline(packed)
+    assert excinfo.value.errors[0]["loc"][3] == "burst_analysis"
+
+
+def test_binary_body_in_another_emotion_order_is_remapped():
+    scores = np.zeros((2, len(EMOTIONS)), dtype=np.float32)
+    scores[:, 0] = [0.25, 0.5]
+    timeline = Timeline({"face_emotions": ModalityArrays(np.array([2.0, 1.0]), scores)})
+    packed = bytearray(encode_timeline({"session_id": "x"}, timeline))
+    # swap the header's first two names; the bytes stay the same length
+    first, second = EMOTIONS[0].encode(), EMOTIONS[1].encode()
+    swapped = bytes(packed).replace(first + b'","' + second, second + b'","' + first, 1)
+    face = decode_timeline(swapped).timeline["face_emotions"]
+    assert face.timestamps.tolist() == [1.0, 2.0]
+    assert face.scores[:, 1].tolist() == [0.5, 0.25]
+    assert not face.scores[:, 0].any()
+
+
+def test_malformed_binary_headers_are_value_errors():
+    def body(header):
+        raw = json.dumps(header).encode()
+        return b"AGTL" + struct.pack("<I", len(raw)) + raw
+
+    for header in ([], {"emotions": "Joy"}, {"frames": {"face_emotions": "2"}}):
+        with pytest.raises(ValueError):
+            decode_timeline(body(header))
+
+
+def test_decoder_bounds_decompressed_size():
+    with pytest.raises(BodyEncodingError) as excinfo:
+        BodyDecoder("gzip", 1000).decode(gzip.compress(b"0" * 10000), final=True)
+    assert excinfo.value.status_code == 413
+    with pytest.raises(BodyEncodingError):
+        BodyDecoder("gzip", 1000).decode(gzip.compress(b"{}")[:-4], final=True)
+
+
+def zstd_compress(data):
+    try:
+        from compression import zstd
+    except ImportError:
+        zstd = pytest.importorskip("zstandard")
+        return zstd.ZstdCompressor(level=19).compress(data)
+    return zstd.compress(data, level=19)
+
+
+def test_zstd_bodies_are_bounded_while_decompressing():
+    bomb = zstd_compress(bytes(64 << 20))
+    decoder = BodyDecoder("zstd", 1000)
+    with pytest.raises(BodyEncodingError) as excinfo:
+        decoder.decode(bomb, final=True)
+    assert excinfo.value.status_code == 413
+    # stopped within a few blocks of the limit, not after inflating 64 MiB
+    assert decoder.size < 4 << 20
+
+    body = session_body(1, session_id="zstd")
+    packed = zstd_compress(body)
+    decoder = BodyDecoder("zstd", len(body))
+    chunks = [packed[i : i + 1000] for i in range(0, len(packed), 1000)]
+    decoded = b"".join(
+        decoder.decode(chunk, final=i == len(chunks) - 1)
+        for i, chunk in enumerate(chunks)
+    )
+    assert decoded == body
+
+
+def test_streamed_responses_are_not_gzipped():
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+
+    text = "record\n" * 1000
+    app = Starlette(
+        routes=[
+            Route("/json", lambda request: PlainTextResponse(text)),
+            Route(
+                "/ndjson",
+                lambda request: PlainTextResponse(
+                    text, media_type="application/x-ndjson"
+                ),
+            ),
+        ]
+    )
+    client = TestClient(StreamingGZipMiddleware(app, minimum_size=100))
+    headers = {"accept-encoding": "gzip"}
+    assert client.get("/json", headers=headers).headers["content-encoding"] == "gzip"
+    response = client.get("/ndjson", headers=headers)
+    assert "content-encoding" not in response.headers
+    assert response.text == text
+
+
+def test_analyze_accepts_compressed_and_binary_bodies(monkeypatch):
+    captured = []
+
+    async def fake_analyze(conversation_data, hume_data, timeline=None, run_info=None):
+        captured.append(timeline)
+        return analyzer._create_mock_response()
+
+    monkeypatch.setattr(main, "analyze", fake_analyze)
+    monkeypatch.setattr(main, "result_cache", AnalysisCache())
+    client = TestClient(main.app)
+
+    body = session_body(1, session_id="wire")
+    parsed = parse_json(body)
+    packed = encode_timeline(parsed.conversation_data, parsed.timeline)
+    requests = [
+        (gzip.compress(body), "application/json", "gzip"),
+        (packed, TIMELINE_CONTENT_TYPE, None),
+        (gzip.compress(packed), TIMELINE_CONTENT_TYPE, "gzip"),
+    ]
+    for content, content_type, encoding in requests:
+        headers = {"content-type": content_type, "accept-encoding": "gzip"}
+        if encoding:
+            headers["content-encoding"] = encoding
+        response = client.post("/analyze", content=content, headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+    for timeline in captured:
+        for name in MODALITIES:
+            assert np.array_equal(timeline[name].scores, parsed.timeline[name].scores)
+
+    def post(content, encoding, content_type="application/json"):
+        return client.post(
+            "/analyze",
+            content=content,
+            headers={"content-type": content_type, "content-encoding": encoding},
+        )
+
+    assert post(body, "br").status_code == 415
+    assert post(b"not gzip", "gzip").status_code == 400
+    assert (
+        post(gzip.compress(b"AGTL"), "gzip", TIMELINE_CONTENT_TYPE).status_code == 422
+    )
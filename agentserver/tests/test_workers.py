@@ -0,0 +1,111 @@
+import asyncio
+import sys
+import pathlib
+import types
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pydantic_ai_stub = types.ModuleType("pydantic_ai")
+
+
+class DummyAgent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def run(self, prompt):
+        raise NotImplementedError
+
+
+pydantic_ai_stub.Agent = DummyAgent
+sys.modules.setdefault("pydantic_ai", pydantic_ai_stub)
+
+from agents import analyzer
+from agents.features import Timeline
+from benchmarks.synthetic import session_payload
+from services import metrics, workers
+from services.ingest import parse_analyze_request
+from services.workers import WorkerLimits
+
+SAMPLE = analyzer._create_mock_response().model_copy(update={"session_id": "ok"})
+
+
+class SlowAgent:
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    async def run(self, prompt):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.02)
+        self.in_flight -= 1
+        return types.SimpleNamespace(data=SAMPLE)
+
+
+def test_llm_limit_bounds_model_calls_per_worker(monkeypatch):
+    agent = SlowAgent()
+    monkeypatch.setattr(analyzer, "autism_agent", agent)
+    monkeypatch.setattr(workers, "limits", WorkerLimits(llm_concurrency=2))
+    waits = metrics.LIMIT_WAIT_SECONDS.count(limit="llm")
+
+    async def scenario():
+        return await asyncio.gather(
+            *(
+                analyzer.analyze({"session_id": f"s{i}"}, {"emotion_timeline": {}})
+                for i in range(6)
+            )
+        )
+
+    results = asyncio.run(scenario())
+    assert all(not analyzer.is_fallback(result) for result in results)
+    assert agent.peak == 2
+    assert metrics.LIMIT_WAIT_SECONDS.count(limit="llm") == waits + 6
+
+
+def test_prompt_build_in_process_pool_matches_inline():
+    payload = session_payload(2, session_id="pooled")
+    args = (
+        "pooled",
+        payload["conversation_data"],
+        payload["hume_data"],
+        Timeline.from_hume_data(payload["hume_data"]),
+    )
+    inline, inline_local, _ = analyzer._prepare(*args)
+
+    limits = WorkerLimits(cpu_processes=1)
+    try:
+        limits.start()
+        pooled, pooled_local, timings = asyncio.run(
+            limits.run_cpu(analyzer._prepare, *args)
+        )
+    finally:
+        limits.shutdown()
+    assert pooled.prefix == inline.prefix
+    assert pooled.suffix.split("CONVERSATION TRANSCRIPT:")[1] == (
+        inline.suffix.split("CONVERSATION TRANSCRIPT:")[1]
+    )
+    assert pooled_local.scores == inline_local.scores
+    assert set(timings) == {"local_scoring", "prompt_build"}
+
+
+def test_slow_upload_does_not_hold_the_cpu_slot():
+    limits = WorkerLimits(cpu_concurrency=1)
+
+    async def scenario():
+        arrived = asyncio.Event()
+
+        async def upload():
+            yield b'{"conversation_data": {"session_id": "slow"}, '
+            await arrived.wait()
+            yield b'"hume_data": {}}'
+
+        parsing = asyncio.create_task(parse_analyze_request(upload(), limits.cpu))
+        await asyncio.sleep(0)
+        # the only CPU slot is free while the upload is stalled
+        total = await asyncio.wait_for(limits.run_cpu(sum, [1, 2, 3]), 1.0)
+        arrived.set()
+        return total, await parsing
+
+    total, parsed = asyncio.run(scenario())
+    assert total == 6
+    assert parsed.conversation_data["session_id"] == "slow"